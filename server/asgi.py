@@ -0,0 +1,274 @@
+"""
+ASGI entry point for serving Data Lens on an event loop.
+
+The MinIO- and LLM-bound endpoints (downloads, profiles, metadata and analysis jobs) are
+served natively: object store calls run on a bounded executor and enrichment awaits the
+async Groq client, so waiting requests hold no thread. Each native route has a concurrency
+limit and a request timeout. Every other endpoint is served by the Flask app on a thread pool.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Requires the "async" extra (starlette, uvicorn and a2wsgi).
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+
+from a2wsgi import WSGIMiddleware
+from minio.error import S3Error
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import http_date, parse_etags, parse_range_header
+
+import server
+from utils import AsyncObjectStore, RouteBusy, RouteLimiter, ASYNC_REQUEST_TIMEOUT, range_for_size
+from utils import process_parquet_file_async, profile_object_name, readme_etag, render_readme, cached_readme, cache_readme
+from utils import QueueFull, start_trace, current_trace, reset_trace
+
+# Threads serving the endpoints that fall through to the Flask app
+ASYNC_WSGI_THREADS = int(os.getenv('ASYNC_WSGI_THREADS', 16))
+
+limiter = RouteLimiter()
+
+
+def limited(route):
+    """
+    Apply the route's concurrency limit and the request timeout to an endpoint.
+    A streamed response keeps its slot until the body has been sent.
+    """
+    def decorator(endpoint):
+        async def wrapper(request):
+            started = time.perf_counter()
+            try:
+                await limiter.acquire(route)
+            except RouteBusy as e:
+                response = JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': '1'})
+                return _observed(request, response, started)
+
+            streaming = False
+            try:
+                try:
+                    response = await asyncio.wait_for(endpoint(request), ASYNC_REQUEST_TIMEOUT)
+                except asyncio.TimeoutError:
+                    response = JSONResponse({'error': f'Request timed out after {ASYNC_REQUEST_TIMEOUT}s'}, status_code=504)
+                if isinstance(response, StreamingResponse):
+                    response.body_iterator = _release_after(response.body_iterator, route)
+                    streaming = True
+                return _observed(request, response, started)
+            finally:
+                if not streaming:
+                    limiter.release(route)
+        return wrapper
+    return decorator
+
+
+async def _release_after(body, route):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        limiter.release(route)
+
+
+def _observed(request, response, started):
+    # Label with the Flask rule, e.g. /download/{filename:path} as /download/<path:filename>
+    endpoint = re.sub(r'\{(\w+)(?::(\w+))?\}', lambda m: f"<{m[2]}:{m[1]}>" if m[2] else f"<{m[1]}>",
+                      request.scope['route'].path)
+    server.http_request_seconds.observe(
+        time.perf_counter() - started, method=request.method, endpoint=endpoint, status=response.status_code)
+    return response
+
+
+def _store():
+    return AsyncObjectStore(server.minio_client) if server.minio_client else None
+
+
+def _storage_unavailable():
+    return JSONResponse({'error': 'MinIO storage not available'}, status_code=500)
+
+
+@limited('download')
+async def download_file(request):
+    """Stream a file from MinIO bucket, honouring Range and If-None-Match headers"""
+    filename = request.path_params['filename']
+    store = _store()
+    if store is None:
+        return _storage_unavailable()
+    try:
+        stat = await store.stat_object(server.MINIO_BUCKET_NAME, filename)
+        headers = {
+            'Content-Disposition': f'attachment; filename={os.path.basename(filename)}',
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{stat.etag}"',
+        }
+        if stat.last_modified:
+            headers['Last-Modified'] = http_date(stat.last_modified)
+
+        # Conditional download: the client already has this version
+        if parse_etags(request.headers.get('if-none-match')).contains(stat.etag):
+            return Response(status_code=304, headers=headers)
+
+        # Partial download, e.g. a Parquet reader fetching only the footer
+        offset, length, status = 0, stat.size, 200
+        byte_range = parse_range_header(request.headers.get('range'))
+        if byte_range is not None:
+            bounds = range_for_size(byte_range, stat.size)
+            if bounds is None:
+                return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{stat.size}'})
+            start, stop = bounds
+            offset, length, status = start, stop - start, 206
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{stat.size}'
+        headers['Content-Length'] = str(length)
+
+        response = await store.get_object(server.MINIO_BUCKET_NAME, filename, offset=offset, length=length)
+        return StreamingResponse(
+            store.iter_chunks(response), status_code=status, media_type='application/octet-stream', headers=headers)
+
+    except S3Error as e:
+        return JSONResponse({'error': f'File not found or MinIO error: {str(e)}'}, status_code=404)
+    except Exception as e:
+        return JSONResponse({'error': f'Download failed: {str(e)}'}, status_code=500)
+
+
+@limited('profile')
+async def get_profile(request):
+    """Structured profile of a processed parquet file, served from its JSON sidecar"""
+    filename = request.path_params['filename']
+    store = _store()
+    if store is None:
+        return _storage_unavailable()
+    profile_filename = profile_object_name(filename)
+    try:
+        try:
+            stat = await store.stat_object(server.MINIO_BUCKET_NAME, profile_filename)
+        except S3Error:
+            return JSONResponse({'error': f'No profile for {filename}; process the file first'}, status_code=404)
+
+        headers = {'ETag': f'"{stat.etag}"', 'Cache-Control': 'no-cache'}
+        if stat.last_modified:
+            headers['Last-Modified'] = http_date(stat.last_modified)
+        if parse_etags(request.headers.get('if-none-match')).contains(stat.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = await store.read_object(server.MINIO_BUCKET_NAME, profile_filename)
+        return Response(body, media_type='application/json', headers=headers)
+
+    except S3Error as e:
+        return JSONResponse({'error': f'MinIO error: {str(e)}'}, status_code=500)
+    except Exception as e:
+        return JSONResponse({'error': f'Failed to retrieve profile: {str(e)}'}, status_code=500)
+
+
+@limited('get-metadata')
+async def get_metadata_file(request):
+    """Get the README of a parquet file, rendered from its profile sidecar"""
+    filename = request.path_params['filename']
+    store = _store()
+    if store is None:
+        return _storage_unavailable()
+    metadata_filename = os.path.splitext(filename)[0] + "_metadata.md"
+    try:
+        try:
+            stat = await store.stat_object(server.MINIO_BUCKET_NAME, profile_object_name(filename))
+        except S3Error:
+            stat = None
+
+        if stat is not None:
+            etag = readme_etag(stat.etag)
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+            if parse_etags(request.headers.get('if-none-match')).contains(etag):
+                return Response(status_code=304, headers=headers)
+            content = cached_readme(server.MINIO_BUCKET_NAME, filename, etag)
+            if content is None:
+                document = json.loads(await store.read_object(server.MINIO_BUCKET_NAME, profile_object_name(filename)))
+                content = render_readme(document)
+                cache_readme(server.MINIO_BUCKET_NAME, filename, etag, content)
+            return JSONResponse(
+                {'filename': metadata_filename, 'content': content, 'source': 'profile'}, headers=headers)
+
+        # Files processed before profile sidecars existed only have the stored README
+        try:
+            content = await store.read_object(server.MINIO_BUCKET_NAME, metadata_filename)
+        except S3Error:
+            return JSONResponse({'error': f'Metadata file {metadata_filename} not found'}, status_code=404)
+        return JSONResponse({'filename': metadata_filename, 'content': content.decode('utf-8'), 'source': 'stored'})
+
+    except Exception as e:
+        return JSONResponse({'error': f'Failed to retrieve metadata: {str(e)}'}, status_code=500)
+
+
+async def run_parquet_analysis(filename, profile_mode, progress=None, trace=False):
+    """server.run_parquet_analysis as a coroutine job"""
+    trace_token = start_trace() if trace else None
+    try:
+        result = await process_parquet_file_async(
+            server.minio_client, server.MINIO_BUCKET_NAME, filename, profile_mode=profile_mode, progress=progress)
+        spans = current_trace()
+    finally:
+        if trace_token is not None:
+            reset_trace(trace_token)
+    return server.analysis_payload(filename, result, spans)
+
+
+@limited('process-parquet')
+async def process_parquet_metadata(request):
+    """Queue a parquet file for metadata generation and return the job id"""
+    filename = request.path_params['filename']
+    store = _store()
+    if store is None:
+        return _storage_unavailable()
+    try:
+        # Check if the file exists in the bucket
+        try:
+            await store.stat_object(server.MINIO_BUCKET_NAME, filename)
+        except S3Error:
+            return JSONResponse({'error': f'File {filename} not found in bucket'}, status_code=404)
+
+        profile_mode = request.query_params.get('mode', server.PROFILE_MODE)
+        if profile_mode not in server.PROFILE_MODES:
+            return JSONResponse(
+                {'error': f'Invalid mode. Expected one of: {", ".join(server.PROFILE_MODES)}'}, status_code=400)
+
+        # A retry while the same analysis is still queued or running joins that job
+        params = {'filename': filename, 'profile_mode': profile_mode}
+        trace = request.query_params.get('trace', '').lower() in ('1', 'true') \
+            or request.headers.get('x-trace', '').lower() in ('1', 'true')
+        try:
+            job, submitted = server.job_queue.submit_async_once(
+                'process-parquet', run_parquet_analysis, params=params,
+                filename=filename, profile_mode=profile_mode, trace=trace)
+        except QueueFull as e:
+            return JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': '5'})
+        status_code, message = (202, 'Parquet file queued for processing') if submitted \
+            else (200, 'Parquet file is already being processed')
+
+        return JSONResponse({
+            'message': message,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'events_url': f'/events/{job.id}'
+        }, status_code=status_code)
+
+    except Exception as e:
+        return JSONResponse({'error': f'Processing failed: {str(e)}'}, status_code=500)
+
+
+async def route_limits(request):
+    """Concurrency limit, requests in flight and rejections of each native route"""
+    return JSONResponse({'routes': limiter.stats(), 'request_timeout': ASYNC_REQUEST_TIMEOUT})
+
+
+app = Starlette(routes=[
+    Route('/download/{filename:path}', download_file, methods=['GET']),
+    Route('/profile/{filename:path}', get_profile, methods=['GET']),
+    Route('/get-metadata/{filename:path}', get_metadata_file, methods=['GET']),
+    Route('/process-parquet/{filename:path}', process_parquet_metadata, methods=['POST']),
+    Route('/route-limits', route_limits, methods=['GET']),
+    # Uploads, queries, listings, jobs, events and metrics are served by the Flask app
+    Mount('/', app=WSGIMiddleware(server.app, workers=ASYNC_WSGI_THREADS)),
+])
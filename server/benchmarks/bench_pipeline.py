@@ -0,0 +1,319 @@
+"""
+Benchmark the conversion, profiling and enrichment paths end to end.
+
+Generates a synthetic dataset modeled on data/dummy_marksheet.csv with the requested
+rows, columns and cardinality, then measures convert_to_parquet,
+Summarizer.get_column_properties, process_parquet_file and generate_readme_content.
+The append stage re-profiles a version with rows appended incrementally and fails if it
+fetches much more than the appended row groups.
+Every stage runs in a fresh process so its peak RSS is not inflated by earlier stages.
+Objects go to an in-memory fake object store (or a real MinIO with --store minio) and the
+LLM is a stub that answers after --llm-latency seconds.
+
+Results are written as JSON; pass an earlier result file to --compare to see the change.
+
+Usage:
+    python benchmarks/bench_pipeline.py --rows 1000000 --columns 12 --output before.json
+    python benchmarks/bench_pipeline.py --rows 1000000 --columns 12 --compare before.json
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MARKSHEET_PATH = os.path.join(SERVER_DIR, '..', 'data', 'dummy_marksheet.csv')
+STAGES = ("convert", "profile", "process", "append", "readme")
+FILENAME = "bench.csv"
+
+
+def generate_dataset(rows: int, columns: int = 3, cardinality: int = 1000, seed: int = 42) -> pd.DataFrame:
+    """
+    Tile the marksheet (name, pass, cgpa) to `rows` rows with `cardinality` distinct names,
+    and add integer, float, categorical and date columns in turn until there are `columns`.
+    """
+    base = pd.read_csv(MARKSHEET_PATH)
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    df = pd.DataFrame({
+        "name": base["name"].to_numpy()[index % len(base)] + "_" + (index % cardinality).astype(str),
+        "pass": base["pass"].to_numpy()[index % len(base)],
+        "cgpa": (base["cgpa"].to_numpy()[index % len(base)] + rng.normal(0, 0.5, rows)).clip(0, 10).round(2),
+    })
+
+    cities = np.array([f"city_{i}" for i in range(cardinality)])
+    dates = pd.date_range("2024-01-01", periods=min(cardinality, 3650)).strftime("%Y-%m-%d").to_numpy()
+    generators = [
+        lambda: rng.integers(0, cardinality, rows),
+        lambda: rng.normal(50, 15, rows).round(3),
+        lambda: cities[rng.integers(0, len(cities), rows)],
+        lambda: dates[rng.integers(0, len(dates), rows)],
+    ]
+    names = ["student_id", "score", "city", "exam_date"]
+    for i in range(max(columns - len(df.columns), 0)):
+        kind = i % len(generators)
+        df[f"{names[kind]}_{i // len(generators)}"] = generators[kind]()
+    return df.iloc[:, :columns] if columns < len(df.columns) else df
+
+
+class StubLLM:
+    """Answers enrichment batches with fixed annotations after a configurable delay"""
+    model = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def complete(self, prompt, max_tokens=None):
+        time.sleep(self.latency)
+        fields = json.loads(prompt.split("Fields to annotate:\n", 1)[1])
+        content = json.dumps({
+            "name": "benchmark",
+            "dataset_description": "Synthetic benchmark dataset",
+            "fields": [
+                {"column": field["column"], "semantic_type": "value", "description": f"Column {field['column']}"}
+                for field in fields
+            ],
+        })
+        return {"content": content, "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4, "finish_reason": "stop"}
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, from /proc where available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _time_runs(func, repeat: int) -> list:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def _write_head(csv_path: str, rows: int) -> str:
+    """Copy the header and first `rows` rows of a CSV next to it"""
+    head_path = os.path.splitext(csv_path)[0] + "_head.csv"
+    with open(csv_path, "rb") as src, open(head_path, "wb") as dst:
+        for _, line in zip(range(rows + 1), src):
+            dst.write(line)
+    return head_path
+
+
+def run_stage(stage: str, args: dict, csv_path: str) -> dict:
+    """Set up and time one stage; runs in its own process"""
+    os.environ["CATALOG_PATH"] = os.path.join(os.path.dirname(csv_path), "catalog.sqlite3")
+    # Every process_parquet_file run should reach the (stub) LLM
+    os.environ["ENRICHMENT_CACHE_BACKENDS"] = "none"
+    os.environ["ENRICH_CONCURRENCY"] = str(args["llm_concurrency"])
+
+    # Keep stdout for the JSON results; the server reports its MinIO connection on import
+    with contextlib.redirect_stdout(sys.stderr):
+        import server
+    import pyarrow.parquet as pq
+    from utils import (MinioObjectFile, Summarizer, generate_readme_content, process_parquet_file, summarizer,
+                       writer_profile)
+    from utils.incremental import PROFILE_STATE_SUFFIX
+    from fake_store import InMemoryObjectStore
+
+    if args["store"] == "memory":
+        server.minio_client = InMemoryObjectStore()
+        server.minio_client.make_bucket(server.MINIO_BUCKET_NAME)
+    elif server.minio_client is None:
+        raise RuntimeError("MinIO is not reachable; check MINIO_ENDPOINT or use --store memory")
+    store, bucket = server.minio_client, server.MINIO_BUCKET_NAME
+    summarizer.get_groq_llm = lambda: StubLLM(args["llm_latency"])
+    profile = writer_profile(args["writer_profile"])
+    input_size = os.path.getsize(csv_path)
+
+    def convert(path=csv_path):
+        # Repeats upload identical bytes; measure the conversion rather than the duplicate check
+        with open(path, "rb") as f:
+            return server.convert_to_parquet(f, FILENAME, "csv", profile, dedup=False)
+
+    if stage == "convert":
+        func = convert
+    elif stage == "profile":
+        df = pd.read_csv(csv_path)
+        rows, columns = len(df), len(df.columns)
+        func = lambda: Summarizer().get_column_properties(df, 3)  # noqa: E731
+    elif stage == "process":
+        object_name = convert()[0]
+
+        def func():
+            result = process_parquet_file(store, bucket, object_name, profile_mode=args["profile_mode"])
+            if result["status"] != "success":
+                raise RuntimeError(result["error"])
+    elif stage == "append":
+        # The first half as the previous version, then the whole file as the next one
+        previous_name, _, previous_size, _ = convert(_write_head(csv_path, args["rows"] // 2))
+        result = process_parquet_file(store, bucket, previous_name, profile_mode="incremental")
+        if result["status"] != "success":
+            raise RuntimeError(result["error"])
+        # Object names carry a timestamp to the second
+        time.sleep(1.1)
+        object_name, _, size, _ = convert()
+        appended = {}
+
+        def func():
+            # Drop the state of earlier repeats so the previous version's is reused each time
+            with contextlib.suppress(Exception):
+                store.remove_object(bucket, os.path.splitext(object_name)[0] + PROFILE_STATE_SUFFIX)
+            result = process_parquet_file(store, bucket, object_name, profile_mode="incremental")
+            if result["status"] != "success":
+                raise RuntimeError(result["error"])
+            appended.update(result)
+    elif stage == "readme":
+        df = pd.read_csv(csv_path)
+        rows, columns = len(df), len(df.columns)
+        summary = Summarizer().summarize(df, text_gen=None, file_name=FILENAME)
+        func = lambda: generate_readme_content(summary, FILENAME, num_rows=rows, num_columns=columns)  # noqa: E731
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    baseline_rss = current_rss()
+    runs = _time_runs(func, args["repeat"])
+    best = min(runs)
+    result = {
+        "seconds_best": round(best, 6),
+        "seconds_median": round(statistics.median(runs), 6),
+        "runs": [round(run, 6) for run in runs],
+        "rows_per_second": round(args["rows"] / best, 1) if best > 0 else None,
+        "input_mb_per_second": round(input_size / best / 1024 / 1024, 2) if best > 0 else None,
+        "baseline_rss_mb": round(baseline_rss / 1024 / 1024, 1),
+        "peak_rss_mb": round(peak_rss() / 1024 / 1024, 1),
+    }
+    if stage == "convert":
+        result["parquet_size"] = convert()[2]
+    elif stage == "append":
+        # Re-profiled: the appended bytes, the previous version's last (partial) row group and the footer
+        previous = pq.ParquetFile(MinioObjectFile(store, bucket, previous_name)).metadata
+        current = pq.ParquetFile(MinioObjectFile(store, bucket, object_name)).metadata
+        last_row_group = previous.row_group(previous.num_row_groups - 1).total_byte_size
+        allowed = size - previous_size + last_row_group + current.serialized_size + 8
+        result.update(
+            bytes_fetched=appended["bytes_fetched"], delta_bytes=size - previous_size, allowed_bytes=allowed,
+            row_groups_reused=appended["row_groups_reused"], row_groups_profiled=appended["row_groups_profiled"])
+        if appended["bytes_fetched"] > allowed:
+            raise RuntimeError(f"Re-profiling the appended version fetched {appended['bytes_fetched']:,} bytes, "
+                               f"more than the {allowed:,} expected for its new row groups")
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    """Print the change of every stage against an earlier result file"""
+    print(f"{'stage':<10} {'before (s)':>12} {'after (s)':>12} {'speedup':>9} {'peak RSS (MB)':>20}")
+    for stage, after in results["results"].items():
+        before = baseline.get("results", {}).get(stage)
+        if before is None:
+            continue
+        speedup = before["seconds_best"] / after["seconds_best"] if after["seconds_best"] else math.nan
+        print(f"{stage:<10} {before['seconds_best']:>12.4f} {after['seconds_best']:>12.4f} {speedup:>8.2f}x "
+              f"{before['peak_rss_mb']:>9.1f} -> {after['peak_rss_mb']:<8.1f}")
+    if baseline.get("params") != results["params"]:
+        print("warning: parameters differ from the baseline run")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=12)
+    parser.add_argument("--cardinality", type=int, default=1000, help="distinct values of the name, id, city and date columns")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--store", choices=("memory", "minio"), default="memory",
+                        help="in-memory fake object store, or the MinIO configured by MINIO_* variables")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the stub LLM takes per batch")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--profile-mode", choices=("full", "fast", "sketch", "incremental", "stream"), default="full")
+    parser.add_argument("--writer-profile", default=None)
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "stages")}
+    results = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        csv_path = os.path.join(data_dir, FILENAME)
+        df = generate_dataset(args.rows, args.columns, args.cardinality, args.seed)
+        df.to_csv(csv_path, index=False)
+        results["input_size"] = os.path.getsize(csv_path)
+        del df
+        print(f"Dataset: {args.rows:,} rows x {args.columns} columns, "
+              f"{results['input_size'] / 1024 / 1024:.1f} MiB CSV", file=sys.stderr)
+
+        # spawn gives each stage a clean interpreter, so peak RSS belongs to that stage
+        context = multiprocessing.get_context("spawn")
+        for stage in stages:
+            with context.Pool(1) as pool:
+                results["results"][stage] = pool.apply(run_stage, (stage, params, csv_path))
+            stage_result = results["results"][stage]
+            print(f"{stage:<8} best {stage_result['seconds_best']:.4f}s, "
+                  f"{stage_result['rows_per_second']:,.0f} rows/s, peak RSS {stage_result['peak_rss_mb']} MB",
+                  file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
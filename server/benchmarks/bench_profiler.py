@@ -0,0 +1,96 @@
+"""
+Benchmark the Arrow column profiler against the original pandas implementation.
+
+Scales data/dummy_marksheet.csv up to the requested number of rows (and optionally
+widens it by repeating its columns), then times both Summarizer code paths and checks
+that they agree.
+
+Usage:
+    python benchmarks/bench_profiler.py --rows 1000000 --width 4
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import Summarizer  # noqa: E402
+
+MARKSHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'dummy_marksheet.csv')
+
+
+def scale_marksheet(rows: int, width: int = 1, seed: int = 42) -> pd.DataFrame:
+    """Tile the marksheet to `rows` rows with jittered grades and unique names"""
+    base = pd.read_csv(MARKSHEET_PATH)
+    rng = np.random.default_rng(seed)
+    repeats = math.ceil(rows / len(base))
+    df = pd.concat([base] * repeats, ignore_index=True).iloc[:rows]
+
+    df["name"] = df["name"] + "_" + pd.RangeIndex(rows).astype(str)
+    df["cgpa"] = (df["cgpa"] + rng.normal(0, 0.5, rows)).clip(0, 10).round(2)
+    df["student_id"] = np.arange(rows, dtype=np.int64)
+    df["exam_date"] = pd.Series(pd.date_range("2024-01-01", periods=365).strftime("%Y-%m-%d")).sample(
+        rows, replace=True, random_state=seed).to_numpy()
+
+    columns = [df]
+    for copy in range(1, width):
+        columns.append(df.add_suffix(f"_{copy}"))
+    return pd.concat(columns, axis=1)
+
+
+def time_call(func, *args, repeat: int = 3):
+    """Return the best wall-clock time over `repeat` runs and the last result"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def same_properties(a: dict, b: dict) -> bool:
+    """Compare two properties dicts, allowing float rounding differences"""
+    if a.keys() != b.keys():
+        return False
+    for key in a:
+        if isinstance(a[key], float) and isinstance(b[key], float):
+            if not math.isclose(a[key], b[key], rel_tol=1e-9):
+                return False
+        elif a[key] != b[key]:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--width", type=int, default=1, help="number of copies of the column set")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = scale_marksheet(args.rows, args.width)
+    summarizer = Summarizer()
+    print(f"Profiling {len(df):,} rows x {len(df.columns)} columns")
+
+    pandas_time, expected = time_call(summarizer.get_column_properties_pandas, df, repeat=args.repeat)
+    arrow_time, actual = time_call(summarizer.get_column_properties, df, repeat=args.repeat)
+
+    mismatches = [
+        e["column"] for e, a in zip(expected, actual)
+        if not same_properties(e["properties"], a["properties"])
+    ]
+
+    print(f"pandas profiler: {pandas_time:.3f}s")
+    print(f"arrow profiler:  {arrow_time:.3f}s")
+    print(f"speedup:         {pandas_time / arrow_time:.1f}x")
+    print(f"mismatched columns: {mismatches or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+In-memory stand-in for the subset of the MinIO client API used by the server.
+
+Objects live in a dict, so benchmarks measure conversion, profiling and enrichment
+without network or disk noise. Streaming uploads (length=-1) are consumed in
+part_size chunks like minio does, and ranged get_object calls return only the
+requested bytes. An optional per-request latency stands in for the network round trip.
+"""
+
+import hashlib
+import io
+import threading
+import time
+from datetime import datetime, timezone
+
+from minio.error import S3Error
+
+
+class StoredObject:
+    def __init__(self, bucket_name: str, object_name: str, data: bytes, content_type: str):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.size = len(data)
+        self.etag = hashlib.md5(data).hexdigest()
+        self.last_modified = datetime.now(timezone.utc)
+        self.content_type = content_type
+        self.metadata = {}
+        self.is_dir = False
+
+
+class ObjectResponse:
+    """Mimics the urllib3 response returned by get_object"""
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+        self.headers = {"Content-Length": str(len(data))}
+
+    def read(self, amt=None) -> bytes:
+        return self._buffer.read(amt if amt is not None else -1)
+
+    def stream(self, amt: int = 64 * 1024):
+        while chunk := self._buffer.read(amt):
+            yield chunk
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class InMemoryObjectStore:
+    """Thread-safe fake MinIO client; counts requests and bytes moved"""
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _bucket(self, bucket_name: str) -> dict:
+        if bucket_name not in self._buckets:
+            raise S3Error("NoSuchBucket", "The specified bucket does not exist", bucket_name, "", "", None)
+        return self._buckets[bucket_name]
+
+    def _object(self, bucket_name: str, object_name: str) -> tuple:
+        entry = self._bucket(bucket_name).get(object_name)
+        if entry is None:
+            raise S3Error("NoSuchKey", "The specified key does not exist", object_name, "", "", None)
+        return entry
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return bucket_name in self._buckets
+
+    def make_bucket(self, bucket_name: str):
+        with self._lock:
+            self._buckets.setdefault(bucket_name, {})
+
+    def put_object(self, bucket_name, object_name, data, length, content_type='application/octet-stream',
+                   part_size=0, **kwargs):
+        self._round_trip()
+        if length == -1:
+            chunks = []
+            while chunk := data.read(part_size or 5 * 1024 * 1024):
+                chunks.append(chunk)
+            content = b"".join(chunks)
+        else:
+            content = data.read(length)
+        stored = StoredObject(bucket_name, object_name, content, content_type)
+        with self._lock:
+            self._bucket(bucket_name)[object_name] = (stored, content)
+            self.requests += 1
+            self.bytes_in += len(content)
+        return stored
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0, **kwargs) -> ObjectResponse:
+        self._round_trip()
+        _, content = self._object(bucket_name, object_name)
+        data = content[offset:offset + length] if length else content[offset:]
+        with self._lock:
+            self.requests += 1
+            self.bytes_out += len(data)
+        return ObjectResponse(data)
+
+    def stat_object(self, bucket_name, object_name, **kwargs) -> StoredObject:
+        self._round_trip()
+        with self._lock:
+            self.requests += 1
+        return self._object(bucket_name, object_name)[0]
+
+    def list_objects(self, bucket_name, prefix=None, recursive=False, **kwargs):
+        self._round_trip()
+        with self._lock:
+            self.requests += 1
+            objects = sorted(self._bucket(bucket_name).items())
+        return [stored for name, (stored, _) in objects if not prefix or name.startswith(prefix)]
+
+    def remove_object(self, bucket_name, object_name, **kwargs):
+        with self._lock:
+            self._bucket(bucket_name).pop(object_name, None)
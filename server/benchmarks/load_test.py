@@ -0,0 +1,302 @@
+"""
+Load test the threaded Flask server against the ASGI server (asgi.py) on a MinIO stand-in.
+
+Each server runs alone in its own process and serves an in-memory object store, seeded with
+--objects analysed Parquet files, whose every request takes --store-latency seconds. Clients on
+keep-alive connections fetch profiles, rendered READMEs and ranged downloads at each
+--concurrency level for --duration seconds. The report gives throughput, latency percentiles,
+errors, the server's CPU time and peak thread count, and requests served per CPU-second.
+Failed requests make the results meaningless, so the run exits with status 1 when any request
+failed, unless --allow-errors is given.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 16,64,256 --duration 10
+    python benchmarks/load_test.py --modes asgi --store-latency 0.05 --output asgi.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("threaded", "asgi")
+RANGE_BYTES = 64 * 1024
+
+
+def serve(mode: str, port: int, objects: int, rows: int, store_latency: float):
+    """Seed the fake store and run one server in the foreground"""
+    os.environ["CATALOG_PATH"] = os.path.join(tempfile.mkdtemp(), "catalog.sqlite3")
+    with contextlib.redirect_stdout(sys.stderr):
+        import server
+    from bench_pipeline import generate_dataset
+    from fake_store import InMemoryObjectStore
+    from utils import Summarizer
+    from utils.summarizer import write_metadata
+
+    store = InMemoryObjectStore()
+    store.make_bucket(server.MINIO_BUCKET_NAME)
+    df = generate_dataset(rows, columns=8)
+    summary = Summarizer().summarize(df, text_gen=None, file_name="load.parquet")
+    data = df.to_parquet(index=False)
+    for i in range(objects):
+        name = f"load_{i}.parquet"
+        store.put_object(server.MINIO_BUCKET_NAME, name, _Reader(data), len(data))
+        write_metadata(store, server.MINIO_BUCKET_NAME, name,
+                       {"rows": len(df), "columns": len(df.columns), "sketches": None}, summary)
+    store.latency = store_latency
+    server.minio_client = store
+
+    if mode == "asgi":
+        import uvicorn
+        import asgi
+        uvicorn.run(asgi.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    else:
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        make_server("127.0.0.1", port, server.app, threaded=True).serve_forever()
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self._data, self._position = data, 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size < 0 else self._position + size
+        chunk, self._position = self._data[self._position:end], min(end, len(self._data))
+        return chunk
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cpu_seconds(pid: int) -> float:
+    """User plus system CPU time of a process, from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def thread_count(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return 0
+
+
+def request_mix(objects: int) -> list:
+    """The requests each client cycles through: profile, README and a ranged download per object"""
+    mix = []
+    for i in range(objects):
+        name = f"load_{i}.parquet"
+        mix += [(f"/profile/{name}", {}), (f"/get-metadata/{name}", {}),
+                (f"/download/{name}", {"Range": f"bytes=-{RANGE_BYTES}"})]
+    return mix
+
+
+class Connection:
+    """
+    Minimal HTTP/1.1 client connection. It is far lighter than a full client library, so on a
+    machine the load generator shares with the server most CPU time is left to the server.
+    """
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self._reader = self._writer = None
+
+    async def get(self, path: str, headers: dict) -> int:
+        """Send a GET, read the whole response and return its status code"""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        try:
+            status, keep_alive = await self._read_response()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.close()
+            raise
+        if not keep_alive:
+            self.close()
+        return status
+
+    async def _read_response(self) -> tuple:
+        version, status = (await self._reader.readuntil(b"\r\n")).split(b" ", 2)[:2]
+        fields = {}
+        while (line := await self._reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            fields[name.strip().lower()] = value.strip().lower()
+        keep_alive = version == b"HTTP/1.1" and fields.get("connection") != "close"
+
+        if "content-length" in fields:
+            await self._reader.readexactly(int(fields["content-length"]))
+        elif fields.get("transfer-encoding") == "chunked":
+            while size := int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16):
+                await self._reader.readexactly(size + 2)
+            await self._reader.readuntil(b"\r\n")
+        elif int(status) not in (204, 304):
+            await self._reader.read()
+            keep_alive = False
+        return int(status), keep_alive
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+async def run_level(host: str, port: int, pid: int, concurrency: int, duration: float, mix: list) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds, one connection per client"""
+    latencies, errors = [], {}
+    peak_threads = thread_count(pid)
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal errors
+        connection, i = Connection(host, port), offset
+        try:
+            while time.perf_counter() < deadline:
+                path, headers = mix[i % len(mix)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    status = await connection.get(path, headers)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                if status >= 400:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while time.perf_counter() < deadline:
+            peak_threads = max(peak_threads, thread_count(pid))
+            await asyncio.sleep(0.2)
+
+    cpu_before, started = cpu_seconds(pid), time.perf_counter()
+    await asyncio.gather(sample_threads(), *(worker(i) for i in range(concurrency)))
+    elapsed, cpu = time.perf_counter() - started, cpu_seconds(pid) - cpu_before
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": count,
+        "errors": sum(errors.values()),
+        "errors_by_kind": errors,
+        "requests_per_second": round(count / elapsed, 1),
+        "latency_p50_ms": round(latencies[count // 2] * 1000, 1) if count else None,
+        "latency_p99_ms": round(latencies[min(int(count * 0.99), count - 1)] * 1000, 1) if count else None,
+        "latency_mean_ms": round(statistics.fmean(latencies) * 1000, 1) if count else None,
+        "server_cpu_seconds": round(cpu, 2),
+        "requests_per_cpu_second": round(count / cpu, 1) if cpu else None,
+        "peak_threads": peak_threads,
+    }
+
+
+def run_mode(mode: str, args) -> list:
+    port = _free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port),
+               "--objects", str(args.objects), "--rows", str(args.rows), "--store-latency", str(args.store_latency)]
+    process = subprocess.Popen(command, cwd=SERVER_DIR)
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}", process)
+        mix = request_mix(args.objects)
+        levels = []
+        for concurrency in args.concurrency:
+            level = asyncio.run(run_level("127.0.0.1", port, process.pid, concurrency, args.duration, mix))
+            levels.append(level)
+            print(f"{mode:<9} c={concurrency:<5} {level['requests_per_second']:>8.1f} req/s  "
+                  f"p50 {level['latency_p50_ms']} ms  p99 {level['latency_p99_ms']} ms  "
+                  f"{level['requests_per_cpu_second']} req/CPU-s  {level['peak_threads']} threads  "
+                  f"{level['errors']} errors", file=sys.stderr)
+            if level['errors']:
+                print(f"WARNING: {mode} c={concurrency}: {level['errors']} of {level['requests'] + level['errors']} "
+                      f"requests failed {level['errors_by_kind']}", file=sys.stderr)
+        return levels
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def _wait_ready(base_url: str, process, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        with contextlib.suppress(OSError):
+            with urllib.request.urlopen(f"{base_url}/profile/load_0.parquet", timeout=5):
+                return
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {', '.join(MODES)}")
+    parser.add_argument("--concurrency", default="16,64,256", help="comma-separated numbers of clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--objects", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows of each seeded Parquet file")
+    parser.add_argument("--store-latency", type=float, default=0.02, help="seconds each object store request takes")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--allow-errors", action="store_true", help="exit with status 0 even if requests failed")
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.objects, args.rows, args.store_latency)
+        return
+
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    results = {
+        "benchmark": "load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "serve", "port", "allow_errors")},
+        "results": {mode: run_mode(mode, args) for mode in modes},
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    failed = sum(level["errors"] for levels in results["results"].values() for level in levels)
+    if failed and not args.allow_errors:
+        sys.exit(f"ERROR: {failed} requests failed; the results above do not measure a healthy server "
+                 f"(rerun with --allow-errors to accept them)")
+
+
+if __name__ == "__main__":
+    main()
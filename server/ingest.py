@@ -0,0 +1,297 @@
+"""
+Bulk ingestion of local CSV, JSON and Parquet files into the MinIO bucket.
+
+Files are converted to Parquet and uploaded in a pool of worker processes, so backfills
+scale with the number of cores instead of going through /convert-to-parquet one at a time.
+Progress is written to a state file after every file; re-running the same command skips
+files that were already ingested and have not changed since.
+
+    python ingest.py data/ "exports/**/*.csv" --workers 8 --analyze
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from utils import stream_to_parquet, parquet_object_name, MultipartUploadStream, get_minio_client
+from utils import get_catalog, process_parquet_batch, writer_profile
+from utils.storage import MINIO_PART_SIZE
+
+# Load environment variables from .env file
+load_dotenv()
+
+INGEST_EXTENSIONS = {'csv', 'json', 'parquet'}
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', os.cpu_count() or 2))
+INGEST_STATE_FILE = os.getenv('INGEST_STATE_FILE', '.ingest_state.json')
+
+MINIO_BUCKET_NAME = os.getenv('MINIO_BUCKET_NAME', 'parquet-files')
+MINIO_CONFIG = {
+    'endpoint': os.getenv('MINIO_ENDPOINT'),
+    'access_key': os.getenv('MINIO_ACCESS_KEY'),
+    'secret_key': os.getenv('MINIO_SECRET_KEY'),
+    'secure': os.getenv('MINIO_SECURE', 'False').lower() == 'true',
+}
+
+_worker_minio_client = None
+
+
+def _extension(path):
+    return path.rsplit('.', 1)[1].lower() if '.' in os.path.basename(path) else ''
+
+
+def find_input_files(sources):
+    """Expand directories (recursively) and glob patterns into a sorted list of ingestible files"""
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, filenames in os.walk(source):
+                paths.update(os.path.join(root, filename) for filename in filenames)
+        else:
+            paths.update(glob.glob(source, recursive=True))
+    return sorted(
+        os.path.abspath(path) for path in paths
+        if os.path.isfile(path) and _extension(path) in INGEST_EXTENSIONS
+    )
+
+
+def source_root(sources):
+    """
+    Common directory of the source arguments: a directory itself, a file's directory, or
+    the part of a glob pattern before its first wildcard. Object names are relative to it,
+    so they do not depend on which files are still pending.
+    """
+    roots = []
+    for source in sources:
+        base = source
+        while glob.has_magic(base):
+            base = os.path.dirname(base)
+        if not os.path.isdir(base or '.'):
+            base = os.path.dirname(base)
+        roots.append(os.path.abspath(base or '.'))
+    return os.path.commonpath(roots) if roots else None
+
+
+def file_fingerprint(path):
+    """Size and modification time; a changed fingerprint means the file is ingested again"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+class IngestState:
+    """Per-file ingestion results persisted to a JSON file so interrupted runs can resume"""
+    def __init__(self, path=INGEST_STATE_FILE):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+
+    def is_done(self, path, stage="uploaded"):
+        entry = self.files.get(path)
+        return (entry is not None and entry.get(stage, False)
+                and entry.get("fingerprint") == file_fingerprint(path))
+
+    def update(self, path, **fields):
+        self.files.setdefault(path, {}).update(fields)
+        self.save()
+
+    def save(self):
+        # Write to a temporary file and rename so a crash never leaves a truncated state file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"bucket": MINIO_BUCKET_NAME, "files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def _init_worker(minio_config):
+    """Each worker process builds its own MinIO client"""
+    global _worker_minio_client
+    _worker_minio_client = get_minio_client(**minio_config)
+
+
+def object_names(paths, prefix="", root=None):
+    """
+    Object name of each file: its path relative to `root` (by default the common directory
+    of all the files), so same-named files in different directories do not overwrite each other.
+    Files converted from the same stem, e.g. sales.csv and sales.json, keep their extension in
+    the name (sales_csv_<timestamp>.parquet, sales_json_<timestamp>.parquet).
+    Returns ({path: object name}, {path: error}) for files whose name another file still takes.
+    """
+    if not paths:
+        return {}, {}
+    root = root or os.path.commonpath([os.path.dirname(path) for path in paths])
+    converted = [os.path.splitext(path)[0] for path in paths if _extension(path) != 'parquet']
+    shared_stems = {stem for stem in converted if converted.count(stem) > 1}
+    names, duplicates, owners = {}, {}, {}
+    for path in paths:
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        stem, extension = os.path.splitext(relative)
+        if _extension(path) == 'parquet':
+            name = prefix + relative
+        elif os.path.splitext(path)[0] in shared_stems:
+            name = prefix + parquet_object_name(f"{stem}_{extension[1:].lower()}")
+        else:
+            name = prefix + parquet_object_name(relative)
+        if name in owners:
+            duplicates[path] = f"Object name {name} is also the target of {owners[name]}"
+            continue
+        owners[name] = path
+        names[path] = name
+    return names, duplicates
+
+
+def ingest_file(path, bucket_name, object_name, profile=None):
+    """Convert one local file to Parquet and upload it; Parquet inputs are uploaded unchanged"""
+    started = time.time()
+    file_extension = _extension(path)
+
+    with MultipartUploadStream(_worker_minio_client, bucket_name, object_name) as upload_stream:
+        if file_extension == 'parquet':
+            with open(path, 'rb') as source:
+                while chunk := source.read(MINIO_PART_SIZE):
+                    upload_stream.write(chunk)
+            rows, writer_stats = None, {}
+        else:
+            writer_stats = {}
+            with open(path, 'rb') as source:
+                rows = stream_to_parquet(source, upload_stream, file_extension, profile, writer_stats)
+        size = upload_stream.tell()
+
+    return {
+        "object_name": object_name,
+        "rows": rows,
+        "size": size,
+        "input_size": os.path.getsize(path),
+        "writer_profile": writer_stats.get("writer_profile"),
+        "encode_seconds": writer_stats.get("encode_seconds"),
+        "seconds": round(time.time() - started, 3),
+    }
+
+
+def ingest(paths, bucket_name=MINIO_BUCKET_NAME, minio_config=MINIO_CONFIG, workers=INGEST_WORKERS,
+           prefix="", state=None, log=print, profile=None, root=None):
+    """
+    Convert and upload files in a process pool, recording each result in the catalog and state.
+    `profile` is the Parquet writer profile, as returned by writer_profile(); object names are
+    relative to `root`, by default the common directory of `paths`.
+    Returns the object names uploaded by this run.
+    """
+    state = state or IngestState()
+    pending = [path for path in paths if not state.is_done(path)]
+    skipped = len(paths) - len(pending)
+    if skipped:
+        log(f"Skipping {skipped} file(s) already ingested")
+    if not pending:
+        return []
+
+    # Names are assigned from every file before anything is uploaded, so they are the same
+    # whichever files are still pending and no two files share one
+    names, duplicates = object_names(paths, prefix, root)
+    for path in set(pending) & set(duplicates):
+        error = duplicates[path]
+        log(f"FAILED {path}: {error}")
+        state.update(path, uploaded=False, error=error)
+    pending = [path for path in pending if path in names]
+    if not pending:
+        return []
+
+    uploaded = []
+    catalog = get_catalog()
+    started = time.time()
+    input_bytes = 0
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(pending)),
+        # spawn gives every worker a clean interpreter with its own connection pool
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(minio_config,)
+    ) as pool:
+        futures = {pool.submit(ingest_file, path, bucket_name, names[path], profile): path for path in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                log(f"[{done}/{len(pending)}] FAILED {path}: {e}")
+                state.update(path, uploaded=False, error=str(e))
+                continue
+
+            catalog.record(bucket_name, result["object_name"], result["size"])
+            state.update(path, uploaded=True, analyzed=False, error=None,
+                         fingerprint=file_fingerprint(path), **result)
+            uploaded.append(result["object_name"])
+            input_bytes += result["input_size"]
+            log(f"[{done}/{len(pending)}] {path} -> {result['object_name']} "
+                f"({result['size']} bytes in {result['seconds']}s)")
+
+    elapsed = time.time() - started
+    log(f"Ingested {len(uploaded)}/{len(pending)} file(s) in {elapsed:.1f}s "
+        f"({input_bytes / max(elapsed, 1e-9) / 1024 / 1024:.1f} MiB/s)")
+    return uploaded
+
+
+def analyze(paths, bucket_name=MINIO_BUCKET_NAME, minio_config=MINIO_CONFIG, workers=INGEST_WORKERS,
+            profile_mode="full", state=None, log=print):
+    """Profile and enrich every ingested file whose metadata has not been generated yet"""
+    state = state or IngestState()
+    by_object = {
+        state.files[path]["object_name"]: path
+        for path in paths
+        if state.is_done(path) and not state.is_done(path, "analyzed")
+    }
+    if not by_object:
+        return []
+
+    log(f"Analyzing {len(by_object)} file(s)")
+    minio_client = get_minio_client(**minio_config)
+    results = process_parquet_batch(minio_client, minio_config, bucket_name, list(by_object),
+                                    profile_mode=profile_mode, processes=workers,
+                                    progress=lambda stage: log(f"Analysis {stage}"))
+    for result in results:
+        succeeded = result.get("status") == "success"
+        state.update(by_object[result["file"]], analyzed=succeeded,
+                     error=None if succeeded else result.get("error"))
+        if not succeeded:
+            log(f"Analysis FAILED {result['file']}: {result.get('error')}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert local files to Parquet and upload them to MinIO in parallel")
+    parser.add_argument("sources", nargs="+", help="Files, directories or glob patterns (CSV, JSON or Parquet)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Worker processes (default: CPU count)")
+    parser.add_argument("--bucket", default=MINIO_BUCKET_NAME)
+    parser.add_argument("--prefix", default="", help="Object name prefix, e.g. backfill/2024/")
+    parser.add_argument("--state-file", default=INGEST_STATE_FILE, help="Progress file used to resume interrupted runs")
+    parser.add_argument("--writer-profile", help="Parquet writer profile: default, fast-write, small or scan-optimized")
+    parser.add_argument("--sort-by", help="Comma-separated columns to sort row groups by")
+    parser.add_argument("--analyze", action="store_true", help="Profile and enrich files after uploading them")
+    parser.add_argument("--profile-mode", choices=("full", "fast", "sketch", "incremental", "stream"), default=os.getenv('PROFILE_MODE', 'full'))
+    args = parser.parse_args(argv)
+
+    profile = writer_profile(args.writer_profile, args.sort_by.split(',') if args.sort_by else None)
+    paths = find_input_files(args.sources)
+    if not paths:
+        print("No CSV, JSON or Parquet files found")
+        return 1
+
+    minio_client = get_minio_client(**MINIO_CONFIG)
+    if not minio_client.bucket_exists(args.bucket):
+        minio_client.make_bucket(args.bucket)
+
+    state = IngestState(args.state_file)
+    ingest(paths, args.bucket, MINIO_CONFIG, args.workers, args.prefix, state, profile=profile,
+           root=source_root(args.sources))
+    if args.analyze:
+        analyze(paths, args.bucket, MINIO_CONFIG, args.workers, args.profile_mode, state)
+
+    failed = [path for path in paths if state.files.get(path, {}).get("error")]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,36 @@
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request
 import os
-import pandas as pd
+from werkzeug.http import http_date
 from werkzeug.utils import secure_filename
 from minio import Minio
 from minio.error import S3Error
-import io
-import tempfile
-from datetime import datetime
 from dotenv import load_dotenv
-from utils import process_parquet_file
+from utils import process_parquet_file, stream_to_parquet, parquet_object_name, MultipartUploadStream, iter_object_chunks, range_for_size, get_enrichment_cache, JobQueue, QueueFull
+from utils import process_parquet_batch, list_parquet_objects, get_minio_client, client_pool_stats
+from utils import get_catalog, start_reconciler, writer_profile
+from utils import run_query, iter_arrow_ipc, table_rows, QueryError
+from utils import dataset_name, list_dataset_versions, llm_usage_stats
+from utils import get_event_bus, ChannelProgress, iter_sse
+from utils import metrics_registry, render_metrics, start_trace, current_trace, reset_trace
+from utils import profile_object_name, render_profile_readme, readme_etag, load_profile
+from utils import DEDUP_UPLOADS, HashingReader, hash_stream, content_variant, find_duplicate
+import re
+import time
+import json
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = '.'
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_SIZE_MB', 1024)) * 1024 * 1024  # 1GB max file size by default
 ALLOWED_EXTENSIONS = {'csv', 'json'}
+PROFILE_MODES = ('full', 'fast', 'sketch', 'incremental', 'stream')
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'full')
+LIST_FILES_DEFAULT_LIMIT = 100
+LIST_FILES_MAX_LIMIT = 5000
+# Client-chosen ids for streaming the progress of a conversion
+PROGRESS_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
 
 # MinIO Configuration
 MINIO_ENDPOINT = os.getenv('MINIO_ENDPOINT')
@@ -25,77 +39,157 @@ MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY')
 MINIO_BUCKET_NAME = os.getenv('MINIO_BUCKET_NAME', 'parquet-files')
 MINIO_SECURE = os.getenv('MINIO_SECURE', 'False').lower() == 'true'
 
+MINIO_CONFIG = {
+    'endpoint': MINIO_ENDPOINT,
+    'access_key': MINIO_ACCESS_KEY,
+    'secret_key': MINIO_SECRET_KEY,
+    'secure': MINIO_SECURE,
+}
+
+# Run as `python server.py`, spawned worker processes (process_parquet_batch) re-import this
+# script as __mp_main__; they only need its functions, not the bucket check or the reconciler
+SERVER_PROCESS = __name__ != '__mp_main__'
+
 # Initialize MinIO client
 try:
-    minio_client = Minio(
-        MINIO_ENDPOINT,
-        access_key=MINIO_ACCESS_KEY,
-        secret_key=MINIO_SECRET_KEY,
-        secure=MINIO_SECURE,
-    )
+    # Shared client with a tuned connection pool; forked workers rebind it (see _rebuild_minio_client)
+    minio_client = get_minio_client(**MINIO_CONFIG)
     
     # Create bucket if it doesn't exist
-    if not minio_client.bucket_exists(MINIO_BUCKET_NAME):
-        minio_client.make_bucket(MINIO_BUCKET_NAME)
-        print(f"Created bucket: {MINIO_BUCKET_NAME}")
-    else:
-        print(f"Bucket {MINIO_BUCKET_NAME} already exists")
+    if SERVER_PROCESS:
+        if not minio_client.bucket_exists(MINIO_BUCKET_NAME):
+            minio_client.make_bucket(MINIO_BUCKET_NAME)
+            print(f"Created bucket: {MINIO_BUCKET_NAME}")
+        else:
+            print(f"Bucket {MINIO_BUCKET_NAME} already exists")
         
 except Exception as e:
     print(f"Failed to initialize MinIO client: {e}")
     minio_client = None
 
+
+def _rebuild_minio_client():
+    """Forked workers (e.g. gunicorn --preload) get their own client instead of the parent's sockets"""
+    global minio_client
+    if isinstance(minio_client, Minio):
+        minio_client = get_minio_client(**MINIO_CONFIG)
+
+
+# Runs after utils.clients has cleared its registry in the child, so the client is built anew
+os.register_at_fork(after_in_child=_rebuild_minio_client)
+
+# Background workers for long-running analysis jobs; progress is published on the event bus
+event_bus = get_event_bus()
+job_queue = JobQueue(event_bus=event_bus)
+
+# Keep the file catalog in sync with objects written outside this server
+if minio_client and SERVER_PROCESS:
+    start_reconciler(minio_client, MINIO_BUCKET_NAME)
+
+# Request latency and scrape-time gauges, exposed with the stage metrics at /metrics
+http_request_seconds = metrics_registry.histogram(
+    "datalens_http_request_duration_seconds", "HTTP request latency", ("method", "endpoint", "status"))
+jobs_gauge = metrics_registry.gauge("datalens_jobs", "Background jobs by state", ("state",))
+llm_in_flight_gauge = metrics_registry.gauge("datalens_llm_requests_in_flight", "LLM requests currently in flight")
+
+def trace_requested():
+    return request.args.get('trace', '').lower() in ('1', 'true') or request.headers.get('X-Trace', '').lower() in ('1', 'true')
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    # ?trace=true (or X-Trace: 1) adds the stages of this request to its JSON response
+    if trace_requested():
+        g.trace_token = start_trace()
+
+@app.after_request
+def record_request_timing(response):
+    http_request_seconds.observe(
+        time.perf_counter() - g.request_started, method=request.method,
+        endpoint=request.url_rule.rule if request.url_rule else 'unmatched', status=response.status_code)
+    if 'trace_token' in g and response.is_json and not response.is_streamed:
+        body = response.get_json()
+        if isinstance(body, dict):
+            body['trace'] = current_trace()
+            response.set_data(app.json.dumps(body))
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        reset_trace(token)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def convert_to_parquet(file_content, filename, file_extension):
-    """Convert CSV or JSON file content to Parquet format and upload to MinIO"""
-    # Create a temporary file to process the data
-    with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=f'.{file_extension}') as temp_file:
-        temp_file.write(file_content)
-        temp_filepath = temp_file.name
-    
-    try:
-        # Read the file based on extension
-        if file_extension == 'csv':
-            dataFrame = pd.read_csv(temp_filepath)
-        elif file_extension == 'json':
-            dataFrame = pd.read_json(temp_filepath, orient="records", lines=True)
-        else:
-            raise ValueError(f"Unsupported file extension: {file_extension}")
-        
-        # Convert to Parquet in memory
-        parquet_buffer = io.BytesIO()
-        dataFrame.to_parquet(parquet_buffer, index=False)
-        parquet_data = parquet_buffer.getvalue()
-        
-        # Generate Parquet filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        original_name = os.path.splitext(filename)[0]
-        parquet_filename = f"{original_name}_{timestamp}.parquet"
-        
-        # Upload to MinIO
-        if minio_client:
-            parquet_buffer_for_upload = io.BytesIO(parquet_data)
-            minio_client.put_object(
-                MINIO_BUCKET_NAME,
-                parquet_filename,
-                parquet_buffer_for_upload,
-                length=len(parquet_data),
-                content_type='application/octet-stream'
-            )
-            
-            return parquet_filename, len(dataFrame), len(parquet_data)
-        else:
-            raise Exception("MinIO client not initialized")
-            
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_filepath):
-            os.remove(temp_filepath)
+def convert_to_parquet(file_stream, filename, file_extension, profile=None, progress=None, dedup=DEDUP_UPLOADS):
+    """
+    Stream CSV or JSON content into Parquet format and upload to MinIO.
+    Returns the object name, rows converted, Parquet size and the writer stats.
+    `progress`, if given, is called with rows converted and bytes uploaded as conversion proceeds.
+    With dedup, content already converted with the same writer settings is not stored again:
+    the existing object is returned and writer_stats["duplicate"] is True.
+    """
+    progress = progress or (lambda stage, **details: None)
+    profile = profile or writer_profile()
+
+    if not minio_client:
+        raise Exception("MinIO client not initialized")
+
+    catalog = get_catalog()
+    variant = content_variant(file_extension, profile)
+    digest = None
+    if dedup and file_stream.seekable():
+        # Uploads are spooled, so one hashing pass decides whether any conversion is needed
+        progress("hashing")
+        digest, input_size = hash_stream(file_stream)
+        duplicate = find_duplicate(minio_client, MINIO_BUCKET_NAME, digest, variant)
+        if duplicate is not None:
+            return duplicate['name'], duplicate['rows'], duplicate['size'], {
+                'input_size': input_size, 'encode_seconds': 0.0, 'writer_profile': profile['name'],
+                'content_sha256': digest, 'duplicate': True}
+        file_stream.seek(0)
+
+    # Otherwise hash the stream while it is converted
+    source = HashingReader(file_stream) if dedup and digest is None else file_stream
+
+    # Generate Parquet filename with timestamp
+    parquet_filename = parquet_object_name(filename)
+
+    # Row groups are uploaded as multipart parts while the file is still being written;
+    # a failed conversion aborts the upload so no partial parts are left behind
+    progress("converting", rows=0, bytes_read=0, bytes_uploaded=0)
+    with MultipartUploadStream(minio_client, MINIO_BUCKET_NAME, parquet_filename) as upload_stream:
+        writer_stats = {}
+        rows_converted = stream_to_parquet(
+            source, upload_stream, file_extension, profile, writer_stats,
+            progress=lambda stage, **details: progress(stage, bytes_uploaded=upload_stream.bytes_sent, **details))
+        if source is not file_stream:
+            digest = source.hexdigest()
+            duplicate = find_duplicate(minio_client, MINIO_BUCKET_NAME, digest, variant)
+            if duplicate is not None:
+                # The copy is discarded before its upload is committed
+                upload_stream.abort()
+                return duplicate['name'], duplicate['rows'], duplicate['size'], {
+                    **writer_stats, 'content_sha256': digest, 'duplicate': True}
+        file_size = upload_stream.tell()
+        progress("uploading", rows=rows_converted, bytes_uploaded=upload_stream.bytes_sent, file_size=file_size)
+
+    catalog.record(MINIO_BUCKET_NAME, parquet_filename, file_size)
+    if digest is not None:
+        catalog.record_content(MINIO_BUCKET_NAME, digest, variant, parquet_filename, rows_converted, file_size)
+        writer_stats.update(content_sha256=digest, duplicate=False)
+
+    return parquet_filename, rows_converted, file_size, writer_stats
 
 @app.route('/convert-to-parquet', methods=['POST'])
 def convert_file_to_parquet():
+    """
+    Convert an uploaded CSV or JSON file to Parquet.
+    With a progress_id, progress is streamed at /events/<progress_id> while the upload runs.
+    """
+    progress = None
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file selected'}), 400
@@ -114,77 +208,170 @@ def convert_file_to_parquet():
         # Get filename and extension
         filename = secure_filename(file.filename)
         file_extension = filename.rsplit('.', 1)[1].lower()
-        
-        # Read file content
-        file_content = file.read()
-        
-        # Convert to Parquet and upload to MinIO
-        parquet_filename, rows_converted, file_size = convert_to_parquet(file_content, filename, file_extension)
+
+        # Progress channel chosen by the client, so it can subscribe before the upload finishes
+        progress_id = request.values.get('progress_id')
+        if progress_id is not None:
+            if not PROGRESS_ID_PATTERN.match(progress_id):
+                return jsonify({'error': 'progress_id must be 1-64 letters, digits, "-" or "_"'}), 400
+            if not event_bus.open(progress_id):
+                # A retry of a conversion that is still running
+                return jsonify({
+                    'error': f'Conversion {progress_id} is already in progress',
+                    'events_url': f'/events/{progress_id}'
+                }), 409
+            progress = ChannelProgress(progress_id, event_bus)
+            progress("received", input_file=filename)
+
+        # Writer profile and sort columns, from the form or the query string
+        sort_by = request.values.get('sort_by')
+        try:
+            profile = writer_profile(
+                request.values.get('profile'),
+                [column.strip() for column in sort_by.split(',') if column.strip()] if sort_by else None)
+        except ValueError as e:
+            if progress:
+                progress.finish(error=str(e))
+            return jsonify({'error': str(e)}), 400
+
+        # Convert to Parquet and upload to MinIO, streaming from the upload
+        parquet_filename, rows_converted, file_size, writer_stats = convert_to_parquet(
+            file.stream, filename, file_extension, profile, progress)
         
         # Generate MinIO URL for the uploaded file (optional)
         protocol = "https" if MINIO_SECURE else "http"
         minio_url = f"{protocol}://{MINIO_ENDPOINT}/{MINIO_BUCKET_NAME}/{parquet_filename}"
         
-        return jsonify({
+        result = {
             'message': f'{file_extension.upper()} file converted to Parquet and uploaded to MinIO successfully',
             'input_file': filename,
             'output_file': parquet_filename,
+            'deduplicated': writer_stats.get('duplicate', False),
+            'content_sha256': writer_stats.get('content_sha256'),
             'rows_converted': rows_converted,
             'file_size': file_size,
+            'input_size': writer_stats['input_size'],
+            'compression_ratio': round(writer_stats['input_size'] / file_size, 2) if file_size else None,
+            'encode_seconds': writer_stats['encode_seconds'],
+            'writer_profile': writer_stats['writer_profile'],
+            'sort_by': profile['sort_by'],
             'minio_bucket': MINIO_BUCKET_NAME,
-            'minio_url': minio_url
-        })
+            'minio_url': minio_url,
+            'progress_id': progress_id
+        }
+        if result['deduplicated']:
+            # Identical content was converted before; hand back that object and its profile
+            result['message'] = 'Identical file already stored; returning the existing Parquet object'
+            try:
+                result['profile'] = load_profile(minio_client, MINIO_BUCKET_NAME, parquet_filename)
+            except S3Error:
+                result['profile'] = None
+        if progress:
+            progress.finish(result)
+        return jsonify(result)
         
     except S3Error as e:
+        if progress:
+            progress.finish(error=f'MinIO error: {str(e)}')
         return jsonify({'error': f'MinIO error: {str(e)}'}), 500
     except Exception as e:
+        if progress:
+            progress.finish(error=f'Conversion failed: {str(e)}')
         return jsonify({'error': f'Conversion failed: {str(e)}'}), 500
 
 @app.route('/list-files', methods=['GET'])
 def list_minio_files():
-    """List all files in the MinIO bucket"""
+    """List files in the MinIO bucket from the local catalog, one page at a time"""
     try:
         if not minio_client:
             return jsonify({'error': 'MinIO storage not available'}), 500
         
-        objects = minio_client.list_objects(MINIO_BUCKET_NAME)
-        files = []
-        
-        for obj in objects:
-            files.append({
-                'filename': obj.object_name,
-                'size': obj.size,
-                'last_modified': obj.last_modified.isoformat() if obj.last_modified else None,
-                'download_url': f"http://{MINIO_ENDPOINT}/{MINIO_BUCKET_NAME}/{obj.object_name}"
-            })
+        # The background reconciler fills the catalog; only an explicit refresh waits for a bucket walk
+        catalog = get_catalog()
+        if request.args.get('refresh', 'false').lower() == 'true':
+            catalog.reconcile(minio_client, MINIO_BUCKET_NAME)
+
+        analyzed = request.args.get('analyzed')
+        if analyzed is not None:
+            analyzed = analyzed.lower() == 'true'
+        limit = min(max(request.args.get('limit', LIST_FILES_DEFAULT_LIMIT, type=int), 1), LIST_FILES_MAX_LIMIT)
+        count = request.args.get('count', 'false').lower() == 'true'
+
+        try:
+            page = catalog.list(
+                MINIO_BUCKET_NAME,
+                prefix=request.args.get('prefix', ''),
+                extension=request.args.get('extension'),
+                analyzed=analyzed,
+                sort=request.args.get('sort', 'name'),
+                descending=request.args.get('order', 'asc').lower() == 'desc',
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                sidecars=request.args.get('sidecars', 'false').lower() == 'true',
+                count=count
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        files = [
+            {**entry, 'download_url': f"http://{MINIO_ENDPOINT}/{MINIO_BUCKET_NAME}/{entry['filename']}"}
+            for entry in page['files']
+        ]
         
-        return jsonify({
+        listing = {
             'bucket': MINIO_BUCKET_NAME,
             'files': files,
-            'total_files': len(files)
-        })
+            'next_cursor': page['next_cursor'],
+            'reconciled': MINIO_BUCKET_NAME in catalog.last_reconciled
+        }
+        if count:
+            listing['total_files'] = page['total']
+        return jsonify(listing)
         
     except S3Error as e:
         return jsonify({'error': f'MinIO error: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Failed to list files: {str(e)}'}), 500
 
-@app.route('/download/<filename>', methods=['GET'])
+@app.route('/download/<path:filename>', methods=['GET'])
 def download_file(filename):
-    """Download a file from MinIO bucket"""
+    """Stream a file from MinIO bucket, honouring Range and If-None-Match headers"""
     try:
         if not minio_client:
             return jsonify({'error': 'MinIO storage not available'}), 500
         
-        # Get the file from MinIO
-        response = minio_client.get_object(MINIO_BUCKET_NAME, filename)
-        
-        # Return the file content
-        from flask import Response
+        stat = minio_client.stat_object(MINIO_BUCKET_NAME, filename)
+        headers = {
+            'Content-Disposition': f'attachment; filename={os.path.basename(filename)}',
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{stat.etag}"',
+        }
+        if stat.last_modified:
+            headers['Last-Modified'] = http_date(stat.last_modified)
+
+        # Conditional download: the client already has this version
+        if request.if_none_match.contains(stat.etag):
+            return Response(status=304, headers=headers)
+
+        # Partial download, e.g. a Parquet reader fetching only the footer
+        offset, length, status = 0, stat.size, 200
+        if request.range is not None:
+            byte_range = range_for_size(request.range, stat.size)
+            if byte_range is None:
+                return Response(status=416, headers={**headers, 'Content-Range': f'bytes */{stat.size}'})
+            start, stop = byte_range
+            offset, length, status = start, stop - start, 206
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{stat.size}'
+        headers['Content-Length'] = str(length)
+
+        # Stream the object in chunks instead of buffering it in memory
+        response = minio_client.get_object(MINIO_BUCKET_NAME, filename, offset=offset, length=length)
         return Response(
-            response.data,
+            iter_object_chunks(response),
+            status=status,
             mimetype='application/octet-stream',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
+            headers=headers,
+            direct_passthrough=True
         )
         
     except S3Error as e:
@@ -192,9 +379,92 @@ def download_file(filename):
     except Exception as e:
         return jsonify({'error': f'Download failed: {str(e)}'}), 500
 
-@app.route('/process-parquet/<filename>', methods=['POST'])
+@app.route('/query/<path:filename>', methods=['POST'])
+def query_file(filename):
+    """
+    Run a projection, filter and group-by query against a stored Parquet file.
+    Only the row groups and columns the query needs are fetched from MinIO.
+    The result is JSON, or an Arrow IPC stream with format=arrow or an Arrow Accept header.
+    """
+    try:
+        if not minio_client:
+            return jsonify({'error': 'MinIO storage not available'}), 500
+
+        if not filename.endswith('.parquet'):
+            return jsonify({'error': 'Only parquet files can be queried'}), 400
+
+        query = request.get_json(silent=True) or {}
+        table, stats = run_query(
+            minio_client, MINIO_BUCKET_NAME, filename,
+            columns=query.get('columns'),
+            filters=query.get('filters'),
+            group_by=query.get('group_by'),
+            aggregations=query.get('aggregations'),
+            order_by=query.get('order_by'),
+            limit=query.get('limit'))
+
+        arrow_mimetype = 'application/vnd.apache.arrow.stream'
+        if query.get('format') == 'arrow' or request.accept_mimetypes.best == arrow_mimetype:
+            return Response(
+                iter_arrow_ipc(table),
+                mimetype=arrow_mimetype,
+                headers={'X-Query-Stats': json.dumps(stats)})
+
+        return jsonify({
+            'file': filename,
+            'columns': table.column_names,
+            'rows': table_rows(table),
+            'stats': stats,
+        })
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except S3Error as e:
+        return jsonify({'error': f'File not found or MinIO error: {str(e)}'}), 404
+    except Exception as e:
+        return jsonify({'error': f'Query failed: {str(e)}'}), 500
+
+def run_parquet_analysis(filename, profile_mode, progress=None, trace=False):
+    """
+    Process a parquet file and build the response payload; runs on a job worker.
+    With trace, the payload includes the timed stages of the analysis.
+    """
+    trace_token = start_trace() if trace else None
+    try:
+        result = process_parquet_file(minio_client, MINIO_BUCKET_NAME, filename, profile_mode=profile_mode, progress=progress)
+        spans = current_trace()
+    finally:
+        if trace_token is not None:
+            reset_trace(trace_token)
+    return analysis_payload(filename, result, spans)
+
+def analysis_payload(filename, result, spans=None):
+    """The job result of an analysis; raises if processing failed"""
+    if result['status'] != 'success':
+        raise Exception(f'Processing failed: {result["error"]}')
+
+    return {
+        'message': 'Parquet file processed successfully',
+        'input_file': filename,
+        'metadata_file': result['metadata_file'],
+        'profile_file': result.get('profile_file'),
+        'rows': result['rows'],
+        'columns': result['columns'],
+        'profile_mode': result['profile_mode'],
+        'sketches_file': result.get('sketches_file'),
+        'previous_version': result.get('previous_version'),
+        'row_groups_reused': result.get('row_groups_reused'),
+        'row_groups_profiled': result.get('row_groups_profiled'),
+        'enrichment_reused': result.get('enrichment_reused', False),
+        'enrichment': result.get('enrichment'),
+        'streaming': result.get('streaming'),
+        'trace': spans,
+        'summary': result['summary']
+    }
+
+@app.route('/process-parquet/<path:filename>', methods=['POST'])
 def process_parquet_metadata(filename):
-    """Process a parquet file and generate metadata"""
+    """Queue a parquet file for metadata generation and return the job id"""
     try:
         if not minio_client:
             return jsonify({'error': 'MinIO storage not available'}), 500
@@ -205,34 +475,189 @@ def process_parquet_metadata(filename):
         except S3Error:
             return jsonify({'error': f'File {filename} not found in bucket'}), 404
         
-        # Process the parquet file
-        result = process_parquet_file(minio_client, MINIO_BUCKET_NAME, filename)
-        
-        if result['status'] == 'success':
+        # "fast" profiles from the Parquet footer and sampled row groups only,
+        # "sketch" uses HyperLogLog/KLL sketches for distinct counts and quantiles,
+        # "stream" profiles out of core in batches bounded by STREAM_MEMORY_LIMIT_MB
+        profile_mode = request.args.get('mode', PROFILE_MODE)
+        if profile_mode not in PROFILE_MODES:
+            return jsonify({'error': f'Invalid mode. Expected one of: {", ".join(PROFILE_MODES)}'}), 400
+
+        # Process the parquet file on a background worker; a retry while the same
+        # analysis is still queued or running joins that job
+        params = {'filename': filename, 'profile_mode': profile_mode}
+        try:
+            job, submitted = job_queue.submit_once(
+                'process-parquet', run_parquet_analysis, params=params,
+                filename=filename, profile_mode=profile_mode, trace=trace_requested())
+        except QueueFull as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+        if not submitted:
             return jsonify({
-                'message': 'Parquet file processed successfully',
-                'input_file': filename,
-                'metadata_file': result['metadata_file'],
-                'rows': result['rows'],
-                'columns': result['columns'],
-                'summary': result['summary']
-            })
-        else:
-            return jsonify({'error': f'Processing failed: {result["error"]}'}), 500
+                'message': 'Parquet file is already being processed',
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f'/jobs/{job.id}',
+                'events_url': f'/events/{job.id}'
+            }), 200
+
+        return jsonify({
+            'message': 'Parquet file queued for processing',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'events_url': f'/events/{job.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
-@app.route('/get-metadata/<filename>', methods=['GET'])
+def run_parquet_batch(filenames, profile_mode, progress=None):
+    """Process many parquet files and summarize per-file outcomes; runs on a job worker"""
+    results = process_parquet_batch(
+        minio_client, MINIO_CONFIG, MINIO_BUCKET_NAME, filenames, profile_mode=profile_mode, progress=progress)
+    succeeded = sum(1 for result in results if result['status'] == 'success')
+    return {
+        'message': f'Processed {succeeded} of {len(results)} parquet files',
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'profile_mode': profile_mode,
+        'files': results
+    }
+
+@app.route('/process-parquet-batch', methods=['POST'])
+def process_parquet_batch_metadata():
+    """Queue metadata generation for a list of parquet files or every parquet file under a prefix"""
+    try:
+        if not minio_client:
+            return jsonify({'error': 'MinIO storage not available'}), 500
+
+        body = request.get_json(silent=True) or {}
+        profile_mode = request.args.get('mode', body.get('mode', PROFILE_MODE))
+        if profile_mode not in PROFILE_MODES:
+            return jsonify({'error': f'Invalid mode. Expected one of: {", ".join(PROFILE_MODES)}'}), 400
+
+        if 'files' in body:
+            if not isinstance(body['files'], list):
+                return jsonify({'error': 'files must be a list of object names'}), 400
+            filenames = list(dict.fromkeys(body['files']))
+        elif 'prefix' in body:
+            filenames = list_parquet_objects(minio_client, MINIO_BUCKET_NAME, body['prefix'])
+        else:
+            return jsonify({'error': 'Provide either files or prefix'}), 400
+
+        if not filenames:
+            return jsonify({'error': 'No parquet files to process'}), 400
+
+        try:
+            job = job_queue.submit(
+                'process-parquet-batch', run_parquet_batch,
+                params={'files': len(filenames), 'profile_mode': profile_mode},
+                filenames=filenames, profile_mode=profile_mode)
+        except QueueFull as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+        return jsonify({
+            'message': f'{len(filenames)} parquet files queued for processing',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'events_url': f'/events/{job.id}'
+        }), 202
+
+    except S3Error as e:
+        return jsonify({'error': f'MinIO error: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Processing failed: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Get the status, progress stages and result of a background job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List recent background jobs and queue capacity"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'queue': job_queue.stats(),
+        'jobs': [
+            {key: value for key, value in job.to_dict().items() if key != 'result'}
+            for job in job_queue.list(limit)
+        ]
+    })
+
+@app.route('/events/<channel>', methods=['GET'])
+def stream_events(channel):
+    """
+    Stream the progress events of a job or a conversion (by progress_id) as Server-Sent Events.
+    Events are "progress" (stage and details), then "result" or "error"; the stream ends after
+    the final event. Reconnecting clients resume after their Last-Event-ID.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', '0'))
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+
+    return Response(
+        iter_sse(channel, last_event_id, event_bus),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/datasets/<path:dataset>/versions', methods=['GET'])
+def dataset_versions(dataset):
+    """List the uploads of a logical dataset, oldest first; a file name resolves to its dataset"""
+    try:
+        if not minio_client:
+            return jsonify({'error': 'MinIO storage not available'}), 500
+
+        if dataset.endswith('.parquet'):
+            dataset = dataset_name(dataset)
+        versions = list_dataset_versions(minio_client, MINIO_BUCKET_NAME, dataset)
+        for version in versions:
+            version['last_modified'] = version['last_modified'].isoformat() if version['last_modified'] else None
+        return jsonify({'dataset': dataset, 'versions': versions, 'total': len(versions)})
+
+    except S3Error as e:
+        return jsonify({'error': f'MinIO error: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Failed to list versions: {str(e)}'}), 500
+
+@app.route('/get-metadata/<path:filename>', methods=['GET'])
 def get_metadata_file(filename):
-    """Get metadata file content for a parquet file"""
+    """
+    Get the README of a parquet file, rendered from its profile sidecar.
+    Renders are cached per sidecar ETag and If-None-Match is honoured.
+    """
     try:
         if not minio_client:
             return jsonify({'error': 'MinIO storage not available'}), 500
         
         # Generate metadata filename
         metadata_filename = os.path.splitext(filename)[0] + "_metadata.md"
+
+        try:
+            stat = minio_client.stat_object(MINIO_BUCKET_NAME, profile_object_name(filename))
+        except S3Error:
+            stat = None
+
+        if stat is not None:
+            etag = readme_etag(stat.etag)
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers=headers)
+            content = render_profile_readme(minio_client, MINIO_BUCKET_NAME, filename, etag)
+            return jsonify({
+                'filename': metadata_filename,
+                'content': content,
+                'source': 'profile'
+            }), 200, headers
         
+        # Files processed before profile sidecars existed only have the stored README
         try:
             # Get the metadata file from MinIO
             response = minio_client.get_object(MINIO_BUCKET_NAME, metadata_filename)
@@ -240,7 +665,8 @@ def get_metadata_file(filename):
             
             return jsonify({
                 'filename': metadata_filename,
-                'content': metadata_content
+                'content': metadata_content,
+                'source': 'stored'
             })
             
         except S3Error:
@@ -249,6 +675,67 @@ def get_metadata_file(filename):
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve metadata: {str(e)}'}), 500
 
+@app.route('/profile/<path:filename>', methods=['GET'])
+def get_profile(filename):
+    """
+    Structured profile of a processed parquet file (row and column counts, per-field statistics
+    and descriptions), served from its JSON sidecar without re-analysing the file
+    """
+    try:
+        if not minio_client:
+            return jsonify({'error': 'MinIO storage not available'}), 500
+
+        profile_filename = profile_object_name(filename)
+        try:
+            stat = minio_client.stat_object(MINIO_BUCKET_NAME, profile_filename)
+        except S3Error:
+            return jsonify({'error': f'No profile for {filename}; process the file first'}), 404
+
+        headers = {'ETag': f'"{stat.etag}"', 'Cache-Control': 'no-cache'}
+        if stat.last_modified:
+            headers['Last-Modified'] = http_date(stat.last_modified)
+        if request.if_none_match.contains(stat.etag):
+            return Response(status=304, headers=headers)
+
+        response = minio_client.get_object(MINIO_BUCKET_NAME, profile_filename)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        return Response(body, mimetype='application/json', headers=headers)
+
+    except S3Error as e:
+        return jsonify({'error': f'MinIO error: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Failed to retrieve profile: {str(e)}'}), 500
+
+@app.route('/enrichment-cache', methods=['GET'])
+def enrichment_cache_stats():
+    """Report hit/miss counters of the LLM enrichment cache and token usage of enrichment batches"""
+    cache = get_enrichment_cache()
+    if cache is None:
+        return jsonify({'enabled': False, 'llm_usage': llm_usage_stats()})
+    return jsonify({'enabled': True, **cache.stats(), 'llm_usage': llm_usage_stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, bytes and rows processed, rows per second,
+    MinIO and LLM calls by outcome, LLM tokens, cache lookups, HTTP latency and job queue gauges
+    """
+    queue_stats = job_queue.stats()
+    jobs_gauge.set(queue_stats['pending'], state='pending')
+    jobs_gauge.set(queue_stats['running'], state='running')
+    llm_pool = client_pool_stats()['groq']
+    llm_in_flight_gauge.set(llm_pool['in_flight'] if llm_pool else 0)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/client-pools', methods=['GET'])
+def client_pools():
+    """Report connection pool usage of the shared MinIO and LLM clients"""
+    return jsonify(client_pool_stats())
+
 @app.route('/')
 def hello_world():
     return render_template('index.html')
@@ -3,13 +3,88 @@ Utils package for data processing and summarization
 """
 
 from .enrich import Summarizer, read_dataframe
-from .summarizer import process_parquet_file, get_groq_llm, generate_readme_content, save_metadata_to_bucket
+from .summarizer import process_parquet_file, process_parquet_file_async, get_groq_llm, generate_readme_content, save_metadata_to_bucket
+from .convert import stream_to_parquet, parquet_object_name, writer_profile
+from .storage import MultipartUploadStream, MinioObjectFile, iter_object_chunks, range_for_size
+from .cache import get_enrichment_cache
+from .jobs import JobQueue, QueueFull
+from .clients import get_minio_client, get_groq_client, get_async_groq_client, client_pool_stats
+from .catalog import Catalog, get_catalog, start_reconciler
+from .batch import process_parquet_batch, list_parquet_objects
+from .query import run_query, iter_arrow_ipc, table_rows, QueryError
+from .incremental import dataset_name, list_dataset_versions
+from .enrichment import enrich_in_batches, enrich_in_batches_async, llm_usage_stats
+from .events import get_event_bus, ChannelProgress, iter_sse
+from .metrics import registry as metrics_registry, timed, render_metrics, start_trace, current_trace, reset_trace
+from .profiles import profile_object_name, load_profile, render_readme, render_profile_readme, readme_etag, cached_readme, cache_readme
+from .dedup import DEDUP_UPLOADS, HashingReader, hash_stream, content_variant, find_duplicate
+from .aio import run_blocking, AsyncObjectStore, RouteLimiter, RouteBusy, ASYNC_REQUEST_TIMEOUT
+from .streaming import Reservoir, profile_stream, profile_parquet_stream, profile_csv_stream
 
 __all__ = [
     'Summarizer',
     'read_dataframe', 
     'process_parquet_file',
+    'process_parquet_file_async',
     'get_groq_llm',
     'generate_readme_content',
-    'save_metadata_to_bucket'
+    'save_metadata_to_bucket',
+    'stream_to_parquet',
+    'parquet_object_name',
+    'writer_profile',
+    'MultipartUploadStream',
+    'MinioObjectFile',
+    'iter_object_chunks',
+    'range_for_size',
+    'get_enrichment_cache',
+    'JobQueue',
+    'QueueFull',
+    'process_parquet_batch',
+    'list_parquet_objects',
+    'get_minio_client',
+    'get_groq_client',
+    'get_async_groq_client',
+    'client_pool_stats',
+    'Catalog',
+    'get_catalog',
+    'start_reconciler',
+    'run_query',
+    'table_rows',
+    'iter_arrow_ipc',
+    'QueryError',
+    'dataset_name',
+    'list_dataset_versions',
+    'enrich_in_batches',
+    'enrich_in_batches_async',
+    'llm_usage_stats',
+    'get_event_bus',
+    'ChannelProgress',
+    'iter_sse',
+    'metrics_registry',
+    'timed',
+    'render_metrics',
+    'start_trace',
+    'current_trace',
+    'reset_trace',
+    'profile_object_name',
+    'load_profile',
+    'render_readme',
+    'render_profile_readme',
+    'readme_etag',
+    'cached_readme',
+    'cache_readme',
+    'DEDUP_UPLOADS',
+    'HashingReader',
+    'hash_stream',
+    'content_variant',
+    'find_duplicate',
+    'run_blocking',
+    'AsyncObjectStore',
+    'RouteLimiter',
+    'RouteBusy',
+    'ASYNC_REQUEST_TIMEOUT',
+    'Reservoir',
+    'profile_stream',
+    'profile_parquet_stream',
+    'profile_csv_stream'
 ]
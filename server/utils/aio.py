@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import dotenv
+
+from .metrics import timed
+from .storage import DOWNLOAD_CHUNK_SIZE
+
+dotenv.load_dotenv()
+
+# Threads that run blocking MinIO calls for the async server
+ASYNC_IO_THREADS = int(os.getenv('ASYNC_IO_THREADS', 64))
+# Requests served at once per route when ASYNC_ROUTE_LIMITS does not name it
+ASYNC_ROUTE_CONCURRENCY = int(os.getenv('ASYNC_ROUTE_CONCURRENCY', 256))
+# Per-route overrides, e.g. "download=64,process-parquet=32"
+ASYNC_ROUTE_LIMITS = os.getenv('ASYNC_ROUTE_LIMITS', 'download=64,process-parquet=32')
+# Seconds a request waits for a slot on a busy route before it is rejected with 503
+ASYNC_QUEUE_TIMEOUT = float(os.getenv('ASYNC_QUEUE_TIMEOUT', 5))
+# Seconds a request may take to produce its response before it is answered with 504
+ASYNC_REQUEST_TIMEOUT = float(os.getenv('ASYNC_REQUEST_TIMEOUT', 30))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _io_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ASYNC_IO_THREADS, thread_name_prefix="aio")
+        return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded I/O executor, in a copy of the caller's context"""
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_io_executor(), call)
+
+
+class AsyncObjectStore:
+    """Awaitable view of a MinIO client; each call runs on the bounded I/O executor"""
+    def __init__(self, minio_client):
+        self.client = minio_client
+
+    async def stat_object(self, bucket_name, object_name):
+        return await run_blocking(self.client.stat_object, bucket_name, object_name)
+
+    async def get_object(self, bucket_name, object_name, offset=0, length=0):
+        return await run_blocking(self.client.get_object, bucket_name, object_name, offset=offset, length=length)
+
+    async def read_object(self, bucket_name, object_name) -> bytes:
+        """The whole content of a small object, in one GET"""
+        def read():
+            with timed("minio_get_object", backend="minio") as span:
+                response = self.client.get_object(bucket_name, object_name)
+                try:
+                    data = response.read()
+                finally:
+                    response.close()
+                    response.release_conn()
+                span.bytes_in = len(data)
+                return data
+        return await run_blocking(read)
+
+    async def iter_chunks(self, response, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        """Yield a get_object response in chunks and return its connection to the pool when done"""
+        # A client that disconnects early cancels or closes the stream, which is not a MinIO error
+        with timed("download", backend="minio", expected=(GeneratorExit, asyncio.CancelledError)) as span:
+            span.bytes_out = 0
+            try:
+                while chunk := await run_blocking(response.read, chunk_size):
+                    span.bytes_out += len(chunk)
+                    yield chunk
+            finally:
+                response.close()
+                response.release_conn()
+
+
+class RouteBusy(Exception):
+    """Raised when a route stays at its concurrency limit for longer than the queue timeout"""
+
+
+def parse_route_limits(spec: str) -> dict:
+    """Parse "route=limit,..." into a dict"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        route, _, limit = item.partition('=')
+        limits[route.strip()] = int(limit)
+    return limits
+
+
+class RouteLimiter:
+    """
+    Per-route concurrency limits for the event loop. A request waits up to `queue_timeout`
+    seconds for a slot, then RouteBusy is raised so the server can shed load with a 503.
+    """
+    def __init__(self, default: int = ASYNC_ROUTE_CONCURRENCY, limits: Optional[dict] = None,
+                 queue_timeout: float = ASYNC_QUEUE_TIMEOUT):
+        self.default = default
+        self.limits = limits if limits is not None else parse_route_limits(ASYNC_ROUTE_LIMITS)
+        self.queue_timeout = queue_timeout
+        self._semaphores = {}
+        self._in_flight = {}
+        self._rejected = {}
+
+    def limit(self, route: str) -> int:
+        return self.limits.get(route, self.default)
+
+    async def acquire(self, route: str):
+        semaphore = self._semaphores.get(route)
+        if semaphore is None:
+            semaphore = self._semaphores[route] = asyncio.Semaphore(self.limit(route))
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected[route] = self._rejected.get(route, 0) + 1
+            raise RouteBusy(f"Too many concurrent {route} requests")
+        self._in_flight[route] = self._in_flight.get(route, 0) + 1
+
+    def release(self, route: str):
+        self._in_flight[route] -= 1
+        self._semaphores[route].release()
+
+    def stats(self) -> dict:
+        return {
+            route: {"limit": self.limit(route), "in_flight": self._in_flight.get(route, 0),
+                    "rejected": self._rejected.get(route, 0)}
+            for route in self._semaphores
+        }
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import dotenv
+
+from .cache import get_enrichment_cache
+from .clients import get_minio_client
+from .summarizer import enrich_profile, get_groq_llm, profile_parquet_object, write_metadata
+
+dotenv.load_dotenv()
+
+# Worker processes that download and profile files; 0 profiles on threads instead
+BATCH_PROCESSES = int(os.getenv('BATCH_PROCESSES', os.cpu_count() or 2))
+# LLM enrichment calls in flight at once
+BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', 4))
+
+_worker_minio_client = None
+
+
+def _init_worker(minio_config=None, minio_client=None):
+    """Give each profiling worker its own MinIO client; clients cannot cross process boundaries"""
+    global _worker_minio_client
+    _worker_minio_client = minio_client or get_minio_client(**minio_config)
+
+
+def _profile_in_worker(bucket_name, parquet_filename, profile_mode):
+    return profile_parquet_object(_worker_minio_client, bucket_name, parquet_filename, profile_mode)
+
+
+def list_parquet_objects(minio_client, bucket_name, prefix=""):
+    """Names of all .parquet objects under a prefix"""
+    return [
+        obj.object_name
+        for obj in minio_client.list_objects(bucket_name, prefix=prefix or None, recursive=True)
+        if obj.object_name.endswith('.parquet')
+    ]
+
+
+def process_parquet_batch(minio_client, minio_config, bucket_name, filenames, profile_mode="full",
+                          processes=BATCH_PROCESSES, llm_concurrency=BATCH_LLM_CONCURRENCY, progress=None):
+    """
+    Generate metadata for many parquet files at once.
+    Files are downloaded and profiled in a process pool; as each profile completes its LLM
+    enrichment and metadata write run on a thread pool bounded by `llm_concurrency`.
+    Returns one result per file in the order given, in the shape of process_parquet_file.
+    """
+    progress = progress or (lambda stage: None)
+    results = {}
+    total = len(filenames)
+    llm = get_groq_llm()
+    cache = get_enrichment_cache()
+
+    def enrich_and_write(filename, profile):
+        enrichment_stats = {}
+        data_summary = enrich_profile(profile, llm, cache, enrichment_stats)
+        result = write_metadata(minio_client, bucket_name, filename, profile, data_summary, profile_mode)
+        if enrichment_stats:
+            result["enrichment"] = enrichment_stats
+        return result
+
+    if processes > 0:
+        profile_pool = ProcessPoolExecutor(
+            max_workers=min(processes, total) or 1,
+            # spawn avoids forking a multi-threaded server process
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(minio_config,))
+    else:
+        profile_pool = ThreadPoolExecutor(
+            max_workers=llm_concurrency, initializer=_init_worker, initargs=(None, minio_client))
+
+    with profile_pool, ThreadPoolExecutor(max_workers=llm_concurrency) as enrich_pool:
+        profile_futures = {
+            profile_pool.submit(_profile_in_worker, bucket_name, filename, profile_mode): filename
+            for filename in filenames
+        }
+        enrich_futures = {}
+        for future in as_completed(profile_futures):
+            filename = profile_futures[future]
+            try:
+                enrich_futures[enrich_pool.submit(enrich_and_write, filename, future.result())] = filename
+            except Exception as e:
+                results[filename] = {"status": "error", "error": str(e)}
+                progress(f"processed {len(results)}/{total}")
+
+        for future in as_completed(enrich_futures):
+            filename = enrich_futures[future]
+            try:
+                results[filename] = future.result()
+            except Exception as e:
+                results[filename] = {"status": "error", "error": str(e)}
+            progress(f"processed {len(results)}/{total}")
+
+    return [{"file": filename, **results[filename]} for filename in filenames]
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import dotenv
+
+from .metrics import registry
+
+dotenv.load_dotenv()
+
+# Comma-separated cache tiers, checked in order: "memory", "sqlite" or "none"
+ENRICHMENT_CACHE_BACKENDS = os.getenv('ENRICHMENT_CACHE_BACKENDS', 'memory,sqlite')
+ENRICHMENT_CACHE_PATH = os.getenv('ENRICHMENT_CACHE_PATH', 'enrichment_cache.sqlite3')
+ENRICHMENT_CACHE_TTL = float(os.getenv('ENRICHMENT_CACHE_TTL', 7 * 24 * 3600))
+ENRICHMENT_CACHE_MAX_ENTRIES = int(os.getenv('ENRICHMENT_CACHE_MAX_ENTRIES', 1024))
+
+
+cache_lookups = registry.counter(
+    "datalens_enrichment_cache_lookups_total", "Enrichment cache lookups by result", ("result",))
+
+
+def enrichment_cache_key(base_summary: dict, model: str) -> str:
+    """Hash the parts of a base summary the LLM output depends on: column names, dtypes and samples"""
+    normalized = {
+        "model": model,
+        "fields": [
+            {
+                "column": str(field["column"]),
+                "dtype": field["properties"].get("dtype"),
+                "samples": field["properties"].get("samples", []),
+            }
+            for field in base_summary.get("fields", [])
+        ],
+    }
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry"""
+    name = "memory"
+
+    def __init__(self, max_entries: int = ENRICHMENT_CACHE_MAX_ENTRIES, ttl: float = ENRICHMENT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created = entry
+            if time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk cache in a SQLite file, evicting expired and least recently used entries"""
+    name = "sqlite"
+
+    def __init__(self, path: str = ENRICHMENT_CACHE_PATH, max_entries: int = ENRICHMENT_CACHE_MAX_ENTRIES,
+                 ttl: float = ENRICHMENT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS enrichment_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS enrichment_cache_accessed ON enrichment_cache (accessed)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, created FROM enrichment_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self.ttl:
+                self._connection.execute("DELETE FROM enrichment_cache WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE enrichment_cache SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO enrichment_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now))
+            self._connection.execute("DELETE FROM enrichment_cache WHERE created < ?", (now - self.ttl,))
+            self._connection.execute(
+                "DELETE FROM enrichment_cache WHERE key IN ("
+                "SELECT key FROM enrichment_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM enrichment_cache").fetchone()[0]
+
+
+class EnrichmentCache:
+    """
+    Tiered cache of LLM enrichment responses keyed by enrichment_cache_key.
+    Tiers are checked in order and a hit in a slower tier is copied into the faster ones.
+    """
+    def __init__(self, backends: list):
+        self.backends = backends
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        for index, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                for faster in self.backends[:index]:
+                    faster.set(key, value)
+                with self._lock:
+                    self.hits += 1
+                cache_lookups.inc(result="hit")
+                return value
+        with self._lock:
+            self.misses += 1
+        cache_lookups.inc(result="miss")
+        return None
+
+    def set(self, key: str, value: str):
+        for backend in self.backends:
+            backend.set(key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": {backend.name: len(backend) for backend in self.backends},
+        }
+
+
+_enrichment_cache = None
+_enrichment_cache_lock = threading.Lock()
+
+
+def get_enrichment_cache() -> Optional[EnrichmentCache]:
+    """Return the process-wide enrichment cache configured by ENRICHMENT_CACHE_BACKENDS"""
+    global _enrichment_cache
+    with _enrichment_cache_lock:
+        if _enrichment_cache is None:
+            backends = []
+            for name in (backend.strip() for backend in ENRICHMENT_CACHE_BACKENDS.split(',')):
+                if name == 'memory':
+                    backends.append(MemoryCacheBackend())
+                elif name == 'sqlite':
+                    backends.append(SQLiteCacheBackend())
+                elif name not in ('', 'none'):
+                    raise ValueError(f"Unknown enrichment cache backend: {name}")
+            _enrichment_cache = EnrichmentCache(backends) if backends else False
+        return _enrichment_cache or None
@@ -0,0 +1,238 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import dotenv
+
+dotenv.load_dotenv()
+
+CATALOG_PATH = os.getenv('CATALOG_PATH', 'catalog.sqlite3')
+# Seconds between full reconciliations against the bucket listing
+CATALOG_RECONCILE_INTERVAL = float(os.getenv('CATALOG_RECONCILE_INTERVAL', 300))
+
+METADATA_SUFFIX = "_metadata.md"
+# Analysis sidecars written next to a Parquet object; listings leave them out unless asked
+SIDECAR_SUFFIXES = ("_profile.json", "_sketches.json", "_profile_state.json")
+SORT_COLUMNS = ("name", "size", "last_modified")
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _extension(name: str) -> str:
+    return name.rsplit('.', 1)[1].lower() if '.' in name else ''
+
+
+def _metadata_companion(name: str) -> Optional[str]:
+    """The parquet object a _metadata.md file describes"""
+    if name.endswith(METADATA_SUFFIX):
+        return name[:-len(METADATA_SUFFIX)] + ".parquet"
+    return None
+
+
+class Catalog:
+    """
+    Local SQLite index of bucket objects, kept current by upload and metadata-write hooks
+    plus periodic reconciliation, so listings cost a page-sized query instead of a bucket walk.
+    """
+    def __init__(self, path: str = CATALOG_PATH):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self.last_reconciled = {}
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "bucket TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, "
+                "last_modified TEXT, extension TEXT NOT NULL, analyzed INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (bucket, name))")
+            for column in SORT_COLUMNS[1:]:
+                self._connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS objects_{column} ON objects (bucket, {column}, name)")
+            # Content index: which Parquet object an upload with given bytes and writer settings produced
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS contents ("
+                "bucket TEXT NOT NULL, digest TEXT NOT NULL, variant TEXT NOT NULL, name TEXT NOT NULL, "
+                "rows INTEGER, size INTEGER NOT NULL, PRIMARY KEY (bucket, digest, variant))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS contents_name ON contents (bucket, name)")
+
+    def _upsert(self, bucket: str, name: str, size: int, last_modified: Optional[str],
+                older_than: Optional[str] = None):
+        """Insert or update a row; with `older_than`, a row modified since then is left as it is"""
+        companion = _metadata_companion(name)
+        analyzed = 0
+        if companion is None and name.endswith('.parquet'):
+            analyzed = self._connection.execute(
+                "SELECT COUNT(*) FROM objects WHERE bucket = ? AND name = ?",
+                (bucket, name[:-len('.parquet')] + METADATA_SUFFIX)).fetchone()[0]
+        self._connection.execute(
+            "INSERT INTO objects (bucket, name, size, last_modified, extension, analyzed) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (bucket, name) DO UPDATE SET "
+            "size = excluded.size, last_modified = excluded.last_modified, analyzed = excluded.analyzed "
+            "WHERE ? IS NULL OR objects.last_modified IS NULL OR objects.last_modified < ?",
+            (bucket, name, size, last_modified, _extension(name), analyzed, older_than, older_than))
+        if companion is not None:
+            self._connection.execute(
+                "UPDATE objects SET analyzed = 1 WHERE bucket = ? AND name = ?", (bucket, companion))
+
+    def record(self, bucket: str, name: str, size: int, last_modified: Optional[datetime] = None):
+        """Add or update an object after it has been written"""
+        last_modified = (last_modified or datetime.now(timezone.utc)).isoformat()
+        with self._lock, self._connection:
+            self._upsert(bucket, name, size, last_modified)
+
+    def remove(self, bucket: str, name: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM objects WHERE bucket = ? AND name = ?", (bucket, name))
+            self._connection.execute("DELETE FROM contents WHERE bucket = ? AND name = ?", (bucket, name))
+            companion = _metadata_companion(name)
+            if companion is not None:
+                self._connection.execute(
+                    "UPDATE objects SET analyzed = 0 WHERE bucket = ? AND name = ?", (bucket, companion))
+
+    def reconcile(self, minio_client, bucket: str) -> int:
+        """
+        Bring the bucket's entries in line with a full listing from MinIO; returns the object count.
+        Objects recorded while the listing was taken are newer than it: they are neither
+        overwritten with listed values nor dropped for being missing from it.
+        """
+        started = datetime.now(timezone.utc).isoformat()
+        objects = [
+            (obj.object_name, obj.size or 0, obj.last_modified.isoformat() if obj.last_modified else None)
+            for obj in minio_client.list_objects(bucket, recursive=True)
+        ]
+        with self._lock, self._connection:
+            # Drop entries of objects deleted behind our back, unless they were recorded after the listing started
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS listed (name TEXT PRIMARY KEY)")
+            self._connection.execute("DELETE FROM listed")
+            self._connection.executemany("INSERT OR IGNORE INTO listed (name) VALUES (?)", ((obj[0],) for obj in objects))
+            self._connection.execute(
+                "DELETE FROM objects WHERE bucket = ? AND name NOT IN (SELECT name FROM listed) "
+                "AND (last_modified IS NULL OR last_modified < ?)", (bucket, started))
+            self._connection.execute("DELETE FROM listed")
+            # Metadata files first so parquet rows pick up their analyzed flag
+            for name, size, last_modified in sorted(objects, key=lambda obj: _metadata_companion(obj[0]) is None):
+                self._upsert(bucket, name, size, last_modified, older_than=started)
+            # Forget content hashes of objects deleted behind our back
+            self._connection.execute(
+                "DELETE FROM contents WHERE bucket = ? AND name NOT IN (SELECT name FROM objects WHERE bucket = ?)",
+                (bucket, bucket))
+        self.last_reconciled[bucket] = time.time()
+        return len(objects)
+
+    def record_content(self, bucket: str, digest: str, variant: str, name: str, rows: Optional[int], size: int):
+        """Remember the object converted from content with this hash and writer variant"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO contents (bucket, digest, variant, name, rows, size) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (bucket, digest, variant) DO UPDATE SET "
+                "name = excluded.name, rows = excluded.rows, size = excluded.size",
+                (bucket, digest, variant, name, rows, size))
+
+    def find_content(self, bucket: str, digest: str, variant: str) -> Optional[dict]:
+        """The object previously converted from this content, if any"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT name, rows, size FROM contents WHERE bucket = ? AND digest = ? AND variant = ?",
+                (bucket, digest, variant)).fetchone()
+        if row is None:
+            return None
+        return {"name": row[0], "rows": row[1], "size": row[2]}
+
+    def list(self, bucket: str, prefix: str = "", extension: Optional[str] = None,
+             analyzed: Optional[bool] = None, sort: str = "name", descending: bool = False,
+             limit: int = 100, cursor: Optional[str] = None, sidecars: bool = False,
+             count: bool = False) -> dict:
+        """
+        One page of objects ordered by `sort` then name.
+        Pagination is keyset-based: pass the returned next_cursor to get the following page.
+        Analysis sidecars are left out unless `sidecars` is set; `total` counts every matching
+        object only when `count` is set, since that scans past the page.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort. Expected one of: {', '.join(SORT_COLUMNS)}")
+
+        conditions, params = ["bucket = ?"], [bucket]
+        if prefix:
+            # Range scan on the primary key instead of LIKE, which would treat _ and % as wildcards
+            conditions.append("name >= ? AND name < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        if extension:
+            conditions.append("extension = ?")
+            params.append(extension.lower().lstrip('.'))
+        if analyzed is not None:
+            conditions.append("analyzed = ?")
+            params.append(int(analyzed))
+        if not sidecars:
+            for suffix in SIDECAR_SUFFIXES:
+                conditions.append("name NOT LIKE ? ESCAPE '\\'")
+                params.append("%" + suffix.replace("_", "\\_"))
+
+        with self._lock:
+            total = None
+            if count:
+                total = self._connection.execute(
+                    f"SELECT COUNT(*) FROM objects WHERE {' AND '.join(conditions)}", params).fetchone()[0]
+
+            direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+            if cursor:
+                conditions.append(f"({sort}, name) {comparison} (?, ?)")
+                params += _decode_cursor(cursor)
+            rows = self._connection.execute(
+                f"SELECT name, size, last_modified, analyzed FROM objects WHERE {' AND '.join(conditions)} "
+                f"ORDER BY {sort} {direction}, name {direction} LIMIT ?",
+                params + [limit + 1]).fetchall()
+
+        files = [
+            {"filename": name, "size": size, "last_modified": last_modified, "analyzed": bool(analyzed_flag)}
+            for name, size, last_modified, analyzed_flag in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = files[-1]
+            next_cursor = _encode_cursor([last[sort if sort != "name" else "filename"], last["filename"]])
+        return {"files": files, "total": total, "next_cursor": next_cursor}
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Return the process-wide catalog stored at CATALOG_PATH"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
+
+
+def start_reconciler(minio_client, bucket: str, interval: float = CATALOG_RECONCILE_INTERVAL) -> threading.Thread:
+    """Reconcile the catalog with the bucket now and then every `interval` seconds in the background"""
+    def run():
+        while True:
+            try:
+                get_catalog().reconcile(minio_client, bucket)
+            except Exception as e:
+                print(f"Catalog reconciliation failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="catalog-reconciler", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+
+import certifi
+import httpx
+import urllib3
+from groq import AsyncGroq, Groq
+from minio import Minio
+from urllib3.util import Retry, Timeout
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# MinIO HTTP connection pool
+MINIO_POOL_SIZE = int(os.getenv('MINIO_POOL_SIZE', 32))
+MINIO_POOL_BLOCK = os.getenv('MINIO_POOL_BLOCK', 'False').lower() == 'true'
+MINIO_CONNECT_TIMEOUT = float(os.getenv('MINIO_CONNECT_TIMEOUT', 10))
+MINIO_READ_TIMEOUT = float(os.getenv('MINIO_READ_TIMEOUT', 300))
+MINIO_RETRIES = int(os.getenv('MINIO_RETRIES', 5))
+MINIO_RETRY_BACKOFF = float(os.getenv('MINIO_RETRY_BACKOFF', 0.2))
+
+# Groq HTTP connection pool
+GROQ_POOL_SIZE = int(os.getenv('GROQ_POOL_SIZE', 16))
+GROQ_KEEPALIVE = float(os.getenv('GROQ_KEEPALIVE', 60))
+GROQ_CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', 10))
+GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', 120))
+GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', 3))
+
+_clients = {}
+_clients_lock = threading.Lock()
+_llm_requests = {"in_flight": 0, "peak_in_flight": 0, "total": 0}
+
+
+def _reset_after_fork():
+    """
+    Forked children must not reuse the parent's sockets or locks: the next get_*_client call
+    builds new clients. Clients the parent already handed out are not replaced; whoever holds
+    one in a global must fetch it again after fork.
+    """
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+    _llm_requests.update(in_flight=0, peak_in_flight=0, total=0)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_or_create(key, factory):
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def get_minio_client(endpoint, access_key=None, secret_key=None, secure=False):
+    """Return the shared MinIO client for these settings, built with a tuned connection pool"""
+    def create():
+        http_client = urllib3.PoolManager(
+            maxsize=MINIO_POOL_SIZE,
+            block=MINIO_POOL_BLOCK,
+            timeout=Timeout(connect=MINIO_CONNECT_TIMEOUT, read=MINIO_READ_TIMEOUT),
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+            retries=Retry(
+                total=MINIO_RETRIES,
+                backoff_factor=MINIO_RETRY_BACKOFF,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+        return Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure, http_client=http_client)
+
+    return _get_or_create(("minio", endpoint, access_key, secure), create)
+
+
+def get_groq_client(api_key):
+    """Return the shared Groq client, reusing keep-alive connections across requests"""
+    def create():
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=GROQ_POOL_SIZE,
+                max_keepalive_connections=GROQ_POOL_SIZE,
+                keepalive_expiry=GROQ_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT)
+        )
+        # The Groq SDK retries 429 and 5xx responses with exponential backoff; enrichment
+        # batches retry on their own and use a view of this client with SDK retries turned off
+        return Groq(api_key=api_key, max_retries=GROQ_MAX_RETRIES, http_client=http_client)
+
+    return _get_or_create(("groq", api_key), create)
+
+
+def get_async_groq_client(api_key):
+    """
+    Return the shared AsyncGroq client of the running event loop, so LLM calls from the
+    async server wait on the network without holding a thread
+    """
+    def create():
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=GROQ_POOL_SIZE,
+                max_keepalive_connections=GROQ_POOL_SIZE,
+                keepalive_expiry=GROQ_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT)
+        )
+        return AsyncGroq(api_key=api_key, max_retries=GROQ_MAX_RETRIES, http_client=http_client)
+
+    # httpx async connections belong to the loop that opened them
+    return _get_or_create(("groq-async", api_key, id(asyncio.get_running_loop())), create)
+
+
+@contextmanager
+def track_llm_request():
+    """Count an LLM request while it is in flight, for pool saturation stats"""
+    with _clients_lock:
+        _llm_requests["in_flight"] += 1
+        _llm_requests["total"] += 1
+        _llm_requests["peak_in_flight"] = max(_llm_requests["peak_in_flight"], _llm_requests["in_flight"])
+    try:
+        yield
+    finally:
+        with _clients_lock:
+            _llm_requests["in_flight"] -= 1
+
+
+def _minio_pool_stats(client) -> list[dict]:
+    pools = []
+    manager = client._http
+    for key in list(manager.pools.keys()):
+        pool = manager.pools.get(key)
+        if pool is None:
+            continue
+        idle = pool.pool.qsize() if pool.pool is not None else 0
+        pools.append({
+            "host": f"{pool.host}:{pool.port}",
+            "max_connections": MINIO_POOL_SIZE,
+            "in_use": MINIO_POOL_SIZE - idle,
+            "saturation": (MINIO_POOL_SIZE - idle) / MINIO_POOL_SIZE,
+            "connections_opened": pool.num_connections,
+            "requests": pool.num_requests,
+        })
+    return pools
+
+
+def client_pool_stats() -> dict:
+    """Connection pool usage of every shared client in this process"""
+    stats = {"pid": os.getpid(), "minio": [], "groq": None}
+    with _clients_lock:
+        clients = dict(_clients)
+        llm_requests = dict(_llm_requests)
+
+    for key, client in clients.items():
+        if key[0] == "minio":
+            stats["minio"].extend(_minio_pool_stats(client))
+
+    if any(key[0] in ("groq", "groq-async") for key in clients):
+        stats["groq"] = {
+            "max_connections": GROQ_POOL_SIZE,
+            "saturation": min(llm_requests["in_flight"] / GROQ_POOL_SIZE, 1.0),
+            **llm_requests,
+        }
+    return stats
@@ -0,0 +1,567 @@
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+import dotenv
+
+from .metrics import observe, timed
+
+dotenv.load_dotenv()
+
+# Upper bound on the bytes of input parsed per record batch
+CSV_BLOCK_SIZE = int(os.getenv('CONVERT_CSV_BLOCK_SIZE', 16 * 1024 * 1024))
+# Number of JSON lines parsed per chunk
+JSON_CHUNK_ROWS = int(os.getenv('CONVERT_JSON_CHUNK_ROWS', 100_000))
+# Leading bytes of a CSV file used to infer its schema
+SCHEMA_SAMPLE_BYTES = int(os.getenv('CONVERT_SCHEMA_SAMPLE_BYTES', 4 * 1024 * 1024))
+# String columns are dictionary-encoded when their distinct values stay under both limits
+DICTIONARY_MAX_VALUES = int(os.getenv('CONVERT_DICTIONARY_MAX_VALUES', 10_000))
+DICTIONARY_MAX_RATIO = float(os.getenv('CONVERT_DICTIONARY_MAX_RATIO', 0.5))
+# Parse CSV blocks on Arrow's thread pool
+CONVERT_USE_THREADS = os.getenv('CONVERT_USE_THREADS', 'True').lower() == 'true'
+
+# Schema metadata key holding the logical type of each column, written by the converter
+SCHEMA_METADATA_KEY = b"datalens.schema"
+# Schema metadata key listing the columns each row group is sorted by
+SORT_METADATA_KEY = b"datalens.sorted_by"
+
+# Named Parquet writer settings; "default" keeps pyarrow's defaults and one row group per batch
+WRITER_PROFILES = {
+    "default": {},
+    # Cheapest encoding: fast codec, no dictionary pages
+    "fast-write": {"compression": "lz4", "use_dictionary": False},
+    # Smallest objects: high zstd level and large row groups
+    "small": {"compression": "zstd", "compression_level": 9, "row_group_rows": 1_000_000},
+    # Mid-sized row groups with page indexes, so readers can skip row groups and pages by min/max
+    "scan-optimized": {
+        "compression": "zstd",
+        "compression_level": 3,
+        "row_group_rows": 256 * 1024,
+        "data_page_size": 1024 * 1024,
+        "write_page_index": True,
+    },
+}
+# Profile used when an upload does not name one
+PARQUET_WRITER_PROFILE = os.getenv('PARQUET_WRITER_PROFILE', 'default')
+# Comma-separated columns to sort each row group by, unless the upload sets its own
+PARQUET_SORT_BY = [column for column in os.getenv('PARQUET_SORT_BY', '').split(',') if column]
+# Rows buffered and sorted together; uploads that fit are globally sorted
+PARQUET_SORT_WINDOW_ROWS = int(os.getenv('PARQUET_SORT_WINDOW_ROWS', 2_000_000))
+
+
+def parquet_object_name(filename: str) -> str:
+    """Object name for the Parquet version of an upload: <name>_<timestamp>.parquet"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    original_name = os.path.splitext(filename)[0]
+    return f"{original_name}_{timestamp}.parquet"
+
+
+class TypeConflict(Exception):
+    """
+    Raised when a later block does not fit the schema inferred from the sample: a value its
+    column's type cannot store, or a JSON key the sample did not have. `columns` maps each
+    column to the type it needs.
+    """
+    def __init__(self, columns: dict):
+        needed = ", ".join(f"{column} ({arrow_type})" for column, arrow_type in columns.items())
+        super().__init__(f"Columns do not fit the inferred schema: {needed}")
+        self.columns = columns
+
+
+class _ReplayStream(io.RawIOBase):
+    """Serve already-consumed leading bytes before the rest of a non-seekable stream"""
+    def __init__(self, head: bytes, rest):
+        self._head = memoryview(head)
+        self._rest = rest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._head:
+            n = min(len(buffer), len(self._head))
+            buffer[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._rest.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _date_format(uniques: pa.Array) -> Optional[str]:
+    """strptime format every value parses with, guessed from the first one as pandas does (month first, then day first)"""
+    if len(uniques) == 0:
+        return None
+    first = uniques[0].as_py()
+    for dayfirst in (False, True):
+        fmt = guess_datetime_format(first, dayfirst=dayfirst)
+        # Arrow's strptime has no fractional seconds; such columns stay strings
+        if fmt is None or "%f" in fmt or not any(day in fmt for day in ("%d", "%j")):
+            continue
+        try:
+            pc.strptime(uniques, format=fmt, unit="s", error_is_null=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        return fmt
+    return None
+
+
+def infer_column_type(column: pa.ChunkedArray, integral_floats: bool = False):
+    """
+    Pick the Arrow type a sampled column is stored as, plus its timestamp format if it holds dates.
+    Columns without values are stored as strings. Date strings become timestamps,
+    low-cardinality strings become dictionaries and, with
+    `integral_floats`, float columns that only hold whole numbers and nulls become int64.
+    """
+    arrow_type = column.type
+    if pa.types.is_null(arrow_type) or column.null_count == len(column):
+        return pa.string(), None
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        uniques = pc.unique(column).drop_null()
+        fmt = _date_format(uniques)
+        if fmt is not None:
+            return pa.timestamp("s"), fmt
+        non_null = len(column) - column.null_count
+        if len(uniques) <= DICTIONARY_MAX_VALUES and non_null and len(uniques) / non_null < DICTIONARY_MAX_RATIO:
+            return pa.dictionary(pa.int32(), pa.string()), None
+    elif integral_floats and pa.types.is_floating(arrow_type) and column.null_count:
+        values = column.drop_null()
+        if pc.all(pc.equal(values, pc.floor(values))).as_py() is not False:
+            return pa.int64(), None
+    return arrow_type, None
+
+
+def infer_schema(sample: pa.Table, integral_floats: bool = False, column_types: Optional[dict] = None):
+    """
+    Infer the schema of a whole file from a leading sample; returns (schema, {column: date format}).
+    `column_types` fixes the type of columns named by a TypeConflict; those the sample does
+    not have are appended.
+    """
+    column_types = column_types or {}
+    fields, date_formats = [], {}
+    for field, column in zip(sample.schema, sample.columns):
+        if field.name in column_types:
+            fields.append(pa.field(field.name, column_types[field.name]))
+            continue
+        arrow_type, fmt = infer_column_type(column, integral_floats)
+        fields.append(pa.field(field.name, arrow_type))
+        if fmt is not None:
+            date_formats[field.name] = fmt
+    for name, arrow_type in column_types.items():
+        if name not in sample.column_names:
+            fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields), date_formats
+
+
+def logical_types(schema: pa.Schema) -> dict:
+    """Profile dtype of each column as stored in the schema metadata"""
+    types = {}
+    for field in schema:
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            types[field.name] = "number"
+        elif pa.types.is_boolean(field.type):
+            types[field.name] = "boolean"
+        elif pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            types[field.name] = "date"
+        elif pa.types.is_dictionary(field.type):
+            types[field.name] = "category"
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            types[field.name] = "string"
+        else:
+            types[field.name] = str(field.type)
+    return types
+
+
+def with_logical_types(schema: pa.Schema) -> pa.Schema:
+    """Attach the logical types to the schema, marking its string columns as already checked for dates"""
+    metadata = dict(schema.metadata or {})
+    metadata[SCHEMA_METADATA_KEY] = json.dumps(logical_types(schema)).encode('utf-8')
+    return schema.with_metadata(metadata)
+
+
+def read_logical_types(schema: pa.Schema) -> Optional[dict]:
+    """Logical types stored by the converter, or None for files it did not write"""
+    if not schema.metadata or SCHEMA_METADATA_KEY not in schema.metadata:
+        return None
+    return json.loads(schema.metadata[SCHEMA_METADATA_KEY])
+
+
+def _csv_convert_options(head: bytes, complete: bool, column_types: Optional[dict] = None) -> Optional[pa_csv.ConvertOptions]:
+    """Column types for a CSV file inferred from its first bytes, or None if the sample is unusable"""
+    if not complete:
+        # Drop the partial last line
+        head = head[:head.rfind(b"\n") + 1]
+    try:
+        sample = pa_csv.read_csv(io.BytesIO(head))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None
+    if sample.num_rows == 0:
+        return None
+
+    schema, date_formats = infer_schema(sample, column_types=column_types)
+    return pa_csv.ConvertOptions(
+        column_types=schema,
+        timestamp_parsers=[pa_csv.ISO8601, *dict.fromkeys(date_formats.values())])
+
+
+# Arrow's error for a CSV value that does not parse as its column's type
+_CSV_CONVERSION_ERROR = re.compile(r"In CSV column #(\d+): .*CSV conversion error to ([^:]+): invalid value '(.*)'", re.S)
+
+
+def _csv_type_conflict(error: pa.ArrowInvalid, head: bytes) -> Optional[TypeConflict]:
+    """The column a CSV conversion error is about and the type it is widened to, if it can be"""
+    match = _CSV_CONVERSION_ERROR.search(str(error))
+    if match is None:
+        return None
+    index, arrow_type, value = int(match.group(1)), match.group(2), match.group(3)
+    if arrow_type in ("string", "large_string"):
+        return None
+    names = pa_csv.read_csv(io.BytesIO(head[:head.find(b"\n") + 1])).column_names
+    if arrow_type.startswith(("int", "uint")):
+        try:
+            float(value)
+            return TypeConflict({names[index]: pa.float64()})
+        except ValueError:
+            pass
+    return TypeConflict({names[index]: pa.string()})
+
+
+def iter_csv_batches(source, block_size: int = CSV_BLOCK_SIZE, sample_size: int = SCHEMA_SAMPLE_BYTES,
+                     column_types: Optional[dict] = None):
+    """
+    Yield typed Arrow record batches from a CSV file-like object, one block at a time.
+    Column types are inferred once from the first `sample_size` bytes and applied to every block;
+    a later value that does not parse as its column's type raises a TypeConflict naming the
+    wider type, which the caller passes back in `column_types` when it reads the file again.
+    """
+    head = source.read(sample_size)
+    convert_options = _csv_convert_options(head, len(head) < sample_size, column_types)
+    inferred = convert_options is not None
+    if convert_options is None:
+        convert_options = pa_csv.ConvertOptions(column_types=column_types or {})
+    read_options = pa_csv.ReadOptions(block_size=block_size, use_threads=CONVERT_USE_THREADS)
+
+    try:
+        reader = pa_csv.open_csv(_ReplayStream(head, source), read_options=read_options, convert_options=convert_options)
+        metadata = with_logical_types(reader.schema).metadata if inferred else None
+        for batch in reader:
+            yield batch.replace_schema_metadata(metadata) if metadata else batch
+    except pa.ArrowInvalid as e:
+        conflict = _csv_type_conflict(e, head)
+        if conflict is None:
+            raise
+        raise conflict from e
+
+
+def _wider_type(values_type: pa.DataType, arrow_type: pa.DataType) -> Optional[pa.DataType]:
+    """Type a column is widened to when it holds values of `values_type` that `arrow_type` cannot store"""
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return None
+    if pa.types.is_integer(arrow_type) and (pa.types.is_floating(values_type) or pa.types.is_integer(values_type)):
+        return pa.float64()
+    return pa.string()
+
+
+def _conform_column(column: pa.ChunkedArray, arrow_type: pa.DataType, date_format: Optional[str]) -> pa.ChunkedArray:
+    if date_format is not None and not pa.types.is_timestamp(column.type):
+        column = pc.strptime(column, format=date_format, unit="s", error_is_null=False)
+    if pa.types.is_dictionary(arrow_type) and not pa.types.is_dictionary(column.type):
+        column = column.cast(arrow_type.value_type).dictionary_encode()
+    return column.cast(arrow_type)
+
+
+def conform_table(table: pa.Table, schema: pa.Schema, date_formats: dict) -> pa.Table:
+    """
+    Cast a table to an inferred schema, parsing date strings with their inferred formats.
+    Columns the table lacks are filled with nulls. Raises a TypeConflict for a column whose
+    values the inferred type cannot store.
+    """
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.chunked_array([pa.nulls(table.num_rows, field.type)]))
+            continue
+        column = table.column(field.name)
+        try:
+            columns.append(_conform_column(column, field.type, date_formats.get(field.name)))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            wider = _wider_type(column.type, field.type)
+            if wider is None:
+                raise
+            raise TypeConflict({field.name: wider}) from e
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _late_column_type(column: pa.ChunkedArray) -> pa.DataType:
+    """Type of a JSON column first seen with values after the sample; dates in it stay strings"""
+    arrow_type, fmt = infer_column_type(column, integral_floats=True)
+    return pa.string() if fmt is not None else arrow_type
+
+
+def iter_json_batches(source, chunk_rows: int = JSON_CHUNK_ROWS, column_types: Optional[dict] = None):
+    """
+    Yield typed Arrow record batches from a line-delimited JSON file-like object.
+    The schema is inferred from the first chunk; later chunks missing a column get nulls. A key
+    first seen in a later chunk, or the first values of a column that was all null so far,
+    raise a TypeConflict with the column's type, like a value that does not fit its column
+    (see iter_csv_batches). `column_types` fixes the type of the columns it named.
+    """
+    column_types = column_types or {}
+    schema = date_formats = None
+    # Columns all null so far, stored as strings until a chunk shows their values
+    unresolved = set()
+    with pd.read_json(source, orient="records", lines=True, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if schema is None:
+                # The first chunk is the sample; pandas turns integers with nulls into floats
+                schema, date_formats = infer_schema(table, integral_floats=True, column_types=column_types)
+                schema = with_logical_types(schema)
+                unresolved = {
+                    name for name in table.column_names
+                    if table.column(name).null_count == table.num_rows and name not in column_types}
+            else:
+                needed = {
+                    name: _late_column_type(table.column(name)) for name in table.column_names
+                    if name not in schema.names
+                    or (name in unresolved and table.column(name).null_count < table.num_rows)}
+                unresolved -= needed.keys()
+                # A column whose first values are plain strings keeps the type it was written with
+                needed = {
+                    name: arrow_type for name, arrow_type in needed.items()
+                    if name not in schema.names or arrow_type != pa.string()}
+                if needed:
+                    raise TypeConflict(needed)
+            # Later chunks must match the schema inferred from the first one
+            table = conform_table(table, schema, date_formats)
+            for batch in table.to_batches():
+                yield batch
+
+
+def iter_record_batches(source, file_extension: str, column_types: Optional[dict] = None):
+    """Yield Arrow record batches from a CSV or JSON file-like object"""
+    if file_extension == 'csv':
+        return iter_csv_batches(source, column_types=column_types)
+    elif file_extension == 'json':
+        return iter_json_batches(source, column_types=column_types)
+    else:
+        raise ValueError(f"Unsupported file extension: {file_extension}")
+
+
+def writer_profile(name: Optional[str] = None, sort_by: Optional[list] = None) -> dict:
+    """Settings of a named writer profile, with the columns to sort row groups by"""
+    name = name or PARQUET_WRITER_PROFILE
+    if name not in WRITER_PROFILES:
+        raise ValueError(f"Unknown writer profile: {name}. Expected one of: {', '.join(WRITER_PROFILES)}")
+    return {"name": name, **WRITER_PROFILES[name], "sort_by": list(sort_by or PARQUET_SORT_BY)}
+
+
+class _CountingReader(io.RawIOBase):
+    """Count the bytes read from a stream"""
+    def __init__(self, source):
+        self._source = source
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._source.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+
+def _sort_table(table: pa.Table, sort_by: list) -> pa.Table:
+    """Sort rows by the given columns; dictionary columns sort by their values"""
+    keys = {}
+    for column in sort_by:
+        values = table.column(column)
+        if pa.types.is_dictionary(values.type):
+            values = values.cast(values.type.value_type)
+        keys[column] = values
+    return table.take(pc.sort_indices(pa.table(keys), sort_keys=[(column, "ascending") for column in sort_by]))
+
+
+class _RewindableReader(io.RawIOBase):
+    """
+    Read a stream so it can be read again from where it started: seekable streams seek back,
+    others are spooled to a temporary file while they are read and replayed from it.
+    """
+    def __init__(self, source):
+        self._source = source
+        seekable = getattr(source, "seekable", None)
+        self._start = source.tell() if seekable is not None and seekable() else None
+        self._spool = tempfile.TemporaryFile() if self._start is None else None
+        self._replaying = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._replaying:
+            data = self._spool.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+            # The spool is exhausted and positioned at its end, where new reads are appended
+            self._replaying = False
+        data = self._source.read(len(buffer))
+        if self._spool is not None:
+            self._spool.write(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def rewind(self):
+        if self._spool is None:
+            self._source.seek(self._start)
+        else:
+            self._spool.seek(0)
+            self._replaying = True
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+        super().close()
+
+
+def _restart_sink(sink, start: Optional[int]):
+    """Discard what was written to a sink: upload streams start a new upload, files are truncated"""
+    if hasattr(sink, "restart"):
+        sink.restart()
+    else:
+        sink.seek(start)
+        sink.truncate()
+
+
+def stream_to_parquet(source, sink, file_extension: str, profile: Optional[dict] = None,
+                      stats: Optional[dict] = None, progress=None) -> int:
+    """
+    Convert a CSV or JSON stream to Parquet with the settings of a writer profile.
+    Without row_group_rows, one row group is written per record batch; otherwise batches are
+    buffered up to that many rows. With sort_by, up to PARQUET_SORT_WINDOW_ROWS rows are sorted
+    together before being split into row groups, so row group min/max statistics do not overlap
+    and readers can skip them. Returns the number of rows converted; if a `stats` dict is
+    given it is filled with the input size, the time spent encoding and the widened columns.
+    `progress`, if given, is called as progress("converting", rows=..., bytes_read=...) after each batch.
+
+    Column types are inferred from the start of the input. A later value that does not fit
+    its column's type cannot change row groups already written, so the conversion starts
+    over with that column widened (int64 to float64, anything else to string). JSON keys first
+    seen after the sample and columns that were all null in it start the conversion over too. `sink` is
+    restarted with its restart() method when it has one, otherwise truncated.
+    """
+    profile = profile or writer_profile()
+    progress = progress or (lambda stage, **details: None)
+    source = _RewindableReader(source)
+    sink_start = None if hasattr(sink, "restart") else sink.tell()
+    column_types = {}
+
+    with timed("convert") as span:
+        try:
+            while True:
+                counting = _CountingReader(source)
+                try:
+                    rows_converted, encode_seconds = _write_parquet(
+                        counting, sink, file_extension, profile, column_types, progress)
+                    break
+                except TypeConflict as conflict:
+                    column_types.update(conflict.columns)
+                    source.rewind()
+                    _restart_sink(sink, sink_start)
+        finally:
+            source.close()
+
+        span.rows = rows_converted
+        span.bytes_in = counting.bytes_read
+    observe("parquet_encode", encode_seconds, rows=rows_converted)
+
+    if stats is not None:
+        stats.update(
+            writer_profile=profile.get("name"),
+            input_size=counting.bytes_read,
+            encode_seconds=round(encode_seconds, 4),
+            widened_columns={column: str(arrow_type) for column, arrow_type in column_types.items()})
+    return rows_converted
+
+
+def _write_parquet(source, sink, file_extension: str, profile: dict, column_types: dict, progress):
+    """One conversion attempt of stream_to_parquet; returns the rows converted and the encoding time"""
+    sort_by = profile.get("sort_by") or []
+    row_group_rows = profile.get("row_group_rows")
+    window_rows = max(PARQUET_SORT_WINDOW_ROWS, row_group_rows or 0) if sort_by else row_group_rows
+    writer_options = {
+        key: profile[key]
+        for key in ("compression", "compression_level", "use_dictionary", "data_page_size", "write_page_index")
+        if key in profile
+    }
+
+    writer = None
+    rows_converted = 0
+    encode_seconds = 0.0
+    pending, pending_rows = [], 0
+
+    def write_pending(final=False):
+        nonlocal pending, pending_rows, encode_seconds
+        table = pa.Table.from_batches(pending)
+        while table.num_rows and (final or table.num_rows >= window_rows):
+            window, table = table.slice(0, window_rows), table.slice(window_rows)
+            if sort_by:
+                window = _sort_table(window, sort_by)
+            started = time.perf_counter()
+            writer.write_table(window, row_group_size=row_group_rows or window_rows)
+            encode_seconds += time.perf_counter() - started
+        pending, pending_rows = table.to_batches(), table.num_rows
+
+    try:
+        for batch in iter_record_batches(io.BufferedReader(source), file_extension, column_types):
+            if writer is None:
+                missing = [column for column in sort_by if column not in batch.schema.names]
+                if missing:
+                    raise ValueError(f"Cannot sort by missing columns: {', '.join(missing)}")
+                schema = batch.schema
+                if sort_by:
+                    schema = schema.with_metadata(
+                        {**(schema.metadata or {}), SORT_METADATA_KEY: json.dumps(sort_by).encode('utf-8')})
+                writer = pq.ParquetWriter(sink, schema, **writer_options)
+
+            rows_converted += batch.num_rows
+            progress("converting", rows=rows_converted, bytes_read=source.bytes_read)
+            if window_rows is None:
+                started = time.perf_counter()
+                writer.write_batch(batch)
+                encode_seconds += time.perf_counter() - started
+                continue
+
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= window_rows:
+                write_pending()
+
+        if pending:
+            write_pending(final=True)
+    finally:
+        if writer is not None:
+            started = time.perf_counter()
+            writer.close()
+            encode_seconds += time.perf_counter() - started
+
+    if writer is None:
+        raise ValueError("Input file contains no records")
+    return rows_converted, encode_seconds
@@ -0,0 +1,75 @@
+import hashlib
+import os
+from typing import Optional
+
+import dotenv
+from minio.error import S3Error
+
+from .catalog import get_catalog
+from .metrics import registry, timed
+
+dotenv.load_dotenv()
+
+# Skip converting uploads whose bytes were already converted with the same writer settings
+DEDUP_UPLOADS = os.getenv('DEDUP_UPLOADS', 'true').lower() == 'true'
+# Bytes read per call when hashing an upload
+HASH_CHUNK_SIZE = int(os.getenv('HASH_CHUNK_SIZE', 1024 * 1024))
+
+dedup_lookups = registry.counter(
+    "datalens_upload_dedup_lookups_total", "Content index lookups of uploads by result", ("result",))
+
+
+class HashingReader:
+    """Pass reads through to a stream while computing the SHA-256 of everything read"""
+    def __init__(self, source):
+        self._source = source
+        self._hash = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        self._hash.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        """Digest of the whole stream; bytes the consumer left unread are hashed first"""
+        while chunk := self.read(HASH_CHUNK_SIZE):
+            pass
+        return self._hash.hexdigest()
+
+
+def hash_stream(stream, chunk_size: int = HASH_CHUNK_SIZE) -> tuple:
+    """SHA-256 and length of a stream, read from its current position to the end"""
+    reader = HashingReader(stream)
+    with timed("hash") as span:
+        digest = reader.hexdigest()
+        span.bytes_in = reader.bytes_read
+    return digest, reader.bytes_read
+
+
+def content_variant(file_extension: str, profile: dict) -> str:
+    """
+    The conversion settings that determine the Parquet output, so the same bytes converted
+    with another writer profile or sort order are not treated as duplicates
+    """
+    return f"{file_extension.lower()}:{profile['name']}:{','.join(profile.get('sort_by') or [])}"
+
+
+def find_duplicate(minio_client, bucket_name: str, digest: str, variant: str) -> Optional[dict]:
+    """
+    The Parquet object already converted from this content (name, rows, size), or None.
+    Index entries whose object is gone from the bucket are dropped.
+    """
+    catalog = get_catalog()
+    entry = catalog.find_content(bucket_name, digest, variant)
+    if entry is not None:
+        try:
+            stat = minio_client.stat_object(bucket_name, entry["name"])
+            if stat.size != entry["size"]:
+                entry = None
+        except S3Error:
+            catalog.remove(bucket_name, entry["name"])
+            entry = None
+    dedup_lookups.inc(result="hit" if entry is not None else "miss")
+    return entry
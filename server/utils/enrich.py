@@ -1,19 +1,19 @@
 import json
 import logging
-from typing import Union
+from typing import Optional, Union
 import pandas as pd
+import pyarrow.parquet as pq
 import warnings
 
-logger = logging.getLogger("lida")
+from .aio import run_blocking
+from .cache import enrichment_cache_key
+from .convert import read_logical_types
+from .enrichment import enrich_in_batches, enrich_in_batches_async
+from .metrics import timed
+from .profiler import profile_columns, profile_parquet_file
+from .streaming import profile_csv_stream, profile_parquet_stream
 
-system_prompt = """
-You are an experienced data analyst that can annotate datasets. Your instructions are as follows:
-i) ALWAYS generate the name of the dataset and the dataset_description
-ii) ALWAYS generate a field description.
-iii.) ALWAYS generate a semantic_type (a single word) for each field given its values e.g. company, city, number, supplier, location, gender, longitude, latitude, url, ip address, zip code, email, etc
-You must return an updated JSON dictionary without any preamble or explanation.
-You MUST NOT add ```json ``` to the beginning and end.
-"""
+logger = logging.getLogger("lida")
 
 def read_dataframe(file_path: str, encoding: str = 'utf-8') -> pd.DataFrame:
     """Read a dataframe from various file formats"""
@@ -27,8 +27,12 @@ def read_dataframe(file_path: str, encoding: str = 'utf-8') -> pd.DataFrame:
         raise ValueError(f"Unsupported file format: {file_path}")
 
 class Summarizer():
-    def __init__(self) -> None:
+    def __init__(self, cache=None) -> None:
         self.summary = None
+        self.sketches = None
+        self.cache = cache
+        self.enrichment_stats = None
+        self.streaming_stats = None
 
     def check_type(self, dtype: str, value):
         """Cast value to right type to ensure it is JSON serializable"""
@@ -39,8 +43,23 @@ class Summarizer():
         else:
             return value
 
-    def get_column_properties(self, df: pd.DataFrame, n_samples: int = 3) -> list[dict]:
-        """Get properties of each column in a pandas DataFrame"""
+    def get_column_properties(self, df: pd.DataFrame, n_samples: int = 3, sketches: Optional[dict] = None,
+                              column_types: Optional[dict] = None) -> list[dict]:
+        """
+        Get properties of each column in a pandas DataFrame using Arrow compute kernels.
+        `column_types` are the logical types stored by the converter; with them, string
+        columns skip the datetime trial cast.
+        """
+        return profile_columns(
+            df, n_samples,
+            fallback=lambda column: self.get_column_properties_pandas(
+                df[[column]], n_samples, column_types)[0]["properties"],
+            sketches=sketches, column_types=column_types)
+
+    def get_column_properties_pandas(self, df: pd.DataFrame, n_samples: int = 3,
+                                     column_types: Optional[dict] = None) -> list[dict]:
+        """Get properties of each column in a pandas DataFrame, one pandas pass per statistic"""
+        column_types = column_types or {}
         properties_list = []
         for column in df.columns:
             dtype = df[column].dtype
@@ -54,18 +73,24 @@ class Summarizer():
             elif dtype is bool or str(dtype) == 'bool':
                 properties["dtype"] = "boolean"
             elif dtype is object or str(dtype) == 'object':
-                # Check if the string column can be cast to a valid datetime
-                try:
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        pd.to_datetime(df[column], errors='raise')
-                        properties["dtype"] = "date"
-                except ValueError:
-                    # Check if the string column has a limited number of values
-                    if df[column].nunique() / len(df[column]) < 0.5:
-                        properties["dtype"] = "category"
-                    else:
-                        properties["dtype"] = "string"
+                # Check if the string column can be cast to a valid datetime;
+                # the converter already ruled out dates for the columns it typed
+                is_date = False
+                if column not in column_types:
+                    try:
+                        with warnings.catch_warnings():
+                            warnings.simplefilter("ignore")
+                            pd.to_datetime(df[column], errors='raise')
+                        is_date = True
+                    except ValueError:
+                        pass
+                if is_date:
+                    properties["dtype"] = "date"
+                # Check if the string column has a limited number of values
+                elif df[column].nunique() / len(df[column]) < 0.5:
+                    properties["dtype"] = "category"
+                else:
+                    properties["dtype"] = "string"
             elif pd.api.types.is_categorical_dtype(df[column]):
                 properties["dtype"] = "category"
             elif pd.api.types.is_datetime64_any_dtype(df[column]):
@@ -86,11 +111,12 @@ class Summarizer():
             nunique = df[column].nunique()
             if "samples" not in properties:
                 non_null_values = df[column][df[column].notnull()].unique()
-                n_samples = min(n_samples, len(non_null_values))
+                column_samples = min(n_samples, len(non_null_values))
                 samples = pd.Series(non_null_values).sample(
-                    n_samples, random_state=42).tolist()
+                    column_samples, random_state=42).tolist()
                 properties["samples"] = samples
             properties["num_unique_values"] = nunique
+            properties["num_null_values"] = int(df[column].isnull().sum())
             properties["semantic_type"] = ""
             properties["description"] = ""
             properties_list.append(
@@ -98,41 +124,115 @@ class Summarizer():
 
         return properties_list
 
-    def enrich(self, base_summary: dict, text_gen) -> dict:
-        """Enrich the data summary with descriptions"""
+    def enrich(self, base_summary: dict, text_gen, progress=None) -> dict:
+        """Enrich the data summary with descriptions; `progress` receives each batch as it completes"""
+        logger.info("Enriching the data summary with descriptions")
+
+        # reuse a previous response for the same columns, dtypes and samples
+        cache_key, cached = self._cached_enrichment(base_summary, text_gen)
+        if cached is not None:
+            return cached
+
+        # annotate the fields in token-budgeted batches sent concurrently, then merge them
+        self.enrichment_stats = {}
+        enriched = enrich_in_batches(base_summary, text_gen, stats=self.enrichment_stats, progress=progress)
+        return self._store_enrichment(cache_key, enriched)
+
+    async def enrich_async(self, base_summary: dict, text_gen, progress=None) -> dict:
+        """
+        enrich() on the event loop; LLM batches are awaited instead of run on threads.
+        The cache's SQLite reads and writes run on the bounded I/O executor.
+        """
         logger.info("Enriching the data summary with descriptions")
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "assistant", "content": f"""
-        Annotate the dictionary below. Only return a JSON object.
-        {base_summary}
-        """},
-        ]
-        prompt = "\n\n".join(msg["content"] for msg in messages)
-        prompts = [prompt]
-        response = text_gen.invoke(prompts)
+        cache_key, cached = await run_blocking(self._cached_enrichment, base_summary, text_gen)
+        if cached is not None:
+            return cached
+
+        self.enrichment_stats = {}
+        enriched = await enrich_in_batches_async(base_summary, text_gen, stats=self.enrichment_stats, progress=progress)
+        return await run_blocking(self._store_enrichment, cache_key, enriched)
 
-        # extract the generated text from LLMResult
+    def _cached_enrichment(self, base_summary: dict, text_gen) -> tuple:
+        """The cache key for this summary and model, and the cached result if there is one"""
+        if self.cache is None:
+            return None, None
+        cache_key = enrichment_cache_key(base_summary, getattr(text_gen, "model", ""))
+        cached_content = self.cache.get(cache_key)
+        if cached_content is None:
+            return cache_key, None
+        logger.info("Enrichment cache hit")
+        cached_summary = json.loads(cached_content)
+        cached_summary["file_name"] = base_summary["file_name"]
+        return cache_key, json.dumps(json.dumps(cached_summary))
 
-        # attach column names for reference
-        # data_summary["field_names"] = data_simmary.tolist()
+    def _store_enrichment(self, cache_key, enriched: dict):
+        content = json.dumps(enriched, default=str)
+
+        # only cache complete annotations, never partial or failed batches
+        if cache_key is not None and self.enrichment_stats["failed_batches"] == 0 \
+                and self.enrichment_stats["annotated_fields"] == self.enrichment_stats["total_fields"]:
+            self.cache.set(cache_key, content)
 
         # return the enriched summary dict
-        return json.dumps(response.content)
+        return json.dumps(content)
 
     def summarize(
-            self, data: Union[pd.DataFrame, str],
+            self, data: Union[pd.DataFrame, pq.ParquetFile, str],
             text_gen, file_name="", n_samples: int = 3,
-            summary_method: str = "default", encoding: str = 'utf-8') -> dict:
-        """Summarize data from a pandas DataFrame or a file location"""
+            summary_method: str = "default", encoding: str = 'utf-8',
+            use_sketches: bool = False, progress=None, column_types: Optional[dict] = None,
+            memory_limit: Optional[int] = None) -> dict:
+        """
+        Summarize data from a pandas DataFrame, an open Parquet file or a file location.
+        With use_sketches, distinct counts and quantiles come from HyperLogLog/KLL sketches,
+        which are kept on self.sketches so they can be stored alongside the metadata.
+        With a memory_limit (in bytes), Parquet and CSV files are profiled out of core in
+        row group slices or CSV blocks sized to stay under it, see profile_stream; the sketches are kept as well.
+        `progress`, if given, is called with the name of each stage as it starts.
+        `column_types` are the logical types the converter stored with the file, if known.
+        """
+        progress = progress or (lambda stage: None)
+
+        if memory_limit is not None and isinstance(data, str):
+            file_name = data.split("/")[-1]
+            if data.endswith('.parquet'):
+                data = pq.ParquetFile(data, pre_buffer=True)
+            elif not data.endswith('.csv'):
+                raise ValueError(f"Out-of-core profiling supports CSV and Parquet files, not {file_name}")
 
         # if data is a file path, read it into a pandas DataFrame, set file_name to the file name
-        if isinstance(data, str):
+        if isinstance(data, str) and memory_limit is None:
             file_name = data.split("/")[-1]
+            if data.endswith('.parquet') and column_types is None:
+                column_types = read_logical_types(pq.read_schema(data))
             # modified to include encoding
             data = read_dataframe(data, encoding=encoding)
-        data_properties = self.get_column_properties(data, n_samples)
+
+        progress("profiling")
+        with timed("profile") as span:
+            if memory_limit is not None and not isinstance(data, pd.DataFrame):
+                # out-of-core profile, one bounded batch at a time
+                if isinstance(data, pq.ParquetFile):
+                    profile = profile_parquet_stream(data, memory_limit, n_samples)
+                else:
+                    with open(data, 'rb') as source:
+                        profile = profile_csv_stream(source, memory_limit, n_samples)
+                data_properties = profile["fields"]
+                self.sketches, self.streaming_stats = profile["sketches"], profile["stats"]
+                span.rows = profile["rows"]
+            elif isinstance(data, pq.ParquetFile):
+                # fast profile from the footer statistics and a few sampled row groups
+                data_properties = profile_parquet_file(data, n_samples)
+                span.rows = data.metadata.num_rows
+            elif use_sketches:
+                self.sketches = {}
+                data_properties = self.get_column_properties(
+                    data, n_samples, sketches=self.sketches, column_types=column_types)
+                span.rows = len(data)
+            else:
+                data_properties = self.get_column_properties(data, n_samples, column_types=column_types)
+                span.rows = len(data)
 
         # default single stage summary construction
         base_summary = {
@@ -146,6 +246,7 @@ class Summarizer():
 
         if summary_method == "llm":
             # two stage summarization with llm enrichment
+            progress("enriching")
             data_summary = self.enrich(
                 base_summary,
                 text_gen=text_gen,
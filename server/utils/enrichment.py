@@ -0,0 +1,424 @@
+import asyncio
+import contextvars
+import copy
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+
+import dotenv
+
+from .aio import run_blocking
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger("lida")
+
+# Prompt tokens per enrichment batch, including the instructions
+ENRICH_BATCH_TOKENS = int(os.getenv('ENRICH_BATCH_TOKENS', 4000))
+# Completion tokens requested per field of a batch, plus a fixed allowance for the envelope
+ENRICH_TOKENS_PER_FIELD = int(os.getenv('ENRICH_TOKENS_PER_FIELD', 120))
+ENRICH_MAX_COMPLETION_TOKENS = int(os.getenv('ENRICH_MAX_COMPLETION_TOKENS', 8192))
+# Batches in flight at once for one summary
+ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', 4))
+ENRICH_MAX_RETRIES = int(os.getenv('ENRICH_MAX_RETRIES', 4))
+ENRICH_RETRY_BACKOFF = float(os.getenv('ENRICH_RETRY_BACKOFF', 1.0))
+
+# Rough size of a token for Llama-family tokenizers; used only for budgeting
+CHARS_PER_TOKEN = 4
+
+batch_prompt = """
+You are an experienced data analyst that annotates datasets.
+For EVERY field listed below, write a description and a semantic_type (a single word) given its values,
+e.g. company, city, number, supplier, location, gender, longitude, latitude, url, ip address, zip code, email.
+{dataset_instruction}
+Return only a JSON object, without any preamble, explanation or ``` fences, in this shape:
+{response_shape}
+
+Dataset: {file_name}
+All columns: {all_columns}
+Fields to annotate:
+{fields}
+"""
+
+_usage_lock = threading.Lock()
+_usage = {"batches": 0, "retries": 0, "failed_batches": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0}
+
+
+class LLMRateLimited(Exception):
+    """Raised by an LLM wrapper when the provider asks the caller to slow down"""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ResponseTruncated(ValueError):
+    """A single-field answer hit the completion limit; it cannot be split, only given more room"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _field_payload(field: dict) -> dict:
+    """The parts of a profiled field the LLM needs to annotate it"""
+    properties = {
+        key: value for key, value in field["properties"].items()
+        if key not in ("semantic_type", "description")
+    }
+    return {"column": field["column"], "properties": properties}
+
+
+def split_batches(fields: list, token_budget: int = ENRICH_BATCH_TOKENS, overhead: int = 0) -> list[list]:
+    """Group fields, in order, into batches whose serialized size stays under the token budget"""
+    batches, current, used = [], [], overhead
+    for field in fields:
+        size = estimate_tokens(json.dumps(_field_payload(field), default=str))
+        if current and used + size > token_budget:
+            batches.append(current)
+            current, used = [], overhead
+        current.append(field)
+        used += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _all_columns(fields: list, token_budget: int) -> str:
+    """Comma-separated column names for context, cut off at a quarter of the budget"""
+    names = ", ".join(str(field["column"]) for field in fields)
+    limit = token_budget // 4 * CHARS_PER_TOKEN
+    return names if len(names) <= limit else names[:limit] + ", ..."
+
+
+def build_prompt(file_name: str, fields: list, batch: list, first: bool, token_budget: int) -> str:
+    if first:
+        dataset_instruction = "Also generate the name of the dataset and a dataset_description."
+        response_shape = ('{"name": "...", "dataset_description": "...", "fields": '
+                          '[{"column": "...", "semantic_type": "...", "description": "..."}]}')
+    else:
+        dataset_instruction = ""
+        response_shape = '{"fields": [{"column": "...", "semantic_type": "...", "description": "..."}]}'
+    return batch_prompt.format(
+        dataset_instruction=dataset_instruction,
+        response_shape=response_shape,
+        file_name=file_name,
+        all_columns=_all_columns(fields, token_budget),
+        fields=json.dumps([_field_payload(field) for field in batch], default=str),
+    )
+
+
+def parse_batch_response(content: str, columns: list) -> dict:
+    """
+    Validate one batch's JSON answer; returns {"name", "dataset_description", "fields": {column: annotation}}
+    with only the requested columns. Raises ValueError if the answer is not usable JSON.
+    """
+    text = (content or "").strip()
+    # Models sometimes wrap the object in fences or prose despite the instructions
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match is None:
+        raise ValueError("Response contains no JSON object")
+    parsed = json.loads(match.group(0))
+    if not isinstance(parsed, dict) or "error" in parsed:
+        raise ValueError(f"Unexpected response: {text[:200]}")
+
+    wanted = {str(column): column for column in columns}
+    annotations = {}
+    for entry in parsed.get("fields") or []:
+        if not isinstance(entry, dict) or str(entry.get("column")) not in wanted:
+            continue
+        # Accept annotations at the top level or nested under "properties", as the old prompt returned
+        properties = entry.get("properties") if isinstance(entry.get("properties"), dict) else entry
+        annotations[wanted[str(entry["column"])]] = {
+            "semantic_type": str(properties.get("semantic_type", "") or ""),
+            "description": str(properties.get("description", "") or ""),
+        }
+    return {
+        "name": parsed.get("name"),
+        "dataset_description": parsed.get("dataset_description"),
+        "fields": annotations,
+    }
+
+
+def _complete(text_gen, prompt: str, max_tokens: int) -> dict:
+    """Call the LLM; wrappers without complete() are driven through invoke()"""
+    if hasattr(text_gen, "complete"):
+        return text_gen.complete(prompt, max_tokens=max_tokens)
+    response = text_gen.invoke([prompt])
+    return {"content": response.content, "prompt_tokens": None, "completion_tokens": None, "finish_reason": None}
+
+
+async def _acomplete(text_gen, prompt: str, max_tokens: int) -> dict:
+    """Call the LLM without blocking the event loop; synchronous wrappers run on the bounded I/O executor"""
+    if hasattr(text_gen, "acomplete"):
+        return await text_gen.acomplete(prompt, max_tokens=max_tokens)
+    return await run_blocking(_complete, text_gen, prompt, max_tokens)
+
+
+def _retry_delay(attempt: int, error: Exception, backoff: float) -> float:
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    # Exponential backoff with jitter so concurrent batches do not retry in lockstep
+    return backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+def _record_usage(**counts):
+    with _usage_lock:
+        for key, value in counts.items():
+            _usage[key] += value or 0
+
+
+def _start_batch(file_name: str, fields: list, batch: list, first: bool, token_budget: int) -> tuple:
+    """Prompt, completion limit and an empty stats entry for one batch"""
+    prompt = build_prompt(file_name, fields, batch, first, token_budget)
+    max_tokens = min(ENRICH_TOKENS_PER_FIELD * len(batch) + 200, ENRICH_MAX_COMPLETION_TOKENS)
+    stats = {"columns": len(batch), "attempts": 0, "prompt_tokens": 0, "completion_tokens": 0,
+             "latency_seconds": 0.0, "status": "failed", "error": None}
+    return prompt, max_tokens, stats
+
+
+def _accept_answer(result: dict, prompt: str, batch: list, stats: dict, attempt: int, max_retries: int,
+                   started: float) -> Optional[dict]:
+    """
+    Account for one LLM answer. Returns its annotations, or None when it was truncated and the
+    batch must be split; raises ResponseTruncated for a truncated single field and ValueError
+    when the answer should be retried.
+    """
+    columns = [field["column"] for field in batch]
+    stats["prompt_tokens"] += result["prompt_tokens"] or estimate_tokens(prompt)
+    stats["completion_tokens"] += result["completion_tokens"] or estimate_tokens(result["content"] or "")
+    if result["finish_reason"] == "length":
+        if len(batch) == 1:
+            raise ResponseTruncated("Response truncated")
+        stats["status"], stats["error"] = "split", "Response truncated"
+        return None
+    annotations = parse_batch_response(result["content"], columns)
+    stats["latency_seconds"] += time.perf_counter() - started
+    missing = [column for column in columns if column not in annotations["fields"]]
+    if missing and attempt < max_retries:
+        raise ValueError(f"Response is missing {len(missing)} of {len(columns)} fields")
+    stats["status"] = "succeeded" if not missing else "partial"
+    stats["error"] = None if not missing else f"Missing fields: {', '.join(map(str, missing))}"
+    return annotations
+
+
+def _failed_attempt(error: Exception, batch: list, stats: dict, attempt: int, max_retries: int,
+                    backoff: float, started: float) -> Optional[float]:
+    """Account for a failed attempt; returns the delay before the next one, or None to give up"""
+    stats["latency_seconds"] += time.perf_counter() - started
+    stats["error"] = str(error)
+    if attempt == max_retries:
+        return None
+    _record_usage(retries=1)
+    delay = _retry_delay(attempt, error, backoff)
+    logger.info(f"Enrichment batch of {len(batch)} fields failed ({error}), retrying in {delay:.1f}s")
+    return delay
+
+
+def _truncated_attempt(error: ResponseTruncated, stats: dict, attempt: int, max_retries: int,
+                       max_tokens: int, started: float) -> Optional[int]:
+    """
+    Account for a truncated single-field answer; returns the doubled completion limit to retry
+    with, or None to give up once the limit is ENRICH_MAX_COMPLETION_TOKENS or retries are spent
+    """
+    stats["latency_seconds"] += time.perf_counter() - started
+    stats["error"] = f"{error} at {max_tokens} completion tokens"
+    if attempt == max_retries or max_tokens >= ENRICH_MAX_COMPLETION_TOKENS:
+        return None
+    _record_usage(retries=1)
+    return min(max_tokens * 2, ENRICH_MAX_COMPLETION_TOKENS)
+
+
+def _empty_annotations() -> dict:
+    return {"name": None, "dataset_description": None, "fields": {}}
+
+
+def run_batch(text_gen, file_name: str, fields: list, batch: list, first: bool,
+              token_budget: int = ENRICH_BATCH_TOKENS, max_retries: int = ENRICH_MAX_RETRIES,
+              backoff: float = ENRICH_RETRY_BACKOFF) -> tuple[dict, list]:
+    """
+    Annotate one batch, retrying rate limits, errors and invalid answers with backoff.
+    A truncated answer splits the batch in two, or for a single field is retried with a larger
+    completion limit. Returns the merged annotations and one stats entry per LLM batch that ran.
+    """
+    prompt, max_tokens, stats = _start_batch(file_name, fields, batch, first, token_budget)
+
+    for attempt in range(max_retries + 1):
+        stats["attempts"] += 1
+        started = time.perf_counter()
+        try:
+            annotations = _accept_answer(
+                _complete(text_gen, prompt, max_tokens), prompt, batch, stats, attempt, max_retries, started)
+            if annotations is None:
+                break
+            return annotations, [stats]
+        except ResponseTruncated as e:
+            max_tokens = _truncated_attempt(e, stats, attempt, max_retries, max_tokens, started)
+            if max_tokens is None:
+                break
+        except Exception as e:
+            delay = _failed_attempt(e, batch, stats, attempt, max_retries, backoff, started)
+            if delay is None:
+                break
+            time.sleep(delay)
+
+    if stats["status"] == "split":
+        middle = len(batch) // 2
+        left, left_stats = run_batch(text_gen, file_name, fields, batch[:middle], first, token_budget, max_retries, backoff)
+        right, right_stats = run_batch(text_gen, file_name, fields, batch[middle:], False, token_budget, max_retries, backoff)
+        left["fields"].update(right["fields"])
+        return left, [stats] + left_stats + right_stats
+
+    return _empty_annotations(), [stats]
+
+
+async def run_batch_async(text_gen, file_name: str, fields: list, batch: list, first: bool,
+                          token_budget: int = ENRICH_BATCH_TOKENS, max_retries: int = ENRICH_MAX_RETRIES,
+                          backoff: float = ENRICH_RETRY_BACKOFF) -> tuple[dict, list]:
+    """run_batch for the event loop: waits on the LLM and on retry delays without holding a thread"""
+    prompt, max_tokens, stats = _start_batch(file_name, fields, batch, first, token_budget)
+
+    for attempt in range(max_retries + 1):
+        stats["attempts"] += 1
+        started = time.perf_counter()
+        try:
+            annotations = _accept_answer(
+                await _acomplete(text_gen, prompt, max_tokens), prompt, batch, stats, attempt, max_retries, started)
+            if annotations is None:
+                break
+            return annotations, [stats]
+        except ResponseTruncated as e:
+            max_tokens = _truncated_attempt(e, stats, attempt, max_retries, max_tokens, started)
+            if max_tokens is None:
+                break
+        except Exception as e:
+            delay = _failed_attempt(e, batch, stats, attempt, max_retries, backoff, started)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+    if stats["status"] == "split":
+        middle = len(batch) // 2
+        (left, left_stats), (right, right_stats) = await asyncio.gather(
+            run_batch_async(text_gen, file_name, fields, batch[:middle], first, token_budget, max_retries, backoff),
+            run_batch_async(text_gen, file_name, fields, batch[middle:], False, token_budget, max_retries, backoff))
+        left["fields"].update(right["fields"])
+        return left, [stats] + left_stats + right_stats
+
+    return _empty_annotations(), [stats]
+
+
+def _plan_batches(base_summary: dict, token_budget: int) -> tuple:
+    fields = base_summary.get("fields", [])
+    file_name = base_summary.get("file_name", "")
+    overhead = estimate_tokens(build_prompt(file_name, fields, [], True, token_budget))
+    return fields, file_name, split_batches(fields, token_budget, overhead) or [[]]
+
+
+def _report_batch(progress, index: int, done: int, batches: int, result: dict, result_stats: list):
+    progress("enriching", batch=index, batches_done=done, batches=batches,
+             latency_seconds=round(sum(entry["latency_seconds"] for entry in result_stats), 3),
+             prompt_tokens=sum(entry["prompt_tokens"] for entry in result_stats),
+             completion_tokens=sum(entry["completion_tokens"] for entry in result_stats),
+             fields=result["fields"])
+
+
+def _merge_batches(base_summary: dict, fields: list, batches: list, results: list, started: float,
+                   stats: Optional[dict]) -> dict:
+    """Merge the batches' annotations into a copy of the base summary and record usage"""
+    summary = copy.deepcopy(base_summary)
+    annotations = {}
+    batch_stats = []
+    for i, (result, result_stats) in enumerate(results):
+        annotations.update(result["fields"])
+        for entry in result_stats:
+            batch_stats.append({"batch": i, **entry})
+    first = results[0][0]
+    if first.get("name"):
+        summary["name"] = first["name"]
+    summary["dataset_description"] = first.get("dataset_description") or summary.get("dataset_description", "")
+    for field in summary["fields"]:
+        field["properties"].update(annotations.get(field["column"], {}))
+
+    totals = {
+        "prompt_tokens": sum(entry["prompt_tokens"] for entry in batch_stats),
+        "completion_tokens": sum(entry["completion_tokens"] for entry in batch_stats),
+        "latency_seconds": sum(entry["latency_seconds"] for entry in batch_stats),
+    }
+    failed = [entry for entry in batch_stats if entry["status"] == "failed"]
+    _record_usage(batches=len(batch_stats), failed_batches=len(failed), **totals)
+    if stats is not None:
+        stats.update(
+            batches=len(batches),
+            failed_batches=len(failed),
+            annotated_fields=len(annotations),
+            total_fields=len(fields),
+            wall_seconds=round(time.perf_counter() - started, 3),
+            **totals,
+            details=batch_stats)
+    return summary
+
+
+def enrich_in_batches(base_summary: dict, text_gen, token_budget: int = ENRICH_BATCH_TOKENS,
+                      concurrency: int = ENRICH_CONCURRENCY, stats: Optional[dict] = None,
+                      progress=None) -> dict:
+    """
+    Annotate a base summary with token-budgeted LLM batches sent concurrently, and merge the
+    validated partial answers into one summary. Fields whose batch failed keep empty
+    annotations. If a `stats` dict is given it receives per-batch token counts and latency.
+    `progress`, if given, is called with each batch's annotations and latency as it completes.
+    """
+    progress = progress or (lambda stage, **details: None)
+    fields, file_name, batches = _plan_batches(base_summary, token_budget)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+        # Each batch runs in a copy of the caller's context so its LLM spans join the caller's trace
+        futures = {
+            executor.submit(contextvars.copy_context().run, run_batch,
+                            text_gen, file_name, fields, batch, i == 0, token_budget): i
+            for i, batch in enumerate(batches)
+        }
+        results = [None] * len(batches)
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            _report_batch(progress, futures[future], done, len(batches), *results[futures[future]])
+
+    return _merge_batches(base_summary, fields, batches, results, started, stats)
+
+
+async def enrich_in_batches_async(base_summary: dict, text_gen, token_budget: int = ENRICH_BATCH_TOKENS,
+                                  concurrency: int = ENRICH_CONCURRENCY, stats: Optional[dict] = None,
+                                  progress=None) -> dict:
+    """
+    enrich_in_batches for the event loop. Batches are tasks rather than threads, so an
+    LLM client with acomplete() (e.g. AsyncGroq) waits on the network without holding a thread.
+    """
+    progress = progress or (lambda stage, **details: None)
+    fields, file_name, batches = _plan_batches(base_summary, token_budget)
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(i, batch):
+        async with slots:
+            return i, await run_batch_async(text_gen, file_name, fields, batch, i == 0, token_budget)
+
+    started = time.perf_counter()
+    results = [None] * len(batches)
+    # Tasks copy the caller's context, so LLM spans join the caller's trace
+    for done, finished in enumerate(asyncio.as_completed([run(i, batch) for i, batch in enumerate(batches)]), start=1):
+        i, results[i] = await finished
+        _report_batch(progress, i, done, len(batches), *results[i])
+
+    return _merge_batches(base_summary, fields, batches, results, started, stats)
+
+
+def llm_usage_stats() -> dict:
+    """Token, retry and latency totals of all enrichment batches in this process"""
+    with _usage_lock:
+        return dict(_usage)
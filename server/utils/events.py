@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# Event bus implementation; only "memory" (single process) exists so far
+EVENT_BUS_BACKEND = os.getenv('EVENT_BUS_BACKEND', 'memory')
+# Events kept per channel so late or reconnecting subscribers can catch up
+EVENT_HISTORY = int(os.getenv('EVENT_HISTORY', 500))
+# Seconds a finished channel stays available for replay
+EVENT_CHANNEL_TTL = float(os.getenv('EVENT_CHANNEL_TTL', 600))
+# Seconds a subscriber waits for a channel that has not been created yet
+EVENT_CHANNEL_WAIT = float(os.getenv('EVENT_CHANNEL_WAIT', 30))
+# Seconds between keep-alive comments on idle streams
+EVENT_KEEPALIVE = float(os.getenv('EVENT_KEEPALIVE', 15))
+
+
+class _Channel:
+    def __init__(self, history: int):
+        self.events = deque(maxlen=history)
+        self.closed_at = None
+
+
+class MemoryEventBus:
+    """
+    In-process publish/subscribe bus. Every channel keeps a bounded history of events with
+    increasing ids, so subscribers can join late or resume after a reconnect. Ids come from
+    one counter for the whole bus, so a channel name used again never repeats an id.
+    Another backend only needs open(), publish(), close(), is_active() and subscribe().
+    """
+    name = "memory"
+
+    def __init__(self, history: int = EVENT_HISTORY, ttl: float = EVENT_CHANNEL_TTL):
+        self.history = history
+        self.ttl = ttl
+        self._channels = {}
+        self._next_id = 1
+        self._condition = threading.Condition()
+
+    def open(self, channel: str) -> bool:
+        """
+        Start a new stream on a channel unless it is active; returns whether it was started.
+        The check and the creation are atomic, so of concurrent callers only one gets True.
+        """
+        with self._condition:
+            self._prune()
+            state = self._channels.get(channel)
+            if state is not None and state.closed_at is None:
+                return False
+            self._channels[channel] = _Channel(self.history)
+            self._condition.notify_all()
+            return True
+
+    def publish(self, channel: str, event: str, data: dict) -> int:
+        """Append an event to a channel, creating it if needed; returns the event id"""
+        with self._condition:
+            self._prune()
+            state = self._channels.get(channel)
+            if state is None or state.closed_at is not None:
+                # A finished channel that is used again starts a new stream
+                state = self._channels[channel] = _Channel(self.history)
+            event_id = self._next_id
+            self._next_id += 1
+            state.events.append({"id": event_id, "event": event, "data": data, "at": time.time()})
+            self._condition.notify_all()
+            return event_id
+
+    def close(self, channel: str):
+        """Mark a channel finished; subscribers stop once they have received its events"""
+        with self._condition:
+            state = self._channels.get(channel)
+            if state is not None and state.closed_at is None:
+                state.closed_at = time.time()
+                self._condition.notify_all()
+
+    def is_active(self, channel: str) -> bool:
+        """Whether a channel has been opened or has events, and has not been closed"""
+        with self._condition:
+            state = self._channels.get(channel)
+            return state is not None and state.closed_at is None
+
+    def subscribe(self, channel: str, last_event_id: int = 0, timeout: float = EVENT_KEEPALIVE,
+                  wait: float = EVENT_CHANNEL_WAIT):
+        """
+        Yield the channel's events after last_event_id as they are published, and None
+        whenever `timeout` seconds pass without one. Ends when the channel is closed, or if
+        it does not exist within `wait` seconds.
+        """
+        started = time.time()
+        while True:
+            with self._condition:
+                state = self._channels.get(channel)
+                pending = [event for event in state.events if event["id"] > last_event_id] if state else []
+                if not pending:
+                    if state is not None and state.closed_at is not None:
+                        return
+                    if state is None and time.time() - started > wait:
+                        return
+                    self._condition.wait(timeout)
+                    state = self._channels.get(channel)
+                    pending = [event for event in state.events if event["id"] > last_event_id] if state else []
+            if not pending:
+                yield None
+                continue
+            for event in pending:
+                last_event_id = event["id"]
+                yield event
+
+    def _prune(self):
+        """Drop channels that finished more than ttl seconds ago"""
+        now = time.time()
+        expired = [name for name, state in self._channels.items()
+                   if state.closed_at is not None and now - state.closed_at > self.ttl]
+        for name in expired:
+            del self._channels[name]
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "backend": self.name,
+                "channels": len(self._channels),
+                "active_channels": sum(1 for state in self._channels.values() if state.closed_at is None),
+            }
+
+
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> MemoryEventBus:
+    """Return the process-wide event bus configured by EVENT_BUS_BACKEND"""
+    global _event_bus
+    with _event_bus_lock:
+        if _event_bus is None:
+            if EVENT_BUS_BACKEND == 'memory':
+                _event_bus = MemoryEventBus()
+            else:
+                raise ValueError(f"Unknown event bus backend: {EVENT_BUS_BACKEND}")
+        return _event_bus
+
+
+class ChannelProgress:
+    """Progress callback that publishes progress(stage, **details) as "progress" events on a channel"""
+    def __init__(self, channel: str, bus=None):
+        self.channel = channel
+        self.bus = bus or get_event_bus()
+
+    def __call__(self, stage: str, **details):
+        self.bus.publish(self.channel, "progress", {"stage": stage, **details})
+
+    def finish(self, result: Optional[dict] = None, error: Optional[str] = None):
+        """Publish the final result or error and close the channel"""
+        if error is not None:
+            self.bus.publish(self.channel, "error", {"error": error})
+        else:
+            self.bus.publish(self.channel, "result", result or {})
+        self.bus.close(self.channel)
+
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def iter_sse(channel: str, last_event_id: int = 0, bus=None):
+    """Yield a channel's events in Server-Sent Events format, with keep-alive comments while idle"""
+    bus = bus or get_event_bus()
+    for event in bus.subscribe(channel, last_event_id):
+        yield format_sse(event) if event is not None else ": keep-alive\n\n"
@@ -0,0 +1,412 @@
+import copy
+import hashlib
+import json
+import math
+import os
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import dotenv
+
+from .convert import read_logical_types
+from .metrics import timed
+from .profiler import profile_columns
+from .sketches import ColumnSketch, SKETCH_BATCH_ROWS
+from .storage import MinioObjectFile
+
+dotenv.load_dotenv()
+
+PROFILE_STATE_SUFFIX = "_profile_state.json"
+# Version 3: footer fingerprints and per-checkpoint fields
+PROFILE_STATE_VERSION = 3
+
+# Upload names are <dataset>_<YYYYmmdd>_<HHMMSS>.parquet, see parquet_object_name
+_VERSION_PATTERN = re.compile(r"^(?P<dataset>.+)_\d{8}_\d{6}$")
+
+
+def dataset_name(object_name: str) -> str:
+    """Logical dataset an object is a version of: its name without the upload timestamp"""
+    stem = os.path.splitext(object_name)[0]
+    match = _VERSION_PATTERN.match(stem)
+    return match.group("dataset") if match else stem
+
+
+def list_dataset_versions(minio_client, bucket_name, dataset: str) -> list[dict]:
+    """All Parquet versions of a dataset, oldest first, with whether each has a profile state"""
+    versions, states = {}, set()
+    for obj in minio_client.list_objects(bucket_name, prefix=dataset, recursive=True):
+        name = obj.object_name
+        if name.endswith(PROFILE_STATE_SUFFIX):
+            states.add(name[:-len(PROFILE_STATE_SUFFIX)] + ".parquet")
+        elif name.endswith(".parquet") and dataset_name(name) == dataset:
+            versions[name] = {"file": name, "size": obj.size, "last_modified": obj.last_modified}
+    return [
+        {**versions[name], "profiled": name in states}
+        for name in sorted(versions)
+    ]
+
+
+def _statistics(chunk: pq.ColumnChunkMetaData) -> Optional[list]:
+    statistics = chunk.statistics
+    if statistics is None:
+        return None
+    bounds = [str(statistics.min), str(statistics.max)] if statistics.has_min_max else None
+    return [bounds, statistics.null_count if statistics.has_null_count else None, statistics.num_values]
+
+
+def row_group_fingerprint(row_group: pq.RowGroupMetaData) -> str:
+    """
+    Identify a row group from the footer alone: its row count and, per column chunk, the
+    path, compressed and uncompressed sizes, compression, encodings and min/max/null
+    statistics. Identical data written with the same settings gives the same fingerprint,
+    so the shared leading row groups of an appended re-upload are recognised without
+    fetching them; edits that change a chunk's size or statistics change the fingerprint.
+    """
+    chunks = []
+    for i in range(row_group.num_columns):
+        chunk = row_group.column(i)
+        chunks.append([
+            chunk.path_in_schema, chunk.total_compressed_size, chunk.total_uncompressed_size,
+            chunk.compression, sorted(chunk.encodings), _statistics(chunk)])
+    content = json.dumps([row_group.num_rows, chunks], default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _tracks_min_max(arrow_type: pa.DataType) -> bool:
+    return (pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+            or pa.types.is_temporal(arrow_type) or pa.types.is_string(arrow_type)
+            or pa.types.is_large_string(arrow_type))
+
+
+class ColumnAggregate:
+    """
+    Mergeable partial statistics of one column: row and null counts, count/mean/M2 for the
+    variance (Chan's parallel formula), min/max and a distinct/quantile sketch.
+    Temporal min/max are kept as their integer encoding so the state stays JSON.
+    """
+    def __init__(self, arrow_type: pa.DataType):
+        self.arrow_type = arrow_type
+        self.numeric = pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+        self.hashable = not pa.types.is_nested(arrow_type)
+        self.rows = 0
+        self.nulls = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.sketch = ColumnSketch.for_type(arrow_type) if self.hashable else None
+
+    def _storage_type(self) -> pa.DataType:
+        # date32 and time32 are stored as 32-bit integers and only cast to int32
+        return pa.int32() if self.arrow_type.bit_width == 32 else pa.int64()
+
+    def _encode(self, scalar: pa.Scalar):
+        if not scalar.is_valid:
+            return None
+        if pa.types.is_temporal(self.arrow_type):
+            return scalar.cast(self._storage_type()).as_py()
+        return scalar.as_py()
+
+    def _decode(self, value):
+        if value is None or not pa.types.is_temporal(self.arrow_type):
+            return value
+        value = pa.scalar(value, self._storage_type()).cast(self.arrow_type).as_py()
+        return pd.Timestamp(value) if pa.types.is_timestamp(self.arrow_type) else value
+
+    def _merge_moments(self, count: int, mean: float, m2: float):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def _merge_min_max(self, minimum, maximum):
+        if minimum is not None:
+            self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        if maximum is not None:
+            self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def update(self, column: pa.ChunkedArray):
+        """Add the values of one row group"""
+        self.rows += len(column)
+        self.nulls += column.null_count
+        if self.sketch is not None:
+            # Hashed in bounded slices, as in sketch_column
+            for chunk in column.chunks:
+                for offset in range(0, len(chunk), SKETCH_BATCH_ROWS):
+                    self.sketch.update(chunk.slice(offset, SKETCH_BATCH_ROWS))
+        if self.numeric and len(column) > column.null_count:
+            values = column.drop_null()
+            count = len(values)
+            self._merge_moments(count, pc.mean(values).as_py(), pc.variance(values, ddof=0).as_py() * count)
+        if _tracks_min_max(self.arrow_type):
+            min_max = pc.min_max(column)
+            self._merge_min_max(self._encode(min_max["min"]), self._encode(min_max["max"]))
+
+    def merge(self, other: "ColumnAggregate"):
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self._merge_moments(other.count, other.mean, other.m2)
+        self._merge_min_max(other.minimum, other.maximum)
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+
+    def properties(self, dtype: str, samples: list) -> dict:
+        """Column properties in the schema of Summarizer.get_column_properties"""
+        if not self.hashable:
+            return {
+                "dtype": str(self.arrow_type),
+                "samples": [],
+                "num_unique_values": None,
+                "num_null_values": self.nulls,
+                "semantic_type": "",
+                "description": "",
+            }
+
+        non_null = self.rows - self.nulls
+        nunique = min(self.sketch.distinct_count(), non_null)
+        if dtype in ("category", "string"):
+            dtype = "category" if self.rows and nunique / self.rows < 0.5 else "string"
+
+        properties = {"dtype": dtype}
+        if dtype == "number":
+            is_integer = pa.types.is_integer(self.arrow_type)
+            std = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+            properties["std"] = None if std is None else (int(std) if is_integer else float(std))
+            properties["min"], properties["max"] = self.minimum, self.maximum
+            if self.sketch.quantiles() is not None:
+                properties["quantiles"] = self.sketch.quantiles()
+        elif dtype == "date":
+            properties["min"], properties["max"] = self._decode(self.minimum), self._decode(self.maximum)
+
+        properties["samples"] = samples
+        properties["num_unique_values"] = nunique
+        properties["num_null_values"] = self.nulls
+        properties["semantic_type"] = ""
+        properties["description"] = ""
+        return properties
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.minimum,
+            "max": self.maximum,
+            "sketch": self.sketch.to_dict() if self.sketch is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, arrow_type: pa.DataType, data: dict) -> "ColumnAggregate":
+        aggregate = cls(arrow_type)
+        aggregate.rows, aggregate.nulls = data["rows"], data["nulls"]
+        aggregate.count, aggregate.mean, aggregate.m2 = data["count"], data["mean"], data["m2"]
+        aggregate.minimum, aggregate.maximum = data["min"], data["max"]
+        if data.get("sketch"):
+            aggregate.sketch = ColumnSketch.from_dict(data["sketch"])
+        return aggregate
+
+
+def _schema_signature(schema: pa.Schema, columns: list) -> list:
+    return [[name, str(schema.field(name).type)] for name in columns]
+
+
+def _merged_dtype(dtype: str, other: str) -> str:
+    if dtype == other:
+        return dtype
+    # A value that is not a date, or a new distinct value, makes the column a string column;
+    # ColumnAggregate.properties still picks category or string from the distinct count
+    if {dtype, other} <= {"date", "category", "string"}:
+        return "string"
+    return other
+
+
+def merge_fields(fields: Optional[dict], new_fields: dict, n_samples: int = 3) -> dict:
+    """
+    Combine the dtype and samples of the rows profiled so far with those of a new row group,
+    so later versions update them instead of keeping the first profile's forever.
+    Samples are a seeded pick from both sets.
+    """
+    if fields is None:
+        return new_fields
+    merged = {}
+    for name, new in new_fields.items():
+        old = fields.get(name)
+        if old is None:
+            merged[name] = new
+            continue
+        pool = list(dict.fromkeys(
+            json.dumps(value, default=str, sort_keys=True) for value in old["samples"] + new["samples"]))
+        picked = np.sort(np.random.RandomState(42).choice(len(pool), size=min(n_samples, len(pool)), replace=False))
+        merged[name] = {
+            "dtype": _merged_dtype(old["dtype"], new["dtype"]),
+            "samples": [json.loads(pool[i]) for i in picked],
+        }
+    return merged
+
+
+def load_previous_state(minio_client, bucket_name, parquet_filename) -> Optional[dict]:
+    """
+    Profile state of the latest version of the same dataset up to and including this file.
+    Re-analysing a file finds its own state; a new upload finds the one before it.
+    """
+    stem = os.path.splitext(parquet_filename)[0]
+    dataset = dataset_name(parquet_filename)
+    candidates = [
+        version["file"] for version in list_dataset_versions(minio_client, bucket_name, dataset)
+        if version["profiled"] and os.path.splitext(version["file"])[0] <= stem
+    ]
+    if not candidates:
+        return None
+
+    state_name = os.path.splitext(candidates[-1])[0] + PROFILE_STATE_SUFFIX
+    response = minio_client.get_object(bucket_name, state_name)
+    try:
+        state = json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+    return state if state.get("version") == PROFILE_STATE_VERSION else None
+
+
+def profile_incremental(minio_client, bucket_name, parquet_filename, n_samples: int = 3, progress=None) -> dict:
+    """
+    Profile a Parquet object by merging partial aggregates, reusing those of the previous
+    version of the dataset for the row groups both files share.
+    Only row groups after the shared prefix are fetched, with ranged GETs, one at a time.
+    Returns the profile_parquet_object result plus the state to store for the next version,
+    and the previous enrichment when the schema is unchanged so the LLM call can be skipped.
+    """
+    progress = progress or (lambda stage: None)
+    progress("loading")
+    source = MinioObjectFile(minio_client, bucket_name, parquet_filename)
+    parquet_file = pq.ParquetFile(source, pre_buffer=True)
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    columns = [name for name in schema.names if not name.startswith("__index_level_")]
+    signature = _schema_signature(schema, columns)
+    fingerprints = [row_group_fingerprint(metadata.row_group(i)) for i in range(metadata.num_row_groups)]
+
+    previous = load_previous_state(minio_client, bucket_name, parquet_filename)
+    if previous is not None and previous["schema"] != signature:
+        # Columns changed: nothing can be merged and the enrichment is stale
+        previous = None
+
+    # The longest checkpoint covered by the row groups both versions share
+    checkpoints, start = [], None
+    if previous is not None:
+        shared = 0
+        for old, new in zip(previous["row_groups"], fingerprints):
+            if old != new:
+                break
+            shared += 1
+        checkpoints = [checkpoint for checkpoint in previous["checkpoints"] if checkpoint["row_groups"] <= shared]
+        start = checkpoints[-1] if checkpoints else None
+
+    if start is not None:
+        aggregates = {
+            name: ColumnAggregate.from_dict(schema.field(name).type, start["columns"][name]) for name in columns}
+        first_row_group = start["row_groups"]
+        fields = start["fields"]
+    else:
+        aggregates = {name: ColumnAggregate(schema.field(name).type) for name in columns}
+        first_row_group = 0
+        fields = None
+
+    progress("profiling")
+    num_row_groups = metadata.num_row_groups
+    with timed("profile_incremental") as span:
+        for i in range(first_row_group, num_row_groups):
+            table = parquet_file.read_row_group(i, columns=columns)
+            # Types and samples of every new row group are merged into those seen so far
+            fields = merge_fields(fields, {
+                entry["column"]: {"dtype": entry["properties"]["dtype"], "samples": entry["properties"]["samples"]}
+                for entry in profile_columns(
+                    table, n_samples, fallback=lambda name: {"dtype": str(schema.field(name).type), "samples": []},
+                    column_types=read_logical_types(schema))
+            }, n_samples)
+            for name in columns:
+                aggregates[name].update(table.column(name))
+            if i >= num_row_groups - 2:
+                # Keep checkpoints at the last two row groups: a re-converted append usually
+                # rewrites the last, partially filled row group of the previous version
+                checkpoints.append({
+                    "row_groups": i + 1,
+                    "columns": {name: copy.deepcopy(aggregate.to_dict()) for name, aggregate in aggregates.items()},
+                    "fields": json.loads(json.dumps(fields, default=str)),
+                })
+        span.rows = sum(metadata.row_group(i).num_rows for i in range(first_row_group, num_row_groups))
+        # The footer plus the new row groups; an appended version fetches about its delta
+        span.bytes_in = source.bytes_fetched
+
+    if fields is None:
+        fields = {name: {"dtype": str(schema.field(name).type), "samples": []} for name in columns}
+
+    data_properties = [
+        {"column": name, "properties": aggregates[name].properties(fields[name]["dtype"], fields[name]["samples"])}
+        for name in columns
+    ]
+    base_summary = {
+        "name": parquet_filename,
+        "file_name": parquet_filename,
+        "dataset_description": "",
+        "fields": data_properties,
+    }
+
+    state = {
+        "version": PROFILE_STATE_VERSION,
+        "dataset": dataset_name(parquet_filename),
+        "file": parquet_filename,
+        "schema": signature,
+        "row_groups": fingerprints,
+        "checkpoints": checkpoints[-2:],
+        "fields": fields,
+    }
+    return {
+        "base_summary": base_summary,
+        "rows": metadata.num_rows,
+        "columns": len(columns),
+        "sketches": {name: aggregate.sketch for name, aggregate in aggregates.items() if aggregate.sketch is not None},
+        "state": state,
+        "previous_version": previous["file"] if previous is not None else None,
+        "annotations": previous.get("annotations") if previous is not None else None,
+        "row_groups_reused": first_row_group,
+        "row_groups_profiled": num_row_groups - first_row_group,
+        "bytes_fetched": source.bytes_fetched,
+    }
+
+
+def annotations_from_summary(data_summary: dict) -> Optional[dict]:
+    """The LLM-written parts of an enriched summary, to reuse for later versions"""
+    if not isinstance(data_summary, dict) or "error" in data_summary:
+        return None
+    return {
+        "dataset_description": data_summary.get("dataset_description", ""),
+        "fields": {
+            field.get("column"): {
+                "semantic_type": field.get("properties", {}).get("semantic_type", ""),
+                "description": field.get("properties", {}).get("description", ""),
+            }
+            for field in data_summary.get("fields", [])
+        },
+    }
+
+
+def apply_annotations(base_summary: dict, annotations: dict) -> dict:
+    """Fill a base summary with the descriptions of a previous version"""
+    summary = copy.deepcopy(base_summary)
+    summary["dataset_description"] = annotations.get("dataset_description", "")
+    for field in summary["fields"]:
+        field["properties"].update(annotations["fields"].get(field["column"], {}))
+    return summary
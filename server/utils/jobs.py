@@ -0,0 +1,223 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import dotenv
+
+from .events import ChannelProgress
+
+dotenv.load_dotenv()
+
+# Number of jobs processed concurrently
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+# Jobs allowed to wait for a worker before new submissions are rejected
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 32))
+# Finished jobs kept around for status polling
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 500))
+# Coroutine jobs run at once by the async server; they hold no thread while awaiting I/O
+JOB_ASYNC_WORKERS = int(os.getenv('JOB_ASYNC_WORKERS', 32))
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """State of a single background job, updated by the worker running it"""
+    def __init__(self, kind: str, params: dict, event_bus=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.stage = "queued"
+        self.stages = [{"stage": "queued", "at": time.time()}]
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        # Progress events are published on a channel named after the job
+        self.events = ChannelProgress(self.id, event_bus) if event_bus is not None else None
+
+    def set_stage(self, stage: str, **details):
+        """
+        Record a progress stage; passed to job functions as their `progress` callback.
+        Details such as rows processed or LLM latency are only published as events.
+        """
+        if stage != self.stage:
+            self.stage = stage
+            self.stages.append({"stage": stage, "at": time.time()})
+        if self.events is not None:
+            self.events(stage, **details)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stages,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Bounded thread pool that runs jobs in the background.
+    submit() returns immediately with a Job to poll; once `max_pending` jobs are waiting,
+    further submissions raise QueueFull so callers can apply backpressure.
+    With an `event_bus`, each job's progress and result are also published on its id.
+    """
+    def __init__(self, max_workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 retention: int = JOB_RETENTION, event_bus=None, max_async_workers: int = JOB_ASYNC_WORKERS):
+        self.max_workers = max_workers
+        self.max_async_workers = max_async_workers
+        self.event_bus = event_bus
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._async_slots = None
+        self._tasks = set()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func, params: Optional[dict] = None, **kwargs) -> Job:
+        """Queue func(**kwargs, progress=job.set_stage); its return value becomes the job result"""
+        job, _ = self._enqueue(kind, params)
+        self._executor.submit(self._run, job, func, kwargs)
+        return job
+
+    def submit_once(self, kind: str, func, params: Optional[dict] = None, **kwargs) -> tuple[Job, bool]:
+        """
+        Like submit(), unless a job of the same kind and parameters is queued or running, which
+        is returned instead. Looking for it and queueing the new job happen under one lock, so
+        concurrent duplicate submissions start a single job. Returns (job, submitted).
+        """
+        job, submitted = self._enqueue(kind, params, reuse=True)
+        if submitted:
+            self._executor.submit(self._run, job, func, kwargs)
+        return job, submitted
+
+    def submit_async(self, kind: str, func, params: Optional[dict] = None, **kwargs) -> Job:
+        """
+        Like submit() for a coroutine function; must be called on the running event loop.
+        The job runs as a task, at most max_async_workers at a time.
+        """
+        job, _ = self._enqueue(kind, params)
+        self._start_task(job, func, kwargs)
+        return job
+
+    def submit_async_once(self, kind: str, func, params: Optional[dict] = None, **kwargs) -> tuple[Job, bool]:
+        """submit_once() for a coroutine function, see submit_async()"""
+        job, submitted = self._enqueue(kind, params, reuse=True)
+        if submitted:
+            self._start_task(job, func, kwargs)
+        return job, submitted
+
+    def _start_task(self, job: Job, func, kwargs: dict):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_async_workers)
+        task = asyncio.get_running_loop().create_task(self._run_async(job, func, kwargs))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _enqueue(self, kind: str, params: Optional[dict], reuse: bool = False) -> tuple[Job, bool]:
+        """Track a new job; with `reuse`, an active job of the same kind and parameters is returned instead"""
+        params = params or {}
+        with self._lock:
+            if reuse:
+                job = self._find_active(kind, params)
+                if job is not None:
+                    return job, False
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} jobs pending)")
+            job = Job(kind, params, self.event_bus)
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._prune()
+        return job, True
+
+    def _run(self, job: Job, func, kwargs: dict):
+        self._start(job)
+        try:
+            job.result = func(progress=job.set_stage, **kwargs)
+            job.status = "succeeded"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            self._finish(job)
+
+    async def _run_async(self, job: Job, func, kwargs: dict):
+        async with self._async_slots:
+            self._start(job)
+            try:
+                job.result = await func(progress=job.set_stage, **kwargs)
+                job.status = "succeeded"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                self._finish(job)
+
+    def _start(self, job: Job):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        job.status = "running"
+        job.started_at = time.time()
+
+    def _finish(self, job: Job):
+        job.finished_at = time.time()
+        job.set_stage("done")
+        if job.events is not None:
+            job.events.finish({"status": job.status, "result": job.result}, job.error)
+        with self._lock:
+            self._running -= 1
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond the retention limit"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(len(self._jobs) - self.retention, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def find_active(self, kind: str, params: dict) -> Optional[Job]:
+        """A queued or running job of the same kind and parameters, so retries can reuse it"""
+        with self._lock:
+            return self._find_active(kind, params)
+
+    def _find_active(self, kind: str, params: dict) -> Optional[Job]:
+        for job in self._jobs.values():
+            if job.kind == kind and job.params == params and job.finished_at is None:
+                return job
+        return None
+
+    def list(self, limit: int = 50) -> list[Job]:
+        """Most recently submitted jobs first"""
+        return list(reversed(self._jobs.values()))[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "async_workers": self.max_async_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "running": self._running,
+            "tracked_jobs": len(self._jobs),
+        }
@@ -0,0 +1,240 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# Upper bounds of the latency histogram buckets, in seconds
+METRICS_LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv(
+        'METRICS_LATENCY_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120').split(','))
+# Upper bounds of the throughput histogram buckets, in rows per second
+METRICS_THROUGHPUT_BUCKETS = (1e3, 1e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+# Spans kept in one request trace
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', 1000))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: Optional[dict] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state["buckets"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_sample(self, key: tuple, state: dict) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, state["buckets"]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, {'le': _format_value(float(bound))})} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, {'le': '+Inf'})} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = METRICS_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "datalens_stage_duration_seconds", "Time spent in each processing stage", ("stage",))
+stage_errors = registry.counter(
+    "datalens_stage_errors_total", "Stages that raised an exception", ("stage",))
+stage_bytes = registry.counter(
+    "datalens_stage_bytes_total", "Bytes read (in) and written (out) by each stage", ("stage", "direction"))
+stage_rows = registry.counter(
+    "datalens_stage_rows_total", "Rows processed by each stage", ("stage",))
+stage_throughput = registry.histogram(
+    "datalens_stage_rows_per_second", "Rows per second of each stage run", ("stage",), METRICS_THROUGHPUT_BUCKETS)
+backend_requests = registry.counter(
+    "datalens_backend_requests_total", "Calls to MinIO and the LLM by outcome", ("backend", "outcome"))
+llm_tokens = registry.counter(
+    "datalens_llm_tokens_total", "LLM tokens by kind (prompt or completion)", ("kind",))
+
+_trace = contextvars.ContextVar("datalens_trace", default=None)
+
+
+class Span:
+    """One timed stage; callers set rows and bytes on it while it runs"""
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.started_at = time.time()
+        self.seconds = None
+        self.rows = None
+        self.bytes_in = None
+        self.bytes_out = None
+        self.error = None
+
+    def to_dict(self) -> dict:
+        span = {"stage": self.stage, "seconds": round(self.seconds, 6)}
+        for key in ("rows", "bytes_in", "bytes_out", "error"):
+            if getattr(self, key) is not None:
+                span[key] = getattr(self, key)
+        return span
+
+
+def record(span: Span, backend: Optional[str] = None):
+    """Add a finished span to the metrics and to the current trace, if any"""
+    stage_seconds.observe(span.seconds, stage=span.stage)
+    if span.error is not None:
+        stage_errors.inc(stage=span.stage)
+    if span.bytes_in:
+        stage_bytes.inc(span.bytes_in, stage=span.stage, direction="in")
+    if span.bytes_out:
+        stage_bytes.inc(span.bytes_out, stage=span.stage, direction="out")
+    if span.rows:
+        stage_rows.inc(span.rows, stage=span.stage)
+        if span.seconds > 0:
+            stage_throughput.observe(span.rows / span.seconds, stage=span.stage)
+    if backend is not None:
+        backend_requests.inc(backend=backend, outcome="error" if span.error is not None else "ok")
+
+    trace = _trace.get()
+    if trace is not None and len(trace) < TRACE_MAX_SPANS:
+        trace.append(span)
+
+
+@contextmanager
+def timed(stage: str, backend: Optional[str] = None, expected: tuple = ()):
+    """
+    Time a block as a stage. Yields a Span whose rows, bytes_in and bytes_out the block may set.
+    With a backend ("minio" or "llm") the call also counts towards that backend's error rate;
+    exceptions of the `expected` types are not counted as errors.
+    """
+    span = Span(stage)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        if not isinstance(e, expected):
+            span.error = type(e).__name__
+        raise
+    finally:
+        span.seconds = time.perf_counter() - started
+        record(span, backend)
+
+
+def observe(stage: str, seconds: float, rows: Optional[int] = None,
+            bytes_in: Optional[int] = None, bytes_out: Optional[int] = None):
+    """Record a stage that was timed by other means, e.g. accumulated over many calls"""
+    span = Span(stage)
+    span.seconds, span.rows, span.bytes_in, span.bytes_out = seconds, rows, bytes_in, bytes_out
+    record(span)
+
+
+def start_trace() -> contextvars.Token:
+    """Collect the spans recorded in this context (and contexts copied from it) until reset"""
+    return _trace.set([])
+
+
+def current_trace() -> Optional[list]:
+    """The spans of the active trace as dicts, or None when no trace was started"""
+    trace = _trace.get()
+    return [span.to_dict() for span in list(trace)] if trace is not None else None
+
+
+def reset_trace(token: contextvars.Token):
+    _trace.reset(token)
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,283 @@
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .convert import read_logical_types
+from .sketches import ColumnSketch, sketch_column
+
+# Number of columns profiled concurrently
+PROFILE_THREADS = int(os.getenv('PROFILE_THREADS', os.cpu_count() or 4))
+# Rows drawn for the sample pool when distinct counts come from sketches
+SKETCH_SAMPLE_POOL = int(os.getenv('SKETCH_SAMPLE_POOL', 10_000))
+# Number of row groups read by the fast Parquet profile
+FAST_PROFILE_ROW_GROUPS = int(os.getenv('FAST_PROFILE_ROW_GROUPS', 4))
+
+
+def _to_arrow_columns(data: Union[pd.DataFrame, pa.Table]):
+    """Yield (name, chunked array or None) pairs; None marks columns the Arrow path cannot profile"""
+    if isinstance(data, pa.Table):
+        columns = zip(data.column_names, data.columns)
+    else:
+        columns = ((name, data[name]) for name in data.columns)
+
+    for name, column in columns:
+        if isinstance(column, pd.Series):
+            try:
+                # Numeric numpy columns are wrapped without copying
+                column = pa.chunked_array([pa.array(column, from_pandas=True)])
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                column = None
+        # Nested values have no hash kernels for distinct counts
+        if column is not None and pa.types.is_nested(column.type):
+            column = None
+        yield name, column
+
+
+def _sample_values(uniques: pa.Array, n_samples: int) -> list:
+    """Pick samples the same way pandas' Series.sample(random_state=42) would"""
+    n_samples = min(n_samples, len(uniques))
+    indices = np.random.RandomState(42).choice(len(uniques), size=n_samples, replace=False)
+    return uniques.take(pa.array(indices)).to_pandas().tolist()
+
+
+def _is_date_strings(uniques: pa.Array, n_probe: int = 16) -> bool:
+    """Check whether string values parse as datetimes, rejecting on a small probe first"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            # The probe keeps the first value, so pandas infers the same format as on the full set
+            pd.to_datetime(uniques.slice(0, n_probe).to_pandas(), errors='raise')
+            if len(uniques) > n_probe:
+                pd.to_datetime(uniques.to_pandas(), errors='raise')
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _cast_number(value, is_integer: bool):
+    """Cast a statistic to int or float so it is JSON serializable"""
+    if value is None:
+        return None
+    return int(value) if is_integer else float(value)
+
+
+def _sample_pool(column: pa.ChunkedArray, pool_size: int = SKETCH_SAMPLE_POOL) -> pa.ChunkedArray:
+    """Pick a bounded, seeded random subset of rows to draw samples from"""
+    if len(column) <= pool_size:
+        return column
+    indices = np.sort(np.random.RandomState(42).choice(len(column), size=pool_size, replace=False))
+    return column.take(pa.array(indices))
+
+
+def profile_column(column: pa.ChunkedArray, n_samples: int = 3, sketch: Optional[ColumnSketch] = None,
+                   logical_type: Optional[str] = None) -> dict:
+    """
+    Compute the properties of a single Arrow column using compute kernels.
+    With a sketch, distinct counts and quantiles come from it and samples from a bounded
+    row subset, so no hash table over all distinct values is built.
+    A `logical_type` stored at conversion time means string columns are known not to hold dates.
+    """
+    arrow_type = column.type
+    row_count = len(column)
+    null_count = column.null_count
+
+    # One hash pass gives both the distinct count and the pool to draw samples from
+    uniques = pc.unique(column if sketch is None else _sample_pool(column))
+    if uniques.null_count:
+        uniques = uniques.drop_null()
+    nunique = len(uniques) if sketch is None else min(sketch.distinct_count(), row_count - null_count)
+
+    properties = {}
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        is_integer = pa.types.is_integer(arrow_type)
+        min_max = pc.min_max(column)
+        properties["dtype"] = "number"
+        properties["std"] = _cast_number(pc.stddev(column, ddof=1).as_py(), is_integer)
+        properties["min"] = _cast_number(min_max["min"].as_py(), is_integer)
+        properties["max"] = _cast_number(min_max["max"].as_py(), is_integer)
+        if sketch is not None and sketch.quantiles() is not None:
+            properties["quantiles"] = sketch.quantiles()
+    elif pa.types.is_boolean(arrow_type):
+        properties["dtype"] = "boolean"
+    elif pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        if logical_type is None and _is_date_strings(uniques):
+            properties["dtype"] = "date"
+        elif row_count and nunique / row_count < 0.5:
+            properties["dtype"] = "category"
+        else:
+            properties["dtype"] = "string"
+    elif pa.types.is_dictionary(arrow_type):
+        properties["dtype"] = "category"
+    elif pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        properties["dtype"] = "date"
+    else:
+        properties["dtype"] = str(column.to_pandas().dtype)
+
+    if properties["dtype"] == "date":
+        min_max = pc.min_max(column)
+        for key in ("min", "max"):
+            value = min_max[key].as_py()
+            # Match pandas, which reports timestamp extremes as pd.Timestamp
+            if value is not None and pa.types.is_timestamp(arrow_type):
+                value = pd.Timestamp(value)
+            properties[key] = value
+
+    properties["samples"] = _sample_values(uniques, n_samples)
+    properties["num_unique_values"] = nunique
+    properties["num_null_values"] = null_count
+    properties["semantic_type"] = ""
+    properties["description"] = ""
+    return properties
+
+
+def profile_columns(
+        data: Union[pd.DataFrame, pa.Table], n_samples: int = 3,
+        fallback: Optional[Callable[[str], dict]] = None,
+        sketches: Optional[dict] = None, column_types: Optional[dict] = None) -> list[dict]:
+    """
+    Profile every column of a DataFrame or Arrow table with Arrow compute kernels.
+    Produces the same properties schema as Summarizer.get_column_properties; columns that
+    Arrow cannot represent are handed to `fallback`, which returns their properties.
+    If a `sketches` dict is given, a ColumnSketch is built for each column and stored in it,
+    and distinct counts and quantiles are taken from the sketches.
+    `column_types` are the logical types stored with the file by the converter, if any.
+    """
+    column_types = column_types or {}
+    columns = list(_to_arrow_columns(data))
+
+    # Arrow kernels release the GIL, so columns are profiled in parallel
+    with ThreadPoolExecutor(max_workers=PROFILE_THREADS) as executor:
+        def profile(name, column):
+            sketch = None
+            if sketches is not None:
+                sketch = sketches[name] = sketch_column(column)
+            return profile_column(column, n_samples, sketch, column_types.get(name))
+
+        futures = [
+            executor.submit(profile, name, column) if column is not None else None
+            for name, column in columns
+        ]
+
+        properties_list = []
+        for (name, column), future in zip(columns, futures):
+            if column is None:
+                if fallback is None:
+                    raise ValueError(f"Column {name} cannot be profiled with Arrow")
+                properties = fallback(name)
+            else:
+                properties = future.result()
+            properties_list.append({"column": name, "properties": properties})
+
+    return properties_list
+
+
+def _opaque_properties(column: pa.ChunkedArray) -> dict:
+    """Properties for columns that cannot be hashed, such as lists and structs"""
+    return {
+        "dtype": str(column.type),
+        "samples": [],
+        "num_unique_values": None,
+        "num_null_values": column.null_count,
+        "semantic_type": "",
+        "description": "",
+    }
+
+
+def estimate_distinct(column: pa.ChunkedArray, total_rows: int) -> int:
+    """
+    Estimate the distinct count of a column from a sample of it with the Haas-Stokes Duj1
+    estimator: d / (1 - (1 - q) * f1 / n), where q is the sampled fraction and f1 the number
+    of values seen exactly once. Key-like columns scale up to the row count, low-cardinality
+    columns stay at the sampled distinct count.
+    """
+    sampled_rows = len(column) - column.null_count
+    if sampled_rows == 0:
+        return 0
+    counts = pc.value_counts(column.drop_null()).field("counts")
+    distinct = len(counts)
+    singletons = pc.sum(pc.equal(counts, 1)).as_py() or 0
+    fraction = min(sampled_rows / total_rows, 1.0)
+    estimate = distinct / (1 - (1 - fraction) * singletons / sampled_rows)
+    return int(min(round(estimate), total_rows))
+
+
+def _footer_statistics(metadata: pq.FileMetaData, name: str):
+    """Combine null counts and min/max of a column across all row groups, or None if any are missing"""
+    null_count, minimum, maximum = 0, None, None
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        chunk = next(
+            (row_group.column(j) for j in range(row_group.num_columns)
+             if row_group.column(j).path_in_schema == name),
+            None)
+        statistics = chunk.statistics if chunk is not None else None
+        if statistics is None or not statistics.has_null_count:
+            return None
+        null_count += statistics.null_count
+        if statistics.has_min_max:
+            minimum = statistics.min if minimum is None else min(minimum, statistics.min)
+            maximum = statistics.max if maximum is None else max(maximum, statistics.max)
+        elif statistics.null_count != row_group.num_rows:
+            return None
+    return null_count, minimum, maximum
+
+
+def sample_row_groups(num_row_groups: int, max_row_groups: int = FAST_PROFILE_ROW_GROUPS) -> list[int]:
+    """Pick up to `max_row_groups` row groups spread evenly across the file"""
+    if num_row_groups <= max_row_groups:
+        return list(range(num_row_groups))
+    return sorted(set(np.linspace(0, num_row_groups - 1, max_row_groups).round().astype(int).tolist()))
+
+
+def profile_parquet_file(
+        parquet_file: pq.ParquetFile, n_samples: int = 3,
+        max_row_groups: int = FAST_PROFILE_ROW_GROUPS) -> list[dict]:
+    """
+    Profile a Parquet file from its footer and a few sampled row groups.
+    Row, null counts and min/max come from column-chunk statistics; samples, std and
+    distinct counts are estimated from the sampled row groups, so only those are read.
+    """
+    metadata = parquet_file.metadata
+    total_rows = metadata.num_rows
+    columns = [
+        name for name in parquet_file.schema_arrow.names
+        if not name.startswith("__index_level_")
+    ]
+    sample = parquet_file.read_row_groups(
+        sample_row_groups(metadata.num_row_groups, max_row_groups), columns=columns)
+    complete = sample.num_rows == total_rows
+
+    properties_list = profile_columns(
+        sample, n_samples, fallback=lambda name: _opaque_properties(sample.column(name)),
+        column_types=read_logical_types(parquet_file.schema_arrow))
+    for entry in properties_list:
+        name, properties = entry["column"], entry["properties"]
+        column = sample.column(name)
+        if not complete and properties["num_unique_values"] is not None:
+            properties["num_unique_values"] = estimate_distinct(column, total_rows)
+            if properties["dtype"] in ("category", "string"):
+                properties["dtype"] = (
+                    "category" if properties["num_unique_values"] / total_rows < 0.5 else "string")
+
+        statistics = _footer_statistics(metadata, name)
+        if statistics is None:
+            continue
+        null_count, minimum, maximum = statistics
+        properties["num_null_values"] = null_count
+        if "min" in properties:
+            is_integer = pa.types.is_integer(column.type)
+            if properties["dtype"] == "number":
+                minimum, maximum = _cast_number(minimum, is_integer), _cast_number(maximum, is_integer)
+            elif pa.types.is_timestamp(column.type):
+                minimum = pd.Timestamp(minimum) if minimum is not None else None
+                maximum = pd.Timestamp(maximum) if maximum is not None else None
+            properties["min"], properties["max"] = minimum, maximum
+
+    return properties_list
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+import dotenv
+
+dotenv.load_dotenv()
+
+PROFILE_SUFFIX = "_profile.json"
+# Bumped when the sidecar layout changes
+PROFILE_FORMAT_VERSION = 1
+# Bumped when the README template changes, so cached renders and client ETags are invalidated
+README_TEMPLATE_VERSION = 1
+# Rendered READMEs kept in memory, keyed by sidecar ETag
+README_CACHE_ENTRIES = int(os.getenv('README_CACHE_ENTRIES', 256))
+
+README_TEMPLATE = """# Dataset Metadata: {filename}
+
+## Overview
+- **Dataset Name**: {name}
+- **Description**: {description}
+- **Rows**: {rows}
+- **Columns**: {columns}
+
+## Data Fields
+
+{fields}
+## Generated Information
+- **Processing Date**: {generated_at}
+- **Source File**: {filename}
+- **Generated by**: Dataset Summarizer Tool
+
+"""
+
+FIELD_TEMPLATE = """### {column}
+- **Data Type**: {dtype}
+- **Semantic Type**: {semantic_type}
+- **Description**: {description}
+- **Unique Values**: {num_unique_values}
+"""
+
+
+def profile_object_name(parquet_filename: str) -> str:
+    return os.path.splitext(parquet_filename)[0] + PROFILE_SUFFIX
+
+
+def build_profile(parquet_filename: str, data_summary: dict, rows=None, columns=None,
+                  profile_mode: Optional[str] = None, generated_at: Optional[str] = None) -> dict:
+    """The structured profile of a dataset: the enriched summary plus its size and provenance"""
+    document = {
+        "format_version": PROFILE_FORMAT_VERSION,
+        "file": parquet_filename,
+        "generated_at": generated_at or datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        "profile_mode": profile_mode,
+        "rows": rows,
+        "columns": columns,
+        "name": data_summary.get("name", parquet_filename),
+        "dataset_description": data_summary.get("dataset_description", ""),
+        "fields": data_summary.get("fields", []),
+    }
+    # Round-trip so numpy scalars and timestamps become plain JSON values
+    return json.loads(serialize_profile(document))
+
+
+def serialize_profile(document: dict) -> str:
+    return json.dumps(document, separators=(',', ':'), default=str)
+
+
+def render_readme(document: dict) -> str:
+    """Render the markdown README of a structured profile"""
+    fields = []
+    for field in document.get("fields", []):
+        properties = field.get("properties", {})
+        lines = [FIELD_TEMPLATE.format(
+            column=field.get("column", "Unknown"),
+            dtype=properties.get("dtype", "Unknown"),
+            semantic_type=properties.get("semantic_type", "Not specified"),
+            description=properties.get("description", "No description available"),
+            num_unique_values=properties.get("num_unique_values", "Unknown"),
+        )]
+        if properties.get("samples"):
+            lines.append(f"- **Sample Values**: {properties['samples']}\n")
+        if properties.get("dtype") == "number":
+            for key, label in (("min", "Min"), ("max", "Max"), ("std", "Standard Deviation")):
+                if key in properties:
+                    lines.append(f"- **{label}**: {properties[key]}\n")
+            if properties.get("quantiles"):
+                quantiles = ", ".join(f"{name}: {value}" for name, value in properties["quantiles"].items())
+                lines.append(f"- **Quantiles**: {quantiles}\n")
+        lines.append("\n")
+        fields.append("".join(lines))
+
+    return README_TEMPLATE.format(
+        filename=document["file"],
+        name=document.get("name", document["file"]),
+        description=document.get("dataset_description") or "No description available",
+        rows=document.get("rows"),
+        columns=document.get("columns"),
+        fields="".join(fields),
+        generated_at=document.get("generated_at"),
+    )
+
+
+def load_profile(minio_client, bucket_name, parquet_filename) -> dict:
+    """Fetch a dataset's structured profile with a single GET; raises S3Error if it has none"""
+    response = minio_client.get_object(bucket_name, profile_object_name(parquet_filename))
+    try:
+        return json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def readme_etag(profile_etag: str) -> str:
+    """ETag of a README rendered from a sidecar with the given ETag"""
+    return f"{profile_etag.strip(chr(34))}-r{README_TEMPLATE_VERSION}"
+
+
+_readme_cache = OrderedDict()
+_readme_cache_lock = threading.Lock()
+
+
+def cached_readme(bucket_name, parquet_filename, etag: str) -> Optional[str]:
+    """The last README rendered for this sidecar ETag, if still cached"""
+    key = (bucket_name, parquet_filename)
+    with _readme_cache_lock:
+        cached = _readme_cache.get(key)
+        if cached is None or cached[0] != etag:
+            return None
+        _readme_cache.move_to_end(key)
+        return cached[1]
+
+
+def cache_readme(bucket_name, parquet_filename, etag: str, content: str):
+    key = (bucket_name, parquet_filename)
+    with _readme_cache_lock:
+        _readme_cache[key] = (etag, content)
+        _readme_cache.move_to_end(key)
+        while len(_readme_cache) > README_CACHE_ENTRIES:
+            _readme_cache.popitem(last=False)
+
+
+def render_profile_readme(minio_client, bucket_name, parquet_filename, etag: str) -> str:
+    """The README of a dataset rendered from its sidecar, reusing the last render for the same ETag"""
+    content = cached_readme(bucket_name, parquet_filename, etag)
+    if content is None:
+        content = render_readme(load_profile(minio_client, bucket_name, parquet_filename))
+        cache_readme(bucket_name, parquet_filename, etag, content)
+    return content
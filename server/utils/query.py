@@ -0,0 +1,215 @@
+import os
+import time
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import dotenv
+
+from .metrics import observe
+from .storage import MinioObjectFile
+
+dotenv.load_dotenv()
+
+# Upper bound on the rows a query returns
+QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', 100_000))
+
+FILTER_OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in", "not in", "is_null", "not_null")
+AGGREGATIONS = ("count", "count_distinct", "sum", "mean", "min", "max", "stddev")
+
+
+class QueryError(ValueError):
+    """Raised for queries that reference unknown columns or use unsupported operations"""
+
+
+def _check_columns(schema: pa.Schema, columns, what: str):
+    missing = [column for column in columns if column not in schema.names]
+    if missing:
+        raise QueryError(f"Unknown {what} column(s): {', '.join(missing)}")
+
+
+def build_filter(schema: pa.Schema, filters: Optional[list]) -> Optional[pc.Expression]:
+    """
+    Turn [[column, operator, value], ...] into an Arrow expression; conditions are ANDed.
+    is_null and not_null take no value. Values that cannot be compared with their column raise QueryError.
+    """
+    expression = None
+    for condition in filters or []:
+        if not isinstance(condition, (list, tuple)) or len(condition) not in (2, 3):
+            raise QueryError(f"Invalid filter: {condition}. Expected [column, operator, value]")
+        column, operator = condition[0], condition[1]
+        value = condition[2] if len(condition) == 3 else None
+        _check_columns(schema, [column], "filter")
+
+        try:
+            field = pc.field(column)
+            if operator == "==":
+                term = field == value
+            elif operator == "!=":
+                term = field != value
+            elif operator == "<":
+                term = field < value
+            elif operator == "<=":
+                term = field <= value
+            elif operator == ">":
+                term = field > value
+            elif operator == ">=":
+                term = field >= value
+            elif operator in ("in", "not in"):
+                if not isinstance(value, list):
+                    raise QueryError(f"Filter operator '{operator}' expects a list")
+                term = field.isin(value)
+                if operator == "not in":
+                    term = ~term
+            elif operator == "is_null":
+                term = field.is_null()
+            elif operator == "not_null":
+                term = field.is_valid()
+            else:
+                raise QueryError(f"Invalid filter operator: {operator}. Expected one of: {', '.join(FILTER_OPERATORS)}")
+            # A value of the wrong type for its column only fails once the expression is bound to the schema
+            schema.empty_table().filter(term)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            raise QueryError(f"Invalid filter value for column {column}: {value!r} ({e})")
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def _check_order_by(order_by: list):
+    if not isinstance(order_by, list):
+        raise QueryError("order_by must be a list of [column, \"asc\"|\"desc\"] pairs")
+    for item in order_by:
+        if not isinstance(item, (list, tuple)) or len(item) != 2 or item[1] not in ("asc", "desc"):
+            raise QueryError(f"Invalid order_by: {item}. Expected [column, \"asc\"|\"desc\"]")
+
+
+def run_query(minio_client, bucket_name, object_name, columns: Optional[list] = None,
+              filters: Optional[list] = None, group_by: Optional[list] = None,
+              aggregations: Optional[list] = None, order_by: Optional[list] = None,
+              limit: Optional[int] = None) -> tuple[pa.Table, dict]:
+    """
+    Run a projection, filter and optional group-by aggregation against a Parquet object.
+    The object is read with ranged GETs: row groups whose statistics cannot match the
+    filter are skipped and only the needed columns of the rest are fetched.
+    aggregations are [column, function] pairs and order_by [column, "asc"|"desc"] pairs.
+    Returns the result table and scan statistics.
+    """
+    started = time.perf_counter()
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+        raise QueryError(f"Invalid limit: {limit!r}. Expected a positive integer")
+    limit = min(limit or QUERY_MAX_ROWS, QUERY_MAX_ROWS)
+    if order_by:
+        _check_order_by(order_by)
+    source = MinioObjectFile(minio_client, bucket_name, object_name)
+    parquet_format = ds.ParquetFileFormat(
+        default_fragment_scan_options=ds.ParquetFragmentScanOptions(pre_buffer=True))
+    fragment = parquet_format.make_fragment(source)
+    schema = fragment.physical_schema
+
+    expression = build_filter(schema, filters)
+    group_by = group_by or []
+    aggregations = [tuple(aggregation) for aggregation in aggregations or []]
+    for aggregation in aggregations:
+        if len(aggregation) != 2 or aggregation[1] not in AGGREGATIONS:
+            raise QueryError(f"Invalid aggregation: {list(aggregation)}. Expected [column, one of {', '.join(AGGREGATIONS)}]")
+    if group_by and not aggregations:
+        aggregations = [(group_by[0], "count")]
+
+    if aggregations:
+        needed = list(dict.fromkeys(group_by + [column for column, _ in aggregations]))
+    else:
+        needed = columns or [name for name in schema.names if not name.startswith("__index_level_")]
+    _check_columns(schema, needed, "query")
+
+    # Footer statistics rule out row groups before any column data is fetched
+    row_groups = fragment.split_by_row_group(expression, schema=schema)
+    row_groups_scanned = len(row_groups)
+
+    if aggregations or order_by:
+        dataset = ds.FileSystemDataset(row_groups, schema, parquet_format)
+        table = dataset.to_table(columns=needed, filter=expression)
+        if aggregations:
+            table = table.group_by(group_by).aggregate(list(aggregations))
+    else:
+        # Read row groups in order and stop once enough rows have matched
+        tables, matched = [], 0
+        for row_groups_scanned, row_group in enumerate(row_groups, start=1):
+            tables.append(row_group.to_table(columns=needed, filter=expression))
+            matched += tables[-1].num_rows
+            if matched >= limit:
+                break
+        table = pa.concat_tables(tables) if tables else schema.empty_table().select(needed)
+
+    if order_by:
+        sort_keys = []
+        for column, direction in order_by:
+            if column not in table.column_names:
+                raise QueryError(f"Unknown order_by column: {column}")
+            sort_keys.append((column, "descending" if direction == "desc" else "ascending"))
+            values = table.column(column)
+            if pa.types.is_dictionary(values.type):
+                # Dictionary columns sort by their values
+                table = table.set_column(
+                    table.column_names.index(column), column, values.cast(values.type.value_type))
+        table = table.sort_by(sort_keys)
+
+    table = table.slice(0, limit)
+    stats = {
+        "row_groups_total": fragment.num_row_groups,
+        "row_groups_scanned": row_groups_scanned,
+        "bytes_fetched": source.bytes_fetched,
+        "object_size": source.size(),
+        "requests": source.requests,
+        "rows_returned": table.num_rows,
+    }
+    observe("query", time.perf_counter() - started, rows=table.num_rows, bytes_in=source.bytes_fetched)
+    return table, stats
+
+
+def table_rows(table: pa.Table) -> list[dict]:
+    """Rows of a result table for JSON, with NaN and infinite floats as None since JSON has neither"""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_finite(column), column, pa.scalar(None, column.type))
+        columns.append(column)
+    return pa.table(columns, names=table.column_names).to_pylist()
+
+
+class _ChunkSink:
+    """Write-only file that hands back what was written since the last drain"""
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_arrow_ipc(table: pa.Table):
+    """Yield a table as an Arrow IPC stream, one record batch at a time"""
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches():
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
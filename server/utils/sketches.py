@@ -0,0 +1,206 @@
+import base64
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# HyperLogLog uses 2**precision one-byte registers; 12 gives ~1.6% standard error in 4 KB
+HLL_PRECISION = int(os.getenv('HLL_PRECISION', 12))
+# KLL accuracy parameter; ~200 keeps rank error around 1-2% with a few hundred retained items
+KLL_K = int(os.getenv('KLL_K', 200))
+# Rows hashed per update so sketching memory stays bounded on long columns
+SKETCH_BATCH_ROWS = int(os.getenv('SKETCH_BATCH_ROWS', 65_536))
+
+REPORTED_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Exact bit length of uint64 values, computed on 32-bit halves so floats stay exact"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+class HyperLogLog:
+    """Mergeable cardinality estimator over 64-bit hashes"""
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def update_hashes(self, hashes: np.ndarray):
+        """Add a batch of uint64 hashes"""
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << width) - 1)
+        rank = (width - _bit_length(remainder) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values: np.ndarray):
+        """Add a batch of non-null values"""
+        self.update_hashes(pd.util.hash_array(np.asarray(values)))
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(self.registers.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return cls(data["precision"], registers)
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin-Lang-Liberty compactors) over numeric values"""
+    def __init__(self, k: int = KLL_K, seed: int = 42):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(self.levels[level])
+                # An odd item stays behind so every promoted item stands for exactly two
+                keep = items[len(items) - len(items) % 2:]
+                promoted = items[self._rng.integers(2):len(items) - len(items) % 2:2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values: np.ndarray):
+        """Add a batch of numeric values; NaNs are ignored"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.n == 0:
+            return None
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        index = min(int(np.searchsorted(cumulative, q * cumulative[-1])), len(items) - 1)
+        return float(items[order][index])
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": self.n, "levels": [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in data["levels"]]
+        return sketch
+
+
+class ColumnSketch:
+    """Distinct-count and (for numeric columns) quantile sketches for one column"""
+    def __init__(self, numeric: bool, hll: Optional[HyperLogLog] = None, kll: Optional[KLLSketch] = None):
+        self.hll = hll or HyperLogLog()
+        self.kll = kll or (KLLSketch() if numeric else None)
+
+    @classmethod
+    def for_type(cls, arrow_type: pa.DataType) -> "ColumnSketch":
+        return cls(numeric=pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type))
+
+    def update(self, array: pa.Array):
+        """Add the non-null values of an Arrow array"""
+        if pa.types.is_dictionary(array.type):
+            array = array.dictionary_decode()
+        array = array.drop_null()
+        if len(array) == 0:
+            return
+        values = array.to_numpy(zero_copy_only=False)
+        self.hll.update(values)
+        if self.kll is not None:
+            self.kll.update(values)
+
+    def merge(self, other: "ColumnSketch"):
+        self.hll.merge(other.hll)
+        if self.kll is not None and other.kll is not None:
+            self.kll.merge(other.kll)
+
+    def distinct_count(self) -> int:
+        return self.hll.count()
+
+    def quantiles(self) -> Optional[dict]:
+        if self.kll is None or self.kll.n == 0:
+            return None
+        return {name: self.kll.quantile(q) for name, q in REPORTED_QUANTILES.items()}
+
+    def to_dict(self) -> dict:
+        return {
+            "hll": self.hll.to_dict(),
+            "kll": self.kll.to_dict() if self.kll is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnSketch":
+        kll = KLLSketch.from_dict(data["kll"]) if data.get("kll") else None
+        return cls(numeric=kll is not None, hll=HyperLogLog.from_dict(data["hll"]), kll=kll)
+
+
+def sketch_column(column: pa.ChunkedArray, batch_rows: int = SKETCH_BATCH_ROWS) -> ColumnSketch:
+    """Build a column sketch by merging sketches of bounded slices of the column"""
+    sketch = ColumnSketch.for_type(column.type)
+    for chunk in column.chunks:
+        for offset in range(0, len(chunk), batch_rows):
+            sketch.update(chunk.slice(offset, batch_rows))
+    return sketch
+
+
+def sketches_to_dict(sketches: dict) -> dict:
+    """Serialize a mapping of column name to ColumnSketch"""
+    return {name: sketch.to_dict() for name, sketch in sketches.items()}
+
+
+def sketches_from_dict(data: dict) -> dict:
+    """Deserialize a mapping produced by sketches_to_dict"""
+    return {name: ColumnSketch.from_dict(sketch) for name, sketch in data.items()}
@@ -0,0 +1,278 @@
+import contextvars
+import io
+import os
+import queue
+import threading
+
+import dotenv
+
+from .metrics import timed
+
+dotenv.load_dotenv()
+
+# Size of each multipart part; S3 requires at least 5 MiB for all but the last part
+MINIO_PART_SIZE = int(os.getenv('MINIO_PART_SIZE', 16 * 1024 * 1024))
+# Bytes per chunk when streaming an object back to a client
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 256 * 1024))
+# Number of written chunks that may wait for the uploader before writes block
+MAX_PENDING_CHUNKS = int(os.getenv('MINIO_MAX_PENDING_CHUNKS', 64))
+
+_EOF = object()
+
+
+class UploadAborted(Exception):
+    """Raised inside the uploader when the producer abandons a streaming upload"""
+
+
+class _QueueReader:
+    """Read side of a MultipartUploadStream, consumed by minio's put_object"""
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+        self._pending = bytearray()
+        self._eof = False
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._pending) < size):
+            chunk = self._chunks.get()
+            if chunk is _EOF:
+                self._eof = True
+            elif isinstance(chunk, BaseException):
+                raise chunk
+            else:
+                self._pending.extend(chunk)
+
+        if size < 0:
+            size = len(self._pending)
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        self.bytes_read += len(data)
+        return data
+
+
+class MultipartUploadStream:
+    """
+    Writable file-like object that streams its content to MinIO while it is being written.
+    Parts are sent from a background thread with put_object(length=-1), so encoding overlaps
+    with network I/O and at most one part plus a bounded queue of chunks is held in memory.
+    Calling abort() makes minio abort the multipart session and discard uploaded parts.
+    """
+    def __init__(self, minio_client, bucket_name, object_name,
+                 content_type='application/octet-stream', part_size=MINIO_PART_SIZE):
+        self._minio_client = minio_client
+        self._bucket_name = bucket_name
+        self._object_name = object_name
+        self._content_type = content_type
+        self._part_size = part_size
+        self._start()
+
+    def _start(self):
+        self._chunks = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+        self._bytes_written = 0
+        self._closed = False
+        self._error = None
+        self.result = None
+        self._reader = _QueueReader(self._chunks)
+
+        def upload():
+            try:
+                with timed("minio_put_object", backend="minio", expected=(UploadAborted,)) as span:
+                    self.result = self._minio_client.put_object(
+                        self._bucket_name,
+                        self._object_name,
+                        self._reader,
+                        length=-1,
+                        part_size=self._part_size,
+                        content_type=self._content_type,
+                        num_parallel_uploads=1
+                    )
+                    span.bytes_out = self._reader.bytes_read
+            except BaseException as e:
+                self._error = e
+                # Unblock a producer that may be waiting on a full queue
+                while True:
+                    try:
+                        self._chunks.get_nowait()
+                    except queue.Empty:
+                        break
+
+        # The uploader runs in the caller's context so its span joins the caller's trace
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(upload,), name=f"upload-{self._object_name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._bytes_written
+
+    @property
+    def bytes_sent(self) -> int:
+        """Bytes taken by the uploader so far; lags tell() by at most one part plus the queue"""
+        return self._reader.bytes_read
+
+    def flush(self):
+        pass
+
+    def write(self, data) -> int:
+        if self._closed:
+            raise ValueError("write to closed upload stream")
+        if self._error is not None:
+            raise self._error
+        data = bytes(data)
+        if data:
+            self._put(data)
+            self._bytes_written += len(data)
+        return len(data)
+
+    def _put(self, item):
+        # Poll so a failed uploader cannot leave the producer blocked forever
+        while self._thread.is_alive():
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Finish the upload and wait for the final part to be committed"""
+        if self._closed:
+            return
+        self._closed = True
+        self._put(_EOF)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def abort(self):
+        """Abandon the upload; parts already sent are removed by aborting the multipart session"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            try:
+                self._put(UploadAborted("Upload aborted by producer"))
+            except BaseException:
+                pass
+        self._thread.join()
+
+    def restart(self):
+        """Abort the upload and start a new one of the same object, discarding everything written"""
+        self.abort()
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def range_for_size(byte_range, size: int):
+    """
+    (start, stop) of a parsed Range header on an object of `size` bytes, or None if it cannot
+    be satisfied. A suffix range longer than the object selects all of it (RFC 9110 14.1.2).
+    """
+    if byte_range.units == "bytes" and len(byte_range.ranges) == 1:
+        start, stop = byte_range.ranges[0]
+        if start < 0 and stop is None:
+            start = max(start + size, 0)
+            return (start, size) if start < size else None
+    return byte_range.range_for_length(size)
+
+
+def iter_object_chunks(response, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+    """Yield a get_object response in chunks and return its connection to the pool when done"""
+    # A client that disconnects early closes the generator, which is not a MinIO error
+    with timed("download", backend="minio", expected=(GeneratorExit,)) as span:
+        span.bytes_out = 0
+        try:
+            for chunk in response.stream(chunk_size):
+                span.bytes_out += len(chunk)
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+
+class MinioObjectFile(io.RawIOBase):
+    """
+    Seekable read-only view of a MinIO object that fetches bytes with ranged GETs.
+    Lets pyarrow read a Parquet footer or single row groups without downloading the object.
+    """
+    def __init__(self, minio_client, bucket_name, object_name, size=None):
+        super().__init__()
+        self._client = minio_client
+        self._bucket_name = bucket_name
+        self._object_name = object_name
+        self._size = size if size is not None else minio_client.stat_object(bucket_name, object_name).size
+        self._position = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def size(self) -> int:
+        return self._size
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._size - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b''
+
+        with timed("minio_get_object", backend="minio") as span:
+            response = self._client.get_object(
+                self._bucket_name, self._object_name, offset=self._position, length=size)
+            try:
+                data = response.read()
+            finally:
+                response.close()
+                response.release_conn()
+            span.bytes_in = len(data)
+
+        self._position += len(data)
+        self.bytes_fetched += len(data)
+        self.requests += 1
+        return data
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
@@ -0,0 +1,237 @@
+import itertools
+import os
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import dotenv
+
+from .convert import TypeConflict, _RewindableReader, iter_csv_batches, read_logical_types
+from .incremental import ColumnAggregate
+from .profiler import _is_date_strings, _sample_values
+
+dotenv.load_dotenv()
+
+# Memory ceiling of an out-of-core profile; read sizes and reservoir sizes are derived from it
+STREAM_MEMORY_LIMIT_MB = int(os.getenv('STREAM_MEMORY_LIMIT_MB', 256))
+# Values kept per column by reservoir sampling, to draw samples and detect date strings from
+STREAM_RESERVOIR_SIZE = int(os.getenv('STREAM_RESERVOIR_SIZE', 10_000))
+# Seed of the reservoir sampling, so profiling the same file again picks the same samples
+STREAM_SAMPLE_SEED = int(os.getenv('STREAM_SAMPLE_SEED', 42))
+
+# Decoded data read at once may use a quarter of the ceiling, the reservoirs another quarter;
+# the rest covers compressed column chunks and the copies and hashes made while aggregating
+_BATCH_SHARE = 4
+_RESERVOIR_SHARE = 4
+
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` non-null values of a column streamed in batches
+    (Algorithm R). Draws come from a seeded generator, so the same stream gives the same sample.
+    """
+    def __init__(self, size: int = STREAM_RESERVOIR_SIZE, seed: int = STREAM_SAMPLE_SEED):
+        self.size = size
+        self.seen = 0
+        self.values = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, array: pa.Array):
+        """Offer the non-null values of an Arrow array"""
+        if pa.types.is_dictionary(array.type):
+            array = array.dictionary_decode()
+        array = array.drop_null()
+        if self.values is None:
+            self.values = pa.concat_arrays([array.slice(0, 0)])
+
+        # Fill the free slots first; concatenating copies, so no batch buffer is kept alive
+        free = self.size - len(self.values)
+        if free > 0 and len(array):
+            head = array.slice(0, free)
+            self.values = pa.concat_arrays([self.values, head])
+            self.seen += len(head)
+            array = array.slice(len(head))
+        if len(array) == 0:
+            return
+
+        # Value number i of the stream replaces a random slot with probability size / (i + 1)
+        slots = self._rng.integers(0, np.arange(self.seen, self.seen + len(array)) + 1)
+        self.seen += len(array)
+        replacing = np.flatnonzero(slots < self.size)
+        if len(replacing) == 0:
+            return
+        # A later value drawn for the same slot overwrites an earlier one
+        slots, first = np.unique(slots[replacing][::-1], return_index=True)
+        replacing = replacing[::-1][first]
+        indices = np.arange(len(self.values))
+        indices[slots] = len(self.values) + np.arange(len(replacing))
+        self.values = pa.concat_arrays([self.values, array.take(pa.array(replacing))]).take(pa.array(indices))
+
+    def uniques(self) -> pa.Array:
+        if self.values is None:
+            return pa.array([], pa.null())
+        return self.values.unique()
+
+
+def memory_limit_bytes(memory_limit_mb: Optional[int] = None) -> int:
+    return (memory_limit_mb or STREAM_MEMORY_LIMIT_MB) * 1024 * 1024
+
+
+def reservoir_size(value_bytes: float, columns: int, memory_limit: int, n_samples: int = 3) -> int:
+    """Values kept per column, fewer for wide values so the reservoirs of all columns fit their share"""
+    fit = int(memory_limit // _RESERVOIR_SHARE / max(columns, 1) / max(value_bytes, 1))
+    return max(n_samples, min(STREAM_RESERVOIR_SIZE, fit))
+
+
+def _stream_dtype(arrow_type: pa.DataType, logical_type: Optional[str], reservoir: Optional[Reservoir]) -> str:
+    """Profile dtype of a column, as profile_column would report it, with date strings detected on the reservoir"""
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        return "number"
+    if pa.types.is_boolean(arrow_type):
+        return "boolean"
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        if logical_type is None and reservoir is not None and _is_date_strings(reservoir.uniques()):
+            return "date"
+        # ColumnAggregate.properties picks category or string from the distinct count
+        return "string"
+    if pa.types.is_dictionary(arrow_type):
+        return "category"
+    if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        return "date"
+    try:
+        return str(np.dtype(arrow_type.to_pandas_dtype()))
+    except (NotImplementedError, TypeError):
+        return str(arrow_type)
+
+
+def profile_stream(
+        batches: Iterable[Union[pa.RecordBatch, pa.Table]], schema: pa.Schema, memory_limit: int,
+        n_samples: int = 3, column_types: Optional[dict] = None, seed: int = STREAM_SAMPLE_SEED) -> dict:
+    """
+    Profile a stream of record batches or tables one at a time with mergeable per-column
+    aggregates: row and null counts, mean and variance (Welford/Chan), min/max, HyperLogLog
+    distinct counts and KLL quantiles, plus a seeded reservoir of values for samples and date
+    detection. A batch may hold any subset of the columns.
+    Returns the fields in the schema of Summarizer.get_column_properties, the column sketches,
+    the row count and memory statistics. `column_types` are the logical types stored by the
+    converter; by default they are read from the schema metadata.
+    """
+    if column_types is None:
+        column_types = read_logical_types(schema) or {}
+    columns = [name for name in schema.names if not name.startswith("__index_level_")]
+    aggregates = {name: ColumnAggregate(schema.field(name).type) for name in columns}
+    reservoirs, sizes = {}, []
+
+    def update(batch):
+        for name in batch.schema.names:
+            if name not in aggregates:
+                continue
+            column = batch.column(name)
+            if isinstance(column, pa.Array):
+                column = pa.chunked_array([column])
+            aggregate = aggregates[name]
+            aggregate.update(column)
+            if not aggregate.hashable or len(column) == 0:
+                continue
+            if name not in reservoirs:
+                # Sized from the column's width in the first batch, seeded by its position
+                size = reservoir_size(column.nbytes / len(column), len(columns), memory_limit, n_samples)
+                reservoirs[name] = Reservoir(size, seed + columns.index(name))
+                sizes.append(size)
+            for chunk in column.chunks:
+                reservoirs[name].update(chunk)
+
+    # Arrow memory held by the profile beyond what was allocated before it started
+    peak_bytes, baseline = 0, pa.total_allocated_bytes()
+    for batch in batches:
+        peak_bytes = max(peak_bytes, pa.total_allocated_bytes() - baseline)
+        update(batch)
+        # Release this batch before the next one is read
+        del batch
+
+    fields = []
+    for name in columns:
+        aggregate, reservoir = aggregates[name], reservoirs.get(name)
+        dtype = _stream_dtype(aggregate.arrow_type, column_types.get(name), reservoir)
+        samples = _sample_values(reservoir.uniques(), n_samples) if reservoir is not None else []
+        fields.append({"column": name, "properties": aggregate.properties(dtype, samples)})
+
+    return {
+        "fields": fields,
+        "sketches": {name: aggregate.sketch for name, aggregate in aggregates.items() if aggregate.sketch is not None},
+        "rows": aggregates[columns[0]].rows if columns else 0,
+        "stats": {
+            "memory_limit_bytes": memory_limit,
+            "reservoir_size": min(sizes, default=0),
+            "peak_arrow_bytes": peak_bytes,
+        },
+    }
+
+
+def iter_row_group_slices(parquet_file: pq.ParquetFile, columns: list, memory_limit: int) -> Iterator[pa.Table]:
+    """
+    Yield each row group of a Parquet file as tables of as many columns as fit the batch share
+    of the memory ceiling, so memory is bounded by the ceiling rather than the row group size.
+    Decoded column widths are learned as columns are read: a column is read alone until its
+    width is known. A single column chunk is the smallest unit read.
+    """
+    budget = memory_limit // _BATCH_SHARE
+    metadata = parquet_file.metadata
+    widths = {}
+    for i in range(metadata.num_row_groups):
+        num_rows = metadata.row_group(i).num_rows
+        group, group_bytes = [], 0
+        for name in columns:
+            column_bytes = widths.get(name, float("inf")) * num_rows
+            if group and group_bytes + column_bytes > budget:
+                yield _read_slice(parquet_file, i, group, widths)
+                group, group_bytes = [], 0
+            group.append(name)
+            group_bytes += column_bytes
+        if group:
+            yield _read_slice(parquet_file, i, group, widths)
+
+
+def _read_slice(parquet_file: pq.ParquetFile, row_group: int, columns: list, widths: dict) -> pa.Table:
+    table = parquet_file.read_row_group(row_group, columns=columns, use_threads=False)
+    if table.num_rows:
+        for name in columns:
+            widths[name] = max(widths.get(name, 0), table.column(name).nbytes / table.num_rows)
+    return table
+
+
+def profile_parquet_stream(parquet_file: pq.ParquetFile, memory_limit: int, n_samples: int = 3) -> dict:
+    """Profile a Parquet file one row group slice at a time, see iter_row_group_slices"""
+    columns = [name for name in parquet_file.schema_arrow.names if not name.startswith("__index_level_")]
+    profile = profile_stream(
+        iter_row_group_slices(parquet_file, columns, memory_limit), parquet_file.schema_arrow,
+        memory_limit, n_samples)
+    profile["stats"]["row_groups"] = parquet_file.metadata.num_row_groups
+    return profile
+
+
+def profile_csv_stream(source, memory_limit: int, n_samples: int = 3) -> dict:
+    """
+    Profile a CSV file-like object block by block, with the column types the converter would infer.
+    Like the converter, it reads the file again with a column widened when a later block conflicts.
+    """
+    block_size = memory_limit // _BATCH_SHARE
+    source, column_types = _RewindableReader(source), {}
+    try:
+        while True:
+            batches = iter_csv_batches(source, block_size=block_size, column_types=column_types)
+            try:
+                first = next(batches, None)
+                if first is None:
+                    raise ValueError("Cannot profile an empty CSV file")
+                profile = profile_stream(itertools.chain([first], batches), first.schema, memory_limit, n_samples)
+                break
+            except TypeConflict as conflict:
+                column_types.update(conflict.columns)
+                source.rewind()
+    finally:
+        source.close()
+    profile["stats"]["block_size"] = block_size
+    return profile
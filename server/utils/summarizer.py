@@ -1,20 +1,40 @@
 import pandas as pd
+import pyarrow.parquet as pq
+from .cache import get_enrichment_cache
+from .catalog import get_catalog
+from .clients import get_async_groq_client, get_groq_client, track_llm_request
+from .convert import read_logical_types
 from .enrich import Summarizer
+from .enrichment import LLMRateLimited
+from .incremental import PROFILE_STATE_SUFFIX, annotations_from_summary, apply_annotations, profile_incremental
+from .metrics import llm_tokens, timed
+from .profiles import build_profile, profile_object_name, render_readme, serialize_profile
+from .sketches import sketches_to_dict
+from .aio import run_blocking
+from .storage import MinioObjectFile
+from .streaming import memory_limit_bytes
 import json
 import getpass
 import os
 import tempfile
 import io
-from groq import Groq
 
 import dotenv   
 
 dotenv.load_dotenv()
 
+GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
+
 class GroqLLMWrapper:
     """Wrapper class to make Groq client compatible with the Summarizer interface"""
-    def __init__(self, client):
+    def __init__(self, client, model=GROQ_MODEL, async_client=None):
         self.client = client
+        self.async_client = async_client
+        self.model = model
+        # complete() and acomplete() are retried by the enrichment batches (ENRICH_MAX_RETRIES),
+        # so the SDK must not retry them again; these views share the clients' connection pools
+        self._batch_client = _without_retries(client)
+        self._batch_async_client = _without_retries(async_client)
     
     def invoke(self, prompts):
         """Make the Groq client compatible with the expected interface"""
@@ -22,14 +42,15 @@ class GroqLLMWrapper:
         prompt = prompts[0] if isinstance(prompts, list) else prompts
         
         try:
-            completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0,
-                max_tokens=None,
-            )
+            with track_llm_request(), timed("llm_completion", backend="llm"):
+                completion = self.client.chat.completions.create(
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=self.model,
+                    temperature=0,
+                    max_tokens=None,
+                )
             
             # Create a response object that mimics the expected structure
             class Response:
@@ -45,139 +66,341 @@ class GroqLLMWrapper:
             
             return Response(f'{{"error": "Failed to generate summary: {str(e)}"}}')
 
+    def complete(self, prompt, max_tokens=None):
+        """
+        Send one prompt and return its content, token usage and finish reason.
+        Unlike invoke, errors are raised so the caller can retry; rate limits raise LLMRateLimited.
+        """
+        try:
+            with track_llm_request(), timed("llm_completion", backend="llm"):
+                completion = self._batch_client.chat.completions.create(
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=self.model,
+                    temperature=0,
+                    max_tokens=max_tokens,
+                )
+        except Exception as e:
+            raise _rate_limit_error(e) from e
+        return _completion_result(completion)
+
+    async def acomplete(self, prompt, max_tokens=None):
+        """complete() through the async client, for the event loop of the async server"""
+        try:
+            with track_llm_request(), timed("llm_completion", backend="llm"):
+                completion = await self._batch_async_client.chat.completions.create(
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=self.model,
+                    temperature=0,
+                    max_tokens=max_tokens,
+                )
+        except Exception as e:
+            raise _rate_limit_error(e) from e
+        return _completion_result(completion)
+
+def _without_retries(client):
+    """The client with the SDK's own retries turned off, for callers that retry themselves"""
+    if client is None or not hasattr(client, "with_options"):
+        return client
+    return client.with_options(max_retries=0)
+
+def _rate_limit_error(error):
+    """Turn a 429 from the Groq SDK into LLMRateLimited with its Retry-After; other errors pass through"""
+    if getattr(error, "status_code", None) != 429:
+        return error
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        retry_after = float(retry_after) if retry_after else None
+    except ValueError:
+        retry_after = None
+    return LLMRateLimited(str(error), retry_after)
+
+def _completion_result(completion):
+    usage = completion.usage
+    if usage:
+        llm_tokens.inc(usage.prompt_tokens, kind="prompt")
+        llm_tokens.inc(usage.completion_tokens, kind="completion")
+    return {
+        "content": completion.choices[0].message.content,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": usage.completion_tokens if usage else None,
+        "finish_reason": completion.choices[0].finish_reason,
+    }
+
 def get_groq_llm():
     """Initialize and return Groq LLM instance"""
     if "GROQ_API_KEY" not in os.environ:
         os.environ["GROQ_API_KEY"] = getpass.getpass("Enter your Groq API key: ")
 
-    client = Groq(api_key=os.environ["GROQ_API_KEY"])
+    # The client and its connection pool are shared across calls and threads
+    client = get_groq_client(os.environ["GROQ_API_KEY"])
     return GroqLLMWrapper(client)
 
-def process_parquet_file(minio_client, bucket_name, parquet_filename):
+def get_async_groq_llm():
+    """Groq LLM instance whose acomplete() uses the AsyncGroq client of the running event loop"""
+    if "GROQ_API_KEY" not in os.environ:
+        raise RuntimeError("GROQ_API_KEY is not set")
+    api_key = os.environ["GROQ_API_KEY"]
+    return GroqLLMWrapper(get_groq_client(api_key), async_client=get_async_groq_client(api_key))
+
+def profile_parquet_object(minio_client, bucket_name, parquet_filename, profile_mode="full", progress=None):
     """
-    Download parquet file from MinIO, process it, and return metadata
+    Load a parquet file from MinIO and build its base summary, without calling the LLM.
+    With profile_mode="fast" only the footer and a few sampled row groups are fetched.
+    With profile_mode="sketch" distinct counts and quantiles come from mergeable sketches.
+    With profile_mode="stream" the file is read in row group slices sized to stay under
+    STREAM_MEMORY_LIMIT_MB, with ranged GETs, so files larger than memory can be profiled.
+    With profile_mode="incremental" partial aggregates of the dataset's previous version are
+    reused and only new row groups are read, see profile_incremental.
     """
+    if profile_mode == "incremental":
+        return profile_incremental(minio_client, bucket_name, parquet_filename, progress=progress)
+
+    progress = progress or (lambda stage: None)
+    temp_filepath = None
+    column_types = None
+    memory_limit = None
     try:
-        # Download parquet file from MinIO
-        response = minio_client.get_object(bucket_name, parquet_filename)
-        parquet_data = response.read()
-        
-        # Create temporary file to read parquet data
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.parquet') as temp_file:
-            temp_file.write(parquet_data)
-            temp_filepath = temp_file.name
-        
+        progress("loading")
+        if profile_mode == "stream":
+            # Only the footer is read up front; row groups are fetched slice by slice
+            memory_limit = memory_limit_bytes()
+            source = MinioObjectFile(minio_client, bucket_name, parquet_filename)
+            data = pq.ParquetFile(source, pre_buffer=True)
+            num_rows = data.metadata.num_rows
+            num_columns = len([name for name in data.schema_arrow.names if not name.startswith("__index_level_")])
+        elif profile_mode == "fast":
+            # Ranged GETs for the footer and sampled row groups instead of a full download
+            source = MinioObjectFile(minio_client, bucket_name, parquet_filename)
+            data = pq.ParquetFile(source, pre_buffer=True)
+            num_rows = data.metadata.num_rows
+            num_columns = len([name for name in data.schema_arrow.names if not name.startswith("__index_level_")])
+        elif profile_mode in ("full", "sketch"):
+            # Download parquet file from MinIO
+            with timed("minio_get_object", backend="minio") as span:
+                response = minio_client.get_object(bucket_name, parquet_filename)
+                parquet_data = response.read()
+                span.bytes_in = len(parquet_data)
+
+            # Create temporary file to read parquet data
+            with timed("temp_file_write") as span, \
+                    tempfile.NamedTemporaryFile(delete=False, suffix='.parquet') as temp_file:
+                temp_file.write(parquet_data)
+                temp_filepath = temp_file.name
+                span.bytes_out = len(parquet_data)
+
+            # Load dataset, with the column types the converter stored alongside it
+            with timed("read_parquet") as span:
+                data = pd.read_parquet(temp_filepath)
+                column_types = read_logical_types(pq.read_schema(temp_filepath))
+                num_rows, num_columns = len(data), len(data.columns)
+                span.rows, span.bytes_in = num_rows, len(parquet_data)
+        else:
+            raise ValueError(f"Unsupported profile mode: {profile_mode}")
+
+        summarizer = Summarizer()
+        base_summary = summarizer.summarize(
+            data, text_gen=None, file_name=parquet_filename,
+            use_sketches=profile_mode == "sketch", progress=progress, column_types=column_types,
+            memory_limit=memory_limit)
+
+        return {
+            "base_summary": base_summary,
+            "rows": num_rows,
+            "columns": num_columns,
+            "sketches": summarizer.sketches,
+            "streaming": summarizer.streaming_stats
+        }
+    finally:
+        # Clean up temporary file
+        if temp_filepath and os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+
+def parse_enriched_summary(summary):
+    """Turn the LLM enrichment output into a summary dict"""
+    if isinstance(summary, str):
+        if summary.startswith('"') and summary.endswith('"'):
+            summary = summary[1:-1]
+        summary = summary.encode('utf-8').decode('unicode_escape')
         try:
-            # Load dataset
-            df = pd.read_parquet(temp_filepath)
-            
-            # Get LLM instance
-            llm = get_groq_llm()
-            
-            # Get summarization
-            summarizer = Summarizer()
-            summary = summarizer.summarize(df, summary_method='llm', text_gen=llm, file_name=parquet_filename)
-            
-            # Process summary
-            if isinstance(summary, str):
-                if summary.startswith('"') and summary.endswith('"'):
-                    summary = summary[1:-1]
-                summary = summary.encode('utf-8').decode('unicode_escape')
-                try:
-                    data_summary = json.loads(summary)
-                except json.JSONDecodeError:
-                    data_summary = {"error": "Failed to parse summary", "raw_summary": summary}
-            else:
-                data_summary = summary
-            
-            # Generate README content
-            readme_content = generate_readme_content(data_summary, parquet_filename, df)
-            
-            # Save metadata to bucket
-            metadata_filename = os.path.splitext(parquet_filename)[0] + "_metadata.md"
-            save_metadata_to_bucket(minio_client, bucket_name, metadata_filename, readme_content)
-            
-            return {
-                "status": "success",
-                "summary": data_summary,
-                "metadata_file": metadata_filename,
-                "rows": len(df),
-                "columns": len(df.columns)
-            }
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_filepath):
-                os.remove(temp_filepath)
-                
+            return json.loads(summary)
+        except json.JSONDecodeError:
+            return {"error": "Failed to parse summary", "raw_summary": summary}
+    return summary
+
+def enrich_profile(profile, llm=None, cache=None, stats=None, progress=None):
+    """
+    Enrich a profile's base summary with the LLM, unless the profile carries the
+    descriptions of a previous version with the same schema.
+    If a `stats` dict is given it receives the enrichment batch, token and latency statistics;
+    `progress` is called with the annotations of each LLM batch as it completes.
+    """
+    if profile.get("annotations"):
+        return apply_annotations(profile["base_summary"], profile["annotations"])
+
+    llm = llm or get_groq_llm()
+    summarizer = Summarizer(cache=cache or get_enrichment_cache())
+    data_summary = parse_enriched_summary(summarizer.enrich(profile["base_summary"], text_gen=llm, progress=progress))
+    if stats is not None and summarizer.enrichment_stats is not None:
+        stats.update(summarizer.enrichment_stats)
+    return data_summary
+
+async def enrich_profile_async(profile, llm=None, cache=None, stats=None, progress=None):
+    """enrich_profile() for the event loop, with the async Groq client by default"""
+    if profile.get("annotations"):
+        return apply_annotations(profile["base_summary"], profile["annotations"])
+
+    llm = llm or get_async_groq_llm()
+    summarizer = Summarizer(cache=cache or get_enrichment_cache())
+    data_summary = parse_enriched_summary(
+        await summarizer.enrich_async(profile["base_summary"], text_gen=llm, progress=progress))
+    if stats is not None and summarizer.enrichment_stats is not None:
+        stats.update(summarizer.enrichment_stats)
+    return data_summary
+
+def write_metadata(minio_client, bucket_name, parquet_filename, profile, data_summary, profile_mode="full"):
+    """Save the profile sidecar, README (and sketches, if any) for a processed parquet file and build the result"""
+    # The structured profile is the source of truth; the README is rendered from it
+    document = build_profile(parquet_filename, data_summary, profile["rows"], profile["columns"], profile_mode)
+    profile_filename = profile_object_name(parquet_filename)
+    save_metadata_to_bucket(
+        minio_client, bucket_name, profile_filename, serialize_profile(document), content_type='application/json')
+
+    # Generate README content
+    with timed("readme"):
+        readme_content = render_readme(document)
+
+    # Save metadata to bucket
+    metadata_filename = os.path.splitext(parquet_filename)[0] + "_metadata.md"
+    save_metadata_to_bucket(minio_client, bucket_name, metadata_filename, readme_content)
+
+    result = {
+        "status": "success",
+        "summary": data_summary,
+        "metadata_file": metadata_filename,
+        "profile_file": profile_filename,
+        "rows": profile["rows"],
+        "columns": profile["columns"],
+        "profile_mode": profile_mode
+    }
+
+    # Save the mergeable sketches so later profiles can combine them
+    if profile["sketches"] is not None:
+        sketches_filename = os.path.splitext(parquet_filename)[0] + "_sketches.json"
+        save_metadata_to_bucket(
+            minio_client, bucket_name, sketches_filename,
+            json.dumps(sketches_to_dict(profile["sketches"])), content_type='application/json')
+        result["sketches_file"] = sketches_filename
+
+    # Memory ceiling, reservoir size and peak Arrow memory of an out-of-core profile
+    if profile.get("streaming") is not None:
+        result["streaming"] = profile["streaming"]
+
+    # Save the partial aggregates so the next version only profiles its new row groups
+    if profile.get("state") is not None:
+        state = {**profile["state"], "annotations": annotations_from_summary(data_summary)}
+        state_filename = os.path.splitext(parquet_filename)[0] + PROFILE_STATE_SUFFIX
+        save_metadata_to_bucket(
+            minio_client, bucket_name, state_filename,
+            json.dumps(state, default=str), content_type='application/json')
+        result.update(
+            profile_state_file=state_filename,
+            previous_version=profile["previous_version"],
+            row_groups_reused=profile["row_groups_reused"],
+            row_groups_profiled=profile["row_groups_profiled"],
+            bytes_fetched=profile["bytes_fetched"],
+            enrichment_reused=bool(profile["annotations"]))
+
+    return result
+
+def process_parquet_file(minio_client, bucket_name, parquet_filename, profile_mode="full", progress=None):
+    """
+    Download parquet file from MinIO, process it, and return metadata.
+    See profile_parquet_object for the profile modes; with "sketch" the sketches are saved
+    next to the metadata as <name>_sketches.json.
+    `progress`, if given, is called with the name of each stage as it starts, and with
+    details (the base profile, each enriched batch) as progress(stage, **details).
+    """
+    progress = progress or (lambda stage, **details: None)
+    try:
+        profile = profile_parquet_object(minio_client, bucket_name, parquet_filename, profile_mode, progress)
+        # The profile is usable before enrichment, so clients can show it straight away
+        progress("profiled", rows=profile["rows"], columns=profile["columns"],
+                 fields=profile["base_summary"]["fields"])
+
+        # Enrich the summary, reusing a previous version's descriptions when the schema is unchanged
+        progress("enriching")
+        enrichment_stats = {}
+        data_summary = enrich_profile(profile, stats=enrichment_stats, progress=progress)
+
+        progress("writing_metadata")
+        result = write_metadata(minio_client, bucket_name, parquet_filename, profile, data_summary, profile_mode)
+        if enrichment_stats:
+            result["enrichment"] = enrichment_stats
+        return result
+
     except Exception as e:
         return {
             "status": "error",
             "error": str(e)
         }
 
-def generate_readme_content(data_summary, filename, df):
-    """Generate README content from data summary"""
-    
-    readme_content = f"""# Dataset Metadata: {filename}
+async def process_parquet_file_async(minio_client, bucket_name, parquet_filename, profile_mode="full", progress=None):
+    """
+    process_parquet_file() for the event loop: loading and profiling run on the bounded I/O
+    executor (ASYNC_IO_THREADS), enrichment awaits the LLM, so the job holds no thread while
+    it waits for completions.
+    """
+    progress = progress or (lambda stage, **details: None)
+    try:
+        profile = await run_blocking(
+            profile_parquet_object, minio_client, bucket_name, parquet_filename, profile_mode, progress)
+        progress("profiled", rows=profile["rows"], columns=profile["columns"],
+                 fields=profile["base_summary"]["fields"])
 
-## Overview
-- **Dataset Name**: {data_summary.get('name', filename)}
-- **Description**: {data_summary.get('dataset_description', 'No description available')}
-- **Rows**: {len(df)}
-- **Columns**: {len(df.columns)}
+        progress("enriching")
+        enrichment_stats = {}
+        data_summary = await enrich_profile_async(profile, stats=enrichment_stats, progress=progress)
 
-## Data Fields
+        progress("writing_metadata")
+        result = await run_blocking(
+            write_metadata, minio_client, bucket_name, parquet_filename, profile, data_summary, profile_mode)
+        if enrichment_stats:
+            result["enrichment"] = enrichment_stats
+        return result
 
-"""
-    
-    fields = data_summary.get('fields', [])
-    for field in fields:
-        column_name = field.get('column', 'Unknown')
-        properties = field.get('properties', {})
-        
-        readme_content += f"### {column_name}\n"
-        readme_content += f"- **Data Type**: {properties.get('dtype', 'Unknown')}\n"
-        readme_content += f"- **Semantic Type**: {properties.get('semantic_type', 'Not specified')}\n"
-        readme_content += f"- **Description**: {properties.get('description', 'No description available')}\n"
-        readme_content += f"- **Unique Values**: {properties.get('num_unique_values', 'Unknown')}\n"
-        
-        if 'samples' in properties and properties['samples']:
-            readme_content += f"- **Sample Values**: {properties['samples']}\n"
-        
-        if properties.get('dtype') == 'number':
-            if 'min' in properties:
-                readme_content += f"- **Min**: {properties['min']}\n"
-            if 'max' in properties:
-                readme_content += f"- **Max**: {properties['max']}\n"
-            if 'std' in properties:
-                readme_content += f"- **Standard Deviation**: {properties['std']}\n"
-        
-        readme_content += "\n"
-    
-    readme_content += f"""
-## Generated Information
-- **Processing Date**: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}
-- **Source File**: {filename}
-- **Generated by**: Dataset Summarizer Tool
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": str(e)
+        }
 
-"""
-    
-    return readme_content
+def generate_readme_content(data_summary, filename, df=None, num_rows=None, num_columns=None):
+    """Generate README content from data summary"""
+    if df is not None:
+        num_rows, num_columns = len(df), len(df.columns)
+    return render_readme(build_profile(filename, data_summary, num_rows, num_columns))
 
-def save_metadata_to_bucket(minio_client, bucket_name, filename, content):
+def save_metadata_to_bucket(minio_client, bucket_name, filename, content, content_type='text/markdown'):
     """Save metadata content to MinIO bucket"""
     try:
         content_bytes = content.encode('utf-8')
         content_stream = io.BytesIO(content_bytes)
         
-        minio_client.put_object(
-            bucket_name,
-            filename,
-            content_stream,
-            length=len(content_bytes),
-            content_type='text/markdown'
-        )
+        with timed("minio_put_object", backend="minio") as span:
+            minio_client.put_object(
+                bucket_name,
+                filename,
+                content_stream,
+                length=len(content_bytes),
+                content_type=content_type
+            )
+            span.bytes_out = len(content_bytes)
+        get_catalog().record(bucket_name, filename, len(content_bytes))
         
         return True
     except Exception as e: